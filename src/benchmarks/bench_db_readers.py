@@ -0,0 +1,127 @@
+"""
+Benchmark the database writer's latency while readers run heavy queries.
+
+For each database mode (`memory`, `wal`, `shared_memory`; see `mem_db.py`), a writer thread
+upserts batches of flows with `write_flows_to_db`, as `packet_processor.flush_flows` does, while
+reader threads run dashboard-style aggregations over `network_flows_all` through
+`mem_db.read_connection()`. The writer's per-batch latency is reported (median, 99th percentile
+and maximum), with and without readers, together with the number of queries the readers
+completed. Results are printed as JSON.
+
+Usage (from the `src` directory):
+    python -m benchmarks.bench_db_readers [--flows N] [--readers R] [--seconds S]
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+
+from libinspector import global_state
+from libinspector import mem_db
+from libinspector.flow_accumulator import write_flows_to_db
+
+READER_QUERY = '''
+    SELECT src_mac_address, dest_ip_address, SUM(byte_count), SUM(packet_count), COUNT(*)
+    FROM network_flows_all
+    GROUP BY src_mac_address, dest_ip_address
+    ORDER BY SUM(byte_count) DESC
+    LIMIT 20
+'''
+
+
+def generate_flow_batch(rng: random.Random, timestamp: int, flow_count: int) -> dict:
+    """Return `flow_count` random flows in one time bucket, as produced by `FlowAccumulator.pop_all()`."""
+    flows = {}
+    for ix in range(flow_count):
+        flow_key = (
+            timestamp, f'02:00:00:00:00:{ix % 50:02x}', '02:00:00:00:00:fe', f'192.168.1.{10 + ix % 50}',
+            f'93.184.{rng.randrange(256)}.{rng.randrange(256)}', rng.randrange(32768, 61000), 443, 'tcp'
+        )
+        flows[flow_key] = [rng.randint(60, 1500), 1, 0, 0]
+    return flows
+
+
+def run_mode(db_mode: str, base_flows: int, batch_flows: int, reader_count: int, seconds: float, seed: int) -> dict:
+    """
+    Measure the writer's latency in one database mode, with `reader_count` concurrent readers.
+
+    Returns:
+        dict: Writer latency percentiles in milliseconds, batches written and reader queries completed.
+    """
+    rng = random.Random(seed)
+    conn, rw_lock = mem_db.initialize_db(db_mode)
+    global_state.db_conn_and_lock = (conn, rw_lock)
+
+    # Fill the database so that reader queries are heavy
+    start_ts = 1700000000
+    for ix in range(base_flows // 1000):
+        write_flows_to_db(conn, rw_lock, generate_flow_batch(rng, start_ts + ix, 1000))
+
+    stop_event = threading.Event()
+    query_counts = [0] * reader_count
+
+    def read(reader_index):
+        while not stop_event.is_set():
+            with mem_db.read_connection() as read_conn:
+                read_conn.execute(READER_QUERY).fetchall()
+            query_counts[reader_index] += 1
+
+    readers = [threading.Thread(target=read, args=(ix,), daemon=True) for ix in range(reader_count)]
+    for reader in readers:
+        reader.start()
+
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    timestamp = start_ts + base_flows // 1000
+    while time.perf_counter() < deadline:
+        flows = generate_flow_batch(rng, timestamp, batch_flows)
+        batch_start = time.perf_counter()
+        write_flows_to_db(conn, rw_lock, flows)
+        latencies.append(time.perf_counter() - batch_start)
+        timestamp += 1
+
+    stop_event.set()
+    for reader in readers:
+        reader.join()
+
+    latencies.sort()
+    result = {
+        'batches': len(latencies),
+        'writer_p50_ms': round(statistics.median(latencies) * 1e3, 3),
+        'writer_p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3, 3),
+        'writer_max_ms': round(latencies[-1] * 1e3, 3),
+        'reader_queries': sum(query_counts),
+    }
+
+    if db_mode == 'wal':
+        mem_db.initialize_db('memory')
+        mem_db.remove_db_files()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the database writer latency under concurrent readers.')
+    parser.add_argument('--flows', type=int, default=200000, help='Flow rows in the database before measuring (default: 200000)')
+    parser.add_argument('--batch', type=int, default=500, help='Flows per writer batch (default: 500)')
+    parser.add_argument('--readers', type=int, default=2, help='Concurrent reader threads (default: 2)')
+    parser.add_argument('--seconds', type=float, default=5, help='Measurement time per run (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the flow generator (default: 0)')
+    args = parser.parse_args()
+
+    results = {}
+    for db_mode in mem_db.DB_MODES:
+        results[db_mode] = {
+            'no_readers': run_mode(db_mode, args.flows, args.batch, 0, args.seconds, args.seed),
+            'with_readers': run_mode(db_mode, args.flows, args.batch, args.readers, args.seconds, args.seed),
+        }
+    mem_db.initialize_db('memory')
+
+    json.dump({'parameters': vars(args), 'results': results}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark the raw-bytes TLS ClientHello parser against Scapy's TLS dissector.
+
+Both paths start from the same raw Ethernet frames and extract the SNI, as the packet processor
+does. Frames come from a capture file if one is given (only frames carrying a ClientHello are
+kept), and are otherwise synthesized with Scapy. Results are printed as JSON.
+
+Usage (from the `src` directory):
+    python -m benchmarks.bench_tls_parser [capture.pcap] [--repeat N]
+"""
+import argparse
+import json
+import random
+import time
+
+import scapy.all as sc
+
+from libinspector import header_parser
+from libinspector import tls_processor
+
+
+def generate_client_hello_frames(count: int = 1000, seed: int = 0) -> list:
+    """
+    Build Ethernet frames carrying TLS ClientHellos with varied SNI, ALPN and version extensions.
+
+    Args:
+        count (int, optional): Number of frames to build.
+        seed (int, optional): Seed of the random generator, so that runs are comparable.
+
+    Returns:
+        list[bytes]: The raw frames.
+    """
+    from scapy.layers.tls.handshake import TLSClientHello
+    from scapy.layers.tls.extensions import (
+        TLS_Ext_ServerName, ServerName, TLS_Ext_ALPN, ProtocolName, TLS_Ext_SupportedVersion_CH
+    )
+
+    rng = random.Random(seed)
+    frames = []
+    for ix in range(count):
+        hostname = f'device-{ix}.{rng.choice(["example.com", "cloud.example.net", "api.iot-vendor.io"])}'
+        extensions = [TLS_Ext_ServerName(servernames=[ServerName(servername=hostname.encode())])]
+        if rng.random() < 0.7:
+            extensions.append(TLS_Ext_ALPN(protocols=[ProtocolName(protocol=b'h2'), ProtocolName(protocol=b'http/1.1')]))
+        if rng.random() < 0.8:
+            extensions.append(TLS_Ext_SupportedVersion_CH(versions=[0x0304, 0x0303]))
+        body = bytes(TLSClientHello(ext=extensions))
+        record = b'\x16\x03\x01' + len(body).to_bytes(2, 'big') + body
+        frames.append(bytes(
+            sc.Ether(src='02:00:00:00:00:aa', dst='02:00:00:00:00:01') /
+            sc.IP(src='192.168.1.50', dst=f'93.184.{rng.randrange(256)}.{rng.randrange(256)}') /
+            sc.TCP(sport=rng.randrange(32768, 61000), dport=443, flags='PA') /
+            record
+        ))
+    return frames
+
+
+def load_client_hello_frames(pcap_path: str) -> list:
+    """
+    Read the frames that carry a TLS ClientHello from a capture file.
+
+    Args:
+        pcap_path (str): Path to a pcap or pcapng file.
+
+    Returns:
+        list[bytes]: The raw frames.
+    """
+    frames = []
+    for pkt in sc.rdpcap(pcap_path):
+        frame = bytes(pkt)
+        header = header_parser.parse_frame(frame)
+        if header is None or header.protocol != 'tcp':
+            continue
+        if tls_processor.parse_client_hello(frame[header.payload_offset:]) is not None:
+            frames.append(frame)
+    return frames
+
+
+def bench_raw_parser(frames: list) -> list:
+    sni_list = []
+    for frame in frames:
+        header = header_parser.parse_frame(frame)
+        payload = frame[header.payload_offset:header.payload_offset + header.payload_len]
+        sni_list.append(tls_processor.extract_sni(payload))
+    return sni_list
+
+
+def bench_scapy_dissector(frames: list) -> list:
+    # The pre-existing path: full dissection with the TLS layer bound to port 443
+    return [tls_processor._extract_sni_with_scapy(sc.Ether(frame)) for frame in frames]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TLS ClientHello parsing.')
+    parser.add_argument('pcap', nargs='?', help='Capture file with TLS handshakes (synthesized if omitted)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per path (best is reported)')
+    parser.add_argument('--count', type=int, default=1000, help='Number of synthesized handshakes')
+    args = parser.parse_args()
+
+    if args.pcap:
+        frames = load_client_hello_frames(args.pcap)
+    else:
+        frames = generate_client_hello_frames(args.count)
+    if not frames:
+        raise SystemExit('No TLS ClientHello found.')
+
+    sc.load_layer('tls')
+
+    results = {'handshakes': len(frames), 'source': args.pcap or 'synthetic'}
+    sni_by_path = {}
+    for name, func in [('raw_parser', bench_raw_parser), ('scapy_dissector', bench_scapy_dissector)]:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start_ts = time.perf_counter()
+            sni_by_path[name] = func(frames)
+            best = min(best, time.perf_counter() - start_ts)
+        results[name] = {
+            'seconds': round(best, 6),
+            'handshakes_per_second': round(len(frames) / best),
+            'microseconds_per_handshake': round(best / len(frames) * 1e6, 2),
+        }
+
+    results['speedup'] = round(results['scapy_dissector']['seconds'] / results['raw_parser']['seconds'], 1)
+    results['sni_mismatches'] = sum(
+        1 for raw_sni, scapy_sni in zip(sni_by_path['raw_parser'], sni_by_path['scapy_dissector'])
+        if raw_sni != scapy_sni
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
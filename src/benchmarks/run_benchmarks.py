@@ -0,0 +1,267 @@
+"""
+Processor Throughput Benchmark Suite.
+
+Measures the packet processing hot path on deterministic synthetic IoT traffic (see
+`traffic_generator.py`), both stage by stage and end to end:
+- `process_packet_helper`: Scapy packets (dissection excluded) through the processor.
+- `process_raw_frame`: raw frames through the fast path (the `RAW_PACKET_QUEUE` mode).
+- `network_flows_insert` / `network_flows_update`: the batched `network_flows` upsert.
+- `oui_load`, `oui_csv_parse`, `get_vendor_cold`, `get_vendor_cached`, `get_vendors_batch`: loading
+  the prebuilt OUI index, parsing the IEEE CSV files it is built from, and vendor lookups (one by
+  one, and all at once).
+- `tracker_load`, `tracker_json_parse`, `is_ad_tracked`, `get_tracker_companies_batch`: loading the
+  precompiled tracker domains, parsing the DuckDuckGo JSON files they are built from, and tracker
+  lookups (one by one from a cold cache, and a whole hostname column at once).
+- `get_country_from_ip_addr`, `get_countries_from_ip_addrs_batch`: GeoIP lookups (one by one from cold
+  caches, and a whole address column at once).
+- `end_to_end_scapy` / `end_to_end_raw`: a pcap replay of the whole traffic, including reading,
+  dissection, flow flushes and the hostname sweep.
+
+Every timed benchmark reports the best of `--repeat` runs. Benchmarks whose dependencies are
+missing (e.g., the GeoLite2 database) report an `error` instead of timings. Results are printed as
+JSON (or written to `--output`), so that they can be compared between releases.
+
+Usage (from the `src` directory):
+    python -m benchmarks.run_benchmarks [--packets N] [--seed S] [--repeat R] [--output results.json]
+"""
+import argparse
+import importlib.metadata
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import scapy.all as sc
+
+from libinspector import oui_parser
+from libinspector import packet_processor
+from libinspector import replay
+from libinspector import tracker_index
+from libinspector.flow_accumulator import write_flows_to_db
+
+from . import traffic_generator
+
+
+def measure(func, items: list, repeat: int = 3, setup=None) -> dict:
+    """
+    Time `func(item)` over all items, keeping the best of `repeat` runs.
+
+    Args:
+        func (callable): The function to benchmark.
+        items (list): The arguments to call it with, one call per item.
+        repeat (int, optional): Number of runs.
+        setup (callable, optional): Called (untimed) before every run.
+
+    Returns:
+        dict: `operations`, `seconds`, `operations_per_second` and `microseconds_per_operation`.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start_ts = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start_ts)
+    return _timing(len(items), best)
+
+
+def _timing(operations: int, seconds: float) -> dict:
+    return {
+        'operations': operations,
+        'seconds': round(seconds, 6),
+        'operations_per_second': round(operations / seconds) if seconds else None,
+        'microseconds_per_operation': round(seconds / operations * 1e6, 3) if operations else None,
+    }
+
+
+def _reset_processor():
+    replay.initialize_replay_state(traffic_generator.HOST_MAC, traffic_generator.HOST_IP, traffic_generator.GATEWAY_IP)
+
+
+def bench_processor(frames: list, repeat: int) -> dict:
+    results = {}
+    packets = []
+    for ts, frame in frames:
+        pkt = sc.Ether(frame)
+        pkt.time = ts
+        packets.append(pkt)
+    results['process_packet_helper'] = measure(packet_processor.process_packet_helper, packets, repeat, _reset_processor)
+    results['process_raw_frame'] = measure(lambda item: packet_processor.process_raw_frame(*item), frames, repeat, _reset_processor)
+    packet_processor.flow_accumulator.pop_all()
+    return results
+
+
+def bench_flow_upsert(flow_count: int, repeat: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    flows = {}
+    for ix in range(flow_count):
+        flow_key = (
+            1700000000 + ix % 60, f'02:00:00:00:{ix // 256 % 256:02x}:{ix % 256:02x}', traffic_generator.GATEWAY_MAC,
+            f'192.168.1.{10 + ix % 200}', f'93.184.{rng.randrange(256)}.{rng.randrange(256)}',
+            rng.randrange(32768, 61000), rng.choice([53, 80, 123, 443, 8883]), rng.choice(['tcp', 'udp'])
+        )
+        flows[flow_key] = [rng.randint(60, 1500), 1, rng.randrange(1 << 32), rng.randrange(1 << 32)]
+
+    results = {}
+    best_insert = best_update = float('inf')
+    for _ in range(repeat):
+        conn, rw_lock = replay.initialize_replay_state()
+        start_ts = time.perf_counter()
+        write_flows_to_db(conn, rw_lock, flows)
+        best_insert = min(best_insert, time.perf_counter() - start_ts)
+        # The same keys again: every row takes the ON CONFLICT ... DO UPDATE path
+        start_ts = time.perf_counter()
+        write_flows_to_db(conn, rw_lock, flows)
+        best_update = min(best_update, time.perf_counter() - start_ts)
+    results['network_flows_insert'] = _timing(flow_count, best_insert)
+    results['network_flows_update'] = _timing(flow_count, best_update)
+    return results
+
+
+def bench_oui(mac_list: list, repeat: int) -> dict:
+    results = {}
+    oui_parser.load_oui_index.cache_clear()
+    start_ts = time.perf_counter()
+    oui_parser.load_oui_index()
+    results['oui_load'] = _timing(1, time.perf_counter() - start_ts)
+    oui_parser.parse_ieee_oui_database_from_local_csv.cache_clear()
+    start_ts = time.perf_counter()
+    oui_parser.parse_ieee_oui_database_from_local_csv()
+    results['oui_csv_parse'] = _timing(1, time.perf_counter() - start_ts)
+    results['get_vendor_cold'] = measure(oui_parser.get_vendor, mac_list, repeat, oui_parser.get_vendor.cache_clear)
+    results['get_vendor_cached'] = measure(oui_parser.get_vendor, mac_list[:500], repeat)
+    batch = measure(oui_parser.get_vendors, [mac_list], repeat)
+    results['get_vendors_batch'] = _timing(len(mac_list), batch['seconds'])
+    return results
+
+
+def bench_privacy(hostnames: list, ip_list: list, repeat: int) -> dict:
+    results = {}
+    try:
+        from libinspector import privacy
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+        return {name: {'error': error} for name in ('tracker_load', 'tracker_json_parse', 'is_ad_tracked', 'get_tracker_companies_batch', 'get_country_from_ip_addr', 'get_countries_from_ip_addrs_batch')}
+
+    def clear_country_caches():
+        privacy.get_country_from_ip_addr.cache_clear()
+        privacy.clear_country_network_cache()
+
+    privacy.initialize_ad_tracking_db.cache_clear()
+    start_ts = time.perf_counter()
+    privacy.initialize_ad_tracking_db()
+    results['tracker_load'] = _timing(1, time.perf_counter() - start_ts)
+    start_ts = time.perf_counter()
+    tracker_index.parse_tracker_json_files()
+    results['tracker_json_parse'] = _timing(1, time.perf_counter() - start_ts)
+    results['is_ad_tracked'] = measure(privacy.is_ad_tracked, hostnames, repeat, privacy.get_tracker.cache_clear)
+    batch = measure(privacy.get_tracker_companies, [hostnames], repeat)
+    results['get_tracker_companies_batch'] = _timing(len(hostnames), batch['seconds'])
+    results['get_country_from_ip_addr'] = measure(
+        privacy.get_country_from_ip_addr, ip_list, repeat, clear_country_caches
+    )
+    batch = measure(privacy.get_countries_from_ip_addrs, [ip_list], repeat, clear_country_caches)
+    results['get_countries_from_ip_addrs_batch'] = _timing(len(ip_list), batch['seconds'])
+    return results
+
+
+def bench_end_to_end(frames: list, repeat: int) -> dict:
+    results = {}
+    fd, pcap_path = tempfile.mkstemp(suffix='.pcap')
+    os.close(fd)
+    try:
+        with sc.RawPcapWriter(pcap_path, linktype=replay.LINKTYPE_ETHERNET) as writer:
+            writer.write_header(None)
+            for ts, frame in frames:
+                sec = int(ts)
+                writer.write_packet(frame, sec=sec, usec=int(round((ts - sec) * 1e6)))
+
+        for name, raw in [('end_to_end_scapy', False), ('end_to_end_raw', True)]:
+            best_report = None
+            for _ in range(repeat):
+                _reset_processor()
+                report = replay.replay(
+                    pcap_path, raw=raw, host_mac_addr=traffic_generator.HOST_MAC,
+                    host_ip_addr=traffic_generator.HOST_IP, gateway_ip_addr=traffic_generator.GATEWAY_IP
+                )
+                if best_report is None or report['wall_seconds'] < best_report['wall_seconds']:
+                    best_report = report
+            result = _timing(best_report['packets'], best_report['wall_seconds'])
+            result['stage_seconds'] = best_report['stage_seconds']
+            result['row_counts'] = best_report['row_counts']
+            results[name] = result
+    finally:
+        os.remove(pcap_path)
+    return results
+
+
+def run(packets: int = 20000, seed: int = 0, repeat: int = 3) -> dict:
+    """
+    Run the whole benchmark suite.
+
+    Args:
+        packets (int, optional): Approximate number of synthetic frames.
+        seed (int, optional): Seed of the traffic generator.
+        repeat (int, optional): Number of runs per benchmark (the best is reported).
+
+    Returns:
+        dict: `metadata` about the run and `results` per benchmark.
+    """
+    frames = traffic_generator.generate_traffic(seed=seed, target_packets=packets)
+    rng = random.Random(seed)
+    mac_list = traffic_generator.generate_device_macs(5000, rng)
+    ip_list = traffic_generator.generate_remote_ips(5000, rng)
+    hostnames = [
+        f'{rng.choice(["", "www.", "api.", "metrics."])}{rng.choice(traffic_generator.HOSTNAMES)}'
+        for _ in range(5000)
+    ]
+
+    try:
+        version = importlib.metadata.version('libinspector')
+    except importlib.metadata.PackageNotFoundError:
+        version = 'unknown'
+
+    results = {}
+    results.update(bench_processor(frames, repeat))
+    results.update(bench_flow_upsert(10000, repeat, seed))
+    results.update(bench_oui(mac_list, repeat))
+    results.update(bench_privacy(hostnames, ip_list, repeat))
+    results.update(bench_end_to_end(frames, repeat))
+
+    return {
+        'metadata': {
+            'libinspector_version': version,
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': int(time.time()),
+            'seed': seed,
+            'packets': len(frames),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the libinspector throughput benchmarks.')
+    parser.add_argument('--packets', type=int, default=20000, help='Approximate number of synthetic frames (default: 20000)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the traffic generator (default: 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the best is reported (default: 3)')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    results = run(args.packets, args.seed, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
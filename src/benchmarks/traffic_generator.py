@@ -0,0 +1,211 @@
+"""
+Deterministic Synthetic IoT Traffic Generator.
+
+Generates the Ethernet frames that the Inspector host would capture on a typical IoT network
+while ARP spoofing: every device-to-internet packet is seen twice, once on its way from the device
+to the Inspector host and once as forwarded by the Inspector host to the gateway (and vice versa
+for the responses). The traffic mix consists of:
+- ARP chatter from every device;
+- DNS bursts: queries and responses with several A records, some for tracker domains;
+- many small UDP flows (telemetry, NTP-like and STUN-like exchanges);
+- a few long TCP streams (video, firmware downloads), each starting with a TLS ClientHello.
+
+The same seed always produces the same frames, so benchmark results are comparable across runs.
+Headers are packed with `struct` (building tens of thousands of frames with Scapy takes tens of
+seconds); Scapy only builds the DNS and TLS payloads.
+"""
+import random
+import socket
+import struct
+
+import scapy.all as sc
+from scapy.layers.tls.handshake import TLSClientHello
+from scapy.layers.tls.extensions import TLS_Ext_ServerName, ServerName
+
+HOST_MAC = '02:00:00:00:00:01'
+HOST_IP = '192.168.1.2'
+GATEWAY_MAC = '02:00:00:00:00:fe'
+GATEWAY_IP = '192.168.1.1'
+
+# OUIs of common IoT vendors (Raspberry Pi, Google, Amazon, Philips Hue, Espressif, Sonos, TP-Link)
+DEVICE_OUIS = ['b8:27:eb', 'f4:f5:d8', '44:65:0d', '00:17:88', '24:0a:c4', '48:a6:b8', '50:c7:bf']
+
+HOSTNAMES = [
+    'time.example.com', 'api.iot-vendor.io', 'telemetry.iot-vendor.io', 'firmware.iot-vendor.io',
+    'video.example.net', 'doubleclick.net', 'stats.g.doubleclick.net', 'graph.facebook.com',
+    'app-measurement.com', 'device-metrics-us.amazon.com', 'clients4.google.com', 'ntp.ubuntu.com',
+]
+
+
+def generate_device_macs(count: int, rng: random.Random) -> list:
+    """
+    Return `count` device MAC addresses: mostly vendor OUIs, some randomized (locally administered).
+    """
+    macs = []
+    for ix in range(count):
+        suffix = ':'.join(f'{rng.randrange(256):02x}' for _ in range(3))
+        if ix % 5 == 4:
+            prefix = f'{(rng.randrange(256) | 0x02) & 0xfe:02x}:{rng.randrange(256):02x}:{rng.randrange(256):02x}'
+        else:
+            prefix = DEVICE_OUIS[ix % len(DEVICE_OUIS)]
+        macs.append(f'{prefix}:{suffix}')
+    return macs
+
+
+def generate_remote_ips(count: int, rng: random.Random) -> list:
+    """Return `count` public IPv4 addresses."""
+    return [f'{rng.choice([23, 34, 52, 93, 104, 142, 151, 172])}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}' for _ in range(count)]
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+def build_ip_packet(src_ip: str, dst_ip: str, protocol: str, sport: int, dport: int, payload: bytes,
+                    seq: int = 0, tcp_flags: int = 0x10) -> bytes:
+    """
+    Build an IPv4 packet carrying a TCP or UDP segment, with valid checksums.
+
+    Args:
+        src_ip (str): Source IP address.
+        dst_ip (str): Destination IP address.
+        protocol (str): Either 'tcp' or 'udp'.
+        sport (int): Source port.
+        dport (int): Destination port.
+        payload (bytes): The TCP/UDP payload.
+        seq (int, optional): TCP sequence number.
+        tcp_flags (int, optional): TCP flags (ACK by default).
+
+    Returns:
+        bytes: The IPv4 packet.
+    """
+    src = socket.inet_aton(src_ip)
+    dst = socket.inet_aton(dst_ip)
+    if protocol == 'tcp':
+        proto = 6
+        l4_header = struct.pack('!HHIIBBHHH', sport, dport, seq, 0, 5 << 4, tcp_flags, 65535, 0, 0)
+    else:
+        proto = 17
+        l4_header = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0)
+    segment = l4_header + payload
+    l4_checksum = _checksum(src + dst + struct.pack('!BBH', 0, proto, len(segment)) + segment)
+    checksum_offset = 16 if proto == 6 else 6
+    segment = segment[:checksum_offset] + struct.pack('!H', l4_checksum) + segment[checksum_offset + 2:]
+
+    ip_header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(segment), 1, 0, 64, proto, 0, src, dst)
+    ip_header = ip_header[:10] + struct.pack('!H', _checksum(ip_header)) + ip_header[12:]
+    return ip_header + segment
+
+
+def build_arp_frame(src_mac: str, src_ip: str, dst_ip: str, op: int) -> bytes:
+    """Build a broadcast ARP request (op 1) or reply (op 2) frame."""
+    src_mac_bytes = bytes.fromhex(src_mac.replace(':', ''))
+    return (
+        b'\xff' * 6 + src_mac_bytes + b'\x08\x06' +
+        struct.pack('!HHBBH', 1, 0x0800, 6, 4, op) +
+        src_mac_bytes + socket.inet_aton(src_ip) + b'\x00' * 6 + socket.inet_aton(dst_ip)
+    )
+
+
+def _ether_header(src_mac: str, dst_mac: str) -> bytes:
+    return bytes.fromhex(dst_mac.replace(':', '') + src_mac.replace(':', '')) + b'\x08\x00'
+
+
+def _spoofed_legs(device_mac: str, ip_packet: bytes, outbound: bool) -> list:
+    # The two Ethernet legs of a packet relayed by the Inspector host
+    if outbound:
+        return [
+            _ether_header(device_mac, HOST_MAC) + ip_packet,
+            _ether_header(HOST_MAC, GATEWAY_MAC) + ip_packet,
+        ]
+    return [
+        _ether_header(GATEWAY_MAC, HOST_MAC) + ip_packet,
+        _ether_header(HOST_MAC, device_mac) + ip_packet,
+    ]
+
+
+def generate_traffic(seed: int = 0, device_count: int = 50, duration: float = 60.0, target_packets: int = 20000) -> list:
+    """
+    Generate a realistic mix of IoT traffic.
+
+    Args:
+        seed (int, optional): Seed of the random generator.
+        device_count (int, optional): Number of devices on the network.
+        duration (float, optional): Capture duration in seconds; timestamps are spread over it.
+        target_packets (int, optional): Approximate number of frames to generate.
+
+    Returns:
+        list[tuple[float, bytes]]: `(timestamp, frame)` tuples, sorted by timestamp.
+    """
+    rng = random.Random(seed)
+    start_ts = 1700000000.0
+    device_macs = generate_device_macs(device_count, rng)
+    device_ips = [f'192.168.1.{10 + ix}' for ix in range(device_count)]
+    remote_ips = generate_remote_ips(200, rng)
+
+    frames = []
+
+    def add(ts, frame_list):
+        for frame in frame_list:
+            frames.append((ts, frame))
+
+    # ARP chatter (about 5% of the frames)
+    for _ in range(target_packets // 20):
+        ix = rng.randrange(device_count)
+        add(start_ts + rng.random() * duration, [build_arp_frame(device_macs[ix], device_ips[ix], GATEWAY_IP, rng.choice([1, 2]))])
+
+    # DNS bursts (about 10%): a query and a response, each seen on both legs
+    for _ in range(target_packets // 40):
+        ix = rng.randrange(device_count)
+        ts = start_ts + rng.random() * duration
+        hostname = rng.choice(HOSTNAMES)
+        sport = rng.randrange(32768, 61000)
+        dns_id = rng.randrange(65536)
+        query = bytes(sc.DNS(id=dns_id, rd=1, qd=sc.DNSQR(qname=hostname)))
+        answers = [sc.DNSRR(rrname=hostname, type='A', ttl=rng.choice([30, 60, 300]), rdata=rng.choice(remote_ips)) for _ in range(rng.randint(1, 4))]
+        response = bytes(sc.DNS(id=dns_id, qr=1, rd=1, ra=1, qd=sc.DNSQR(qname=hostname), an=answers))
+        query = build_ip_packet(device_ips[ix], GATEWAY_IP, 'udp', sport, 53, query)
+        response = build_ip_packet(GATEWAY_IP, device_ips[ix], 'udp', 53, sport, response)
+        add(ts, _spoofed_legs(device_macs[ix], query, True))
+        add(ts + 0.01, _spoofed_legs(device_macs[ix], response, False))
+
+    # Long TCP streams (about 55%): a few flows carrying most of the packets
+    stream_count = max(1, device_count // 10)
+    stream_packets = (target_packets * 55 // 100) // (2 * stream_count)
+    stream_payload = b'\x17' * 1400
+    for _ in range(stream_count):
+        ix = rng.randrange(device_count)
+        remote_ip = rng.choice(remote_ips)
+        sport = rng.randrange(32768, 61000)
+        ts = start_ts + rng.random() * duration / 2
+        client_hello = TLSClientHello(
+            gmt_unix_time=int(ts), random_bytes=rng.randbytes(28),
+            ext=[TLS_Ext_ServerName(servernames=[ServerName(servername=rng.choice(HOSTNAMES).encode())])]
+        )
+        hello_body = bytes(client_hello)
+        hello = b'\x16\x03\x01' + len(hello_body).to_bytes(2, 'big') + hello_body
+        add(ts, _spoofed_legs(device_macs[ix], build_ip_packet(device_ips[ix], remote_ip, 'tcp', sport, 443, hello, seq=1, tcp_flags=0x18), True))
+        seq = 1
+        for _ in range(stream_packets):
+            ts += rng.expovariate(stream_packets / (duration / 2))
+            segment = build_ip_packet(remote_ip, device_ips[ix], 'tcp', 443, sport, stream_payload, seq=seq)
+            seq += 1400
+            add(ts, _spoofed_legs(device_macs[ix], segment, False))
+
+    # Many small UDP flows (about 30%)
+    for _ in range(target_packets * 30 // 100 // 2):
+        ix = rng.randrange(device_count)
+        udp = build_ip_packet(
+            device_ips[ix], rng.choice(remote_ips), 'udp',
+            rng.randrange(32768, 61000), rng.choice([123, 3478, 8883, 10001]),
+            rng.randbytes(rng.randint(20, 200))
+        )
+        add(start_ts + rng.random() * duration, _spoofed_legs(device_macs[ix], udp, True))
+
+    frames.sort(key=lambda item: item[0])
+    return frames
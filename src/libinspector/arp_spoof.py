@@ -32,6 +32,7 @@ import logging
 from . import global_state
 from . import networking
 from . import common
+from . import mem_db
 
 
 logger = logging.getLogger(__name__)
@@ -57,11 +58,9 @@ def start():
     if not common.inspector_is_running():
         return
 
-    conn, rw_lock = global_state.db_conn_and_lock
-
     # Get all inspected devices
     inspected_device_list = []
-    with rw_lock:
+    with mem_db.read_connection() as conn:
         sql = """
             SELECT mac_address, ip_address
             FROM devices
@@ -7,15 +7,21 @@ standardized way.
 
 Functions:
     get_os(): Detects the current operating system and returns a normalized string.
+    load_prebuilt_data(): Loads a lookup table shipped prebuilt in the package data, or builds it
+        in memory if it does not match its source files.
 
 Typical usage:
     from libinspector.common import get_os
     os_name = get_os()
 """
+import hashlib
+import logging
 import sys
 import os
 from . import global_state
 
+logger = logging.getLogger(__name__)
+
 
 def get_env_bool(name: str, default: bool = True):
     """
@@ -31,6 +37,22 @@ def get_env_bool(name: str, default: bool = True):
     return value.lower() in ['true', '1', 't', 'y', 'yes']
 
 
+def get_env_int(name: str, default: int) -> int:
+    """
+    Helper function to read an integer environment variable.
+    Args:
+        name (str): The name of the environment variable to read.
+        default (int): The default value to return if the environment variable is not set or not an integer.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
 def inspector_is_running() -> bool:
     """
     Check if the Inspector is currently running.
@@ -97,3 +119,70 @@ def is_admin() -> bool:
         return ctypes.windll.shell32.IsUserAnAdmin()
     else:
         raise RuntimeError('Unsupported operating system for admin check.')
+
+
+def get_data_file_paths(data_dir: str, suffix: str) -> list:
+    """
+    Return the paths of the files in `data_dir` whose names end with `suffix`, sorted by name.
+    """
+    try:
+        filenames = sorted(filename for filename in os.listdir(data_dir) if filename.endswith(suffix))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(data_dir, filename) for filename in filenames]
+
+
+def get_data_fingerprint(paths: list) -> bytes:
+    """
+    Identify a set of data files by their names and contents.
+
+    Args:
+        paths (list): The files, in a stable order.
+
+    Returns:
+        bytes: A SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(f'{os.path.basename(path)}\n'.encode('utf-8'))
+        with open(path, 'rb') as fp:
+            digest.update(hashlib.sha256(fp.read()).digest())
+    return digest.digest()
+
+
+def write_data_file(path: str, data: bytes):
+    """Write a file atomically, so that concurrent readers never see a partial file."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fp:
+        fp.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_prebuilt_data(name: str, load_func, build_func, source_paths: list):
+    """
+    Load a lookup table that is prebuilt from data files and shipped with the package.
+
+    The shipped table is used if it was built from exactly the source files next to it (or if there
+    are no source files). Otherwise, the table is built from the source files in memory; nothing is
+    written into the package data at runtime, since the update workflow rebuilds the shipped table
+    whenever it downloads new source files.
+
+    Args:
+        name (str): The name of the table in log messages.
+        load_func (callable): Reads the shipped table and returns `(fingerprint, table)`; raises
+            OSError or ValueError if the table cannot be read.
+        build_func (callable): Builds the table from the source files, given their fingerprint.
+        source_paths (list): The source files.
+
+    Returns:
+        The table.
+    """
+    fingerprint = get_data_fingerprint(source_paths)
+    try:
+        table_fingerprint, table = load_func()
+        if table_fingerprint == fingerprint or not source_paths:
+            return table
+        logger.warning(f'[common] The {name} is out of date with its source files; building it in memory')
+    except (OSError, ValueError) as e:
+        logger.warning(f'[common] Cannot load the {name} ({e}); building it in memory from its source files')
+    return build_func(fingerprint)
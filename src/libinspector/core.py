@@ -10,7 +10,8 @@ for running Inspector as a standalone application.
 Functions:
     start_threads(custom_packet_callback_func=None): Initializes and starts all Inspector threads.
     clean_up(): Disables IP forwarding and performs cleanup tasks.
-    main(): Runs Inspector as a standalone application, handling process lifecycle and shutdown.
+    main(): Runs Inspector as a standalone application, handling process lifecycle and shutdown,
+        or replays a capture file with `libinspector replay <file.pcap>`.
 
 Dependencies:
     logging, time, os, sys, global_state, mem_db, networking, safe_loop, arp_scanner,
@@ -20,9 +21,12 @@ Typical usage:
     python -m libinspector.core
 """
 import logging
+import os
 import time
 import sys
+import threading
 from typing import Callable, Optional
+import scapy.all as sc
 from . import global_state
 from . import mem_db
 from . import networking
@@ -30,10 +34,14 @@ from . import safe_loop
 from . import arp_scanner
 from . import packet_collector
 from . import packet_processor
+from . import packet_queue
+from . import flow_rollup
+from . import db_retention
 from . import arp_spoof
 from . import ssdp_discovery
 from . import mdns_discovery
 from . import common
+from . import oui_parser
 
 LOG_FILE = 'inspector.log'
 
@@ -41,6 +49,24 @@ logging.basicConfig(filename=LOG_FILE, level=logging.DEBUG, format='%(asctime)s
 logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
 logger = logging.getLogger(__name__)
 
+def warm_up_lookup_tables():
+    """
+    Load the OUI index and the tracker domains ahead of their first lookup, so that neither the
+    packet processor nor the first API request pays for it. Runs once, in a background thread.
+    """
+    try:
+        oui_parser.load_oui_index()
+    except Exception:
+        logger.exception('[core] Cannot load the OUI index')
+
+    # Imported here: importing `privacy` opens the GeoLite2 database, which core does not otherwise need
+    try:
+        from . import privacy
+        privacy.initialize_ad_tracking_db()
+    except Exception:
+        logger.exception('[core] Cannot load the tracker domains')
+
+
 def start_threads(custom_packet_callback_func: Optional[Callable] = None):
     """
     Initialize and starts all core Inspector threads and services.
@@ -53,10 +79,12 @@ def start_threads(custom_packet_callback_func: Optional[Callable] = None):
       - Packet collection and processing
       - ARP spoofing
       - mDNS and SSDP/UPnP device discovery
+      - Loading the OUI and tracker lookup tables (once)
 
     Args:
         custom_packet_callback_func (callable, optional): A user-supplied callback function
-            to process packets. If provided, it will be used by the packet processor.
+            to process packets. If provided, it will be used by the packet processor,
+            and Scapy's TLS layers are loaded so that it receives dissected TLS packets.
     """
     # Make sure that only one single instance of Inspector core is running
     with global_state.global_state_lock:
@@ -69,6 +97,23 @@ def start_threads(custom_packet_callback_func: Optional[Callable] = None):
 
     logger.info('[core] Starting Inspector')
 
+    # Inspector parses TLS from the raw bytes, but custom callbacks still get packets with their
+    # TLS layers dissected by Scapy
+    if custom_packet_callback_func is not None:
+        sc.load_layer('tls')
+
+    # Bound the packet queue so that a stalled processor cannot exhaust memory
+    queue_max_size = common.get_env_int('PACKET_QUEUE_MAX_SIZE', packet_queue.DEFAULT_MAX_SIZE)
+    queue_drop_policy = os.environ.get('PACKET_QUEUE_DROP_POLICY', packet_queue.DROP_BULK_FIRST).strip().lower()
+    if queue_drop_policy not in packet_queue.DROP_POLICIES:
+        logger.warning(f'[core] Unknown PACKET_QUEUE_DROP_POLICY "{queue_drop_policy}"; using {packet_queue.DROP_BULK_FIRST}')
+        queue_drop_policy = packet_queue.DROP_BULK_FIRST
+    global_state.packet_queue.configure(queue_max_size, queue_drop_policy)
+    logger.info(f'[core] Packet queue: max size {queue_max_size}, drop policy {queue_drop_policy}')
+
+    # Load the lookup tables while the rest of Inspector starts
+    threading.Thread(target=warm_up_lookup_tables, name='Warm Up', daemon=True).start()
+
     # Initialize the database
     logger.info('[core] Initializing the database')
     conn, exclusive_lock = mem_db.initialize_db()
@@ -99,7 +144,12 @@ def start_threads(custom_packet_callback_func: Optional[Callable] = None):
         # Collect and process packets from the network
         safe_loop.SafeLoopThread(packet_collector.start, name="packet_collector"),
         safe_loop.SafeLoopThread(packet_processor.start, name="packet_processor"),
-        safe_loop.SafeLoopThread(packet_processor.update_hostnames_in_flows, name="Update Hostnames", sleep_time=120),
+        safe_loop.SafeLoopThread(packet_processor.flush_flows, name="Flush Flows", sleep_time=packet_processor.FLOW_FLUSH_INTERVAL),
+        safe_loop.SafeLoopThread(packet_processor.update_hostnames_in_flows, name="Update Hostnames", sleep_time=packet_processor.HOSTNAME_UPDATE_INTERVAL),
+        # Merge older flows into the per-minute and per-hour tables
+        safe_loop.SafeLoopThread(flow_rollup.start, name="Flow Rollup", sleep_time=60),
+        # Keep the database within its maximum ages and memory budget
+        safe_loop.SafeLoopThread(db_retention.start, name="DB Retention", sleep_time=60),
         # Spoof internet traffic
         safe_loop.SafeLoopThread(arp_spoof.start, name="arp_spoof", sleep_time=10),
         # Start the mDNS and UPnP scanner threads
@@ -139,6 +189,18 @@ def clean_up():
         msg = f"[core] {status}: Thread '{th.name}'"
         logger.info(msg)
 
+    # Release the capture socket or ring
+    packet_collector.close_capture_session()
+
+    # Write the flows that are still aggregated in memory
+    try:
+        packet_processor.flush_flows()
+    except Exception:
+        logger.exception("Error occurred while flushing flows during cleanup.")
+
+    # Remove the database files of the `wal` mode
+    mem_db.remove_db_files()
+
     try:
         networking.disable_ip_forwarding()
     except RuntimeError:
@@ -153,7 +215,15 @@ def main():
     This function checks for root privileges, starts all Inspector threads,
     and enters a loop to keep the application running until interrupted or
     signaled to stop. Handles graceful shutdown on KeyboardInterrupt.
+
+    With the `replay` subcommand, it instead replays a pcap/pcapng file through the
+    packet processor (see `replay.py`), which requires neither root nor live capture.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+        from . import replay
+        replay.main(sys.argv[2:])
+        return
+
     # Ensure that we are running as root
     if not common.is_admin():
         logger.error('[networking] Inspector must be run as root to enable IP forwarding.')
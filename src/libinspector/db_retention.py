@@ -0,0 +1,174 @@
+"""
+Database Retention and Memory Budget.
+
+The Inspector's database lives in memory by default and nothing else ever deletes from it, so it
+grows for as long as the process runs. This module periodically prunes it:
+- Maximum age per table: rows older than the table's `RETENTION_*` setting are deleted (flows by
+  `timestamp`, hostnames by `updated_ts`). `devices` is never pruned.
+- Memory budget: while the pages in use (`PRAGMA page_count` minus `freelist_count`, times
+  `page_size`) exceed `DB_MEMORY_BUDGET_MB`, the oldest flow rows are deleted, whichever flow
+  table they are in. Freed pages are reused by SQLite for new rows.
+
+Rows are deleted in batches of `RETENTION_BATCH_SIZE` along the timestamp indexes, taking the
+database lock once per batch, so that the packet processor never waits long for it. Every run
+logs, and returns, how many rows it evicted from each table.
+
+Intended Usage:
+    SafeLoopThread(db_retention.start, name='DB Retention', sleep_time=60)
+"""
+import collections
+import logging
+import time
+
+from . import common
+from . import global_state
+from . import mem_db
+
+logger = logging.getLogger(__name__)
+
+# Maximum age in seconds of the rows of each table; 0 keeps rows forever. Fine-grained flows are
+# rolled up into the coarser tables (see `flow_rollup.py`) rather than deleted.
+RETENTION_MAX_AGE = {
+    'network_flows': common.get_env_int('RETENTION_NETWORK_FLOWS', 0),
+    'network_flows_minute': common.get_env_int('RETENTION_NETWORK_FLOWS_MINUTE', 7 * 86400),
+    'network_flows_hour': common.get_env_int('RETENTION_NETWORK_FLOWS_HOUR', 90 * 86400),
+    'hostnames': common.get_env_int('RETENTION_HOSTNAMES', 0),
+}
+
+# The column by which the age of a table's rows is determined
+_TIMESTAMP_COLUMNS = {
+    'network_flows': 'timestamp',
+    'network_flows_minute': 'timestamp',
+    'network_flows_hour': 'timestamp',
+    'hostnames': 'updated_ts',
+}
+
+# Upper bound on the pages in use by the database; 0 disables the budget
+DB_MEMORY_BUDGET_MB = common.get_env_int('DB_MEMORY_BUDGET_MB', 512)
+
+# Rows deleted per batch, i.e., per acquisition of the database lock
+RETENTION_BATCH_SIZE = common.get_env_int('RETENTION_BATCH_SIZE', 500)
+
+# Batches deleted per run at most, so that a run always ends
+MAX_BATCHES_PER_RUN = 2000
+
+
+def get_db_size(conn, rw_lock) -> int:
+    """
+    Return the number of bytes in the database pages that are in use.
+
+    Args:
+        conn: The SQLite connection.
+        rw_lock (threading.Lock): The database write lock.
+
+    Returns:
+        int: `(page_count - freelist_count) * page_size`.
+    """
+    with rw_lock:
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist_count = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return (page_count - freelist_count) * page_size
+
+
+def delete_batch(conn, rw_lock, table: str, cutoff_ts: int | None = None, batch_size: int = RETENTION_BATCH_SIZE) -> int:
+    """
+    Delete one batch of the oldest rows of a table.
+
+    Args:
+        conn: The SQLite connection.
+        rw_lock (threading.Lock): The database write lock.
+        table (str): A table of `RETENTION_MAX_AGE`.
+        cutoff_ts (int, optional): Only delete rows older than this timestamp.
+        batch_size (int, optional): Maximum number of rows to delete.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    ts_column = _TIMESTAMP_COLUMNS[table]
+    where_clause = f'WHERE {ts_column} < ?' if cutoff_ts is not None else ''
+    params = (cutoff_ts, batch_size) if cutoff_ts is not None else (batch_size,)
+    with rw_lock:
+        return conn.execute(f'''
+            DELETE FROM {table} WHERE rowid IN (
+                SELECT rowid FROM {table} {where_clause} ORDER BY {ts_column} LIMIT ?
+            )
+        ''', params).rowcount
+
+
+def get_oldest_flow_table(conn, rw_lock) -> str | None:
+    """
+    Return the flow table that holds the oldest flow row, or None if all flow tables are empty.
+    """
+    oldest_table = oldest_ts = None
+    with rw_lock:
+        for table in mem_db.FLOW_TABLES:
+            ts = conn.execute(f'SELECT MIN(timestamp) FROM {table}').fetchone()[0]
+            if ts is not None and (oldest_ts is None or ts < oldest_ts):
+                oldest_table, oldest_ts = table, ts
+    return oldest_table
+
+
+def enforce_retention(conn, rw_lock, now: float | None = None, memory_budget_bytes: int | None = None) -> dict:
+    """
+    Delete the rows that are too old, then the oldest flows while the database exceeds its budget.
+
+    Args:
+        conn: The SQLite connection (in autocommit mode).
+        rw_lock (threading.Lock): The database write lock.
+        now (float, optional): The current time; defaults to `time.time()`.
+        memory_budget_bytes (int, optional): Defaults to `DB_MEMORY_BUDGET_MB`; 0 disables the budget.
+
+    Returns:
+        dict: `max_age` and `memory_budget`, each mapping a table to the number of rows evicted
+        from it for that reason, and `db_size_bytes` after eviction.
+    """
+    if now is None:
+        now = time.time()
+    if memory_budget_bytes is None:
+        memory_budget_bytes = DB_MEMORY_BUDGET_MB * 1024 * 1024
+
+    evicted_by_age = collections.Counter()
+    evicted_by_budget = collections.Counter()
+    batch_count = 0
+
+    for table, max_age in RETENTION_MAX_AGE.items():
+        if max_age <= 0:
+            continue
+        cutoff_ts = int(now - max_age)
+        while batch_count < MAX_BATCHES_PER_RUN:
+            row_count = delete_batch(conn, rw_lock, table, cutoff_ts)
+            batch_count += 1
+            evicted_by_age[table] += row_count
+            if row_count < RETENTION_BATCH_SIZE:
+                break
+
+    db_size = get_db_size(conn, rw_lock)
+    while memory_budget_bytes > 0 and db_size > memory_budget_bytes and batch_count < MAX_BATCHES_PER_RUN:
+        table = get_oldest_flow_table(conn, rw_lock)
+        if table is None:
+            break
+        evicted_by_budget[table] += delete_batch(conn, rw_lock, table)
+        batch_count += 1
+        db_size = get_db_size(conn, rw_lock)
+
+    return {
+        'max_age': {table: count for table, count in evicted_by_age.items() if count},
+        'memory_budget': {table: count for table, count in evicted_by_budget.items() if count},
+        'db_size_bytes': db_size,
+    }
+
+
+def start():
+    """
+    Enforce the retention settings on the Inspector's database; runs periodically in its own thread.
+    """
+    conn, rw_lock = global_state.db_conn_and_lock
+    report = enforce_retention(conn, rw_lock)
+    if report['max_age'] or report['memory_budget']:
+        logger.info(
+            f"[db_retention] Evicted rows past their maximum age: {report['max_age']}; "
+            f"over the memory budget: {report['memory_budget']}; database size: {report['db_size_bytes'] / 1e6:.1f} MB"
+        )
+    if DB_MEMORY_BUDGET_MB > 0 and report['db_size_bytes'] > DB_MEMORY_BUDGET_MB * 1024 * 1024:
+        logger.warning(f"[db_retention] The database ({report['db_size_bytes'] / 1e6:.1f} MB) still exceeds its budget of {DB_MEMORY_BUDGET_MB} MB")
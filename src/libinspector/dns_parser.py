@@ -0,0 +1,139 @@
+"""
+Wire-Format DNS Message Parser.
+
+DNS is one of the heaviest packet classes on IoT networks, and Scapy's DNS dissector is slow:
+every `pkt[sc.DNSRR][ix]` walks the resource record chain from the start. This module decodes
+the question name and the A records of a DNS message directly from the UDP (or TCP) payload
+bytes in a single linear pass, following name compression pointers with loop protection and
+checking every length against the bytes that are actually present.
+
+Intended Usage:
+    message = parse_dns_message(udp_payload)
+    if message is not None:
+        ...  # message.qname, message.a_records
+"""
+import socket
+import struct
+from typing import NamedTuple
+
+DNS_TYPE_A = 1
+DNS_CLASS_IN = 1
+
+_dns_header_struct = struct.Struct('!HHHHHH')  # ID, flags, QDCOUNT, ANCOUNT, NSCOUNT, ARCOUNT
+_rr_struct = struct.Struct('!HHIH')  # type, class, TTL, RDLENGTH
+
+# A name can have at most 127 labels; more compression jumps than that means a pointer loop
+_MAX_POINTER_JUMPS = 128
+
+
+class DnsMessage(NamedTuple):
+    """
+    The parts of a DNS message that the Inspector is interested in.
+    """
+    is_response: bool
+    qname: str | None
+    a_records: tuple[tuple[str, int], ...] = ()   # (IPv4 address, TTL) of each A answer
+
+
+def parse_dns_message(payload: bytes) -> DnsMessage | None:
+    """
+    Parse the first question and the A answers of a DNS message.
+
+    Args:
+        payload (bytes): The DNS message, i.e., the UDP payload (without the 2-byte length prefix
+            used over TCP).
+
+    Returns:
+        DnsMessage or None: The parsed message, or None if the message is malformed or truncated.
+        The question name is lowercased and has no trailing dot; it is None if the message has
+        no question.
+    """
+    if len(payload) < 12:
+        return None
+
+    _, flags, qdcount, ancount, _, _ = _dns_header_struct.unpack_from(payload, 0)
+    offset = 12
+
+    qname = None
+    for ix in range(qdcount):
+        if ix == 0:
+            name, offset = _read_name(payload, offset)
+            if name is None:
+                return None
+            try:
+                qname = name.decode('utf-8').lower()
+            except UnicodeDecodeError:
+                return None
+        else:
+            offset = _skip_name(payload, offset)
+            if offset is None:
+                return None
+        offset += 4  # QTYPE, QCLASS
+        if offset > len(payload):
+            return None
+
+    a_records = []
+    for _ in range(ancount):
+        offset = _skip_name(payload, offset)
+        if offset is None or offset + 10 > len(payload):
+            return None
+        rr_type, rr_class, ttl, rdlength = _rr_struct.unpack_from(payload, offset)
+        offset += 10
+        if offset + rdlength > len(payload):
+            return None
+        if rr_type == DNS_TYPE_A and rdlength == 4:
+            a_records.append((socket.inet_ntoa(payload[offset:offset + 4]), ttl))
+        offset += rdlength
+
+    return DnsMessage(bool(flags & 0x8000), qname, tuple(a_records))
+
+
+def _read_name(payload: bytes, offset: int) -> tuple[bytes | None, int]:
+    # Returns the dotted name (without trailing dot) and the offset right after the name where it
+    # appears in the message, i.e., after the first compression pointer if there is one.
+    labels = []
+    end_offset = None
+    jumps = 0
+    payload_len = len(payload)
+
+    while True:
+        if offset >= payload_len:
+            return None, offset
+        length = payload[offset]
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xc0 == 0xc0:
+            # Compression pointer
+            if offset + 2 > payload_len or jumps >= _MAX_POINTER_JUMPS:
+                return None, offset
+            if end_offset is None:
+                end_offset = offset + 2
+            offset = ((length & 0x3f) << 8) | payload[offset + 1]
+            jumps += 1
+            continue
+        if length & 0xc0:
+            # Reserved label types
+            return None, offset
+        offset += 1
+        if offset + length > payload_len:
+            return None, offset
+        labels.append(payload[offset:offset + length])
+        offset += length
+
+    return b'.'.join(labels), end_offset if end_offset is not None else offset
+
+
+def _skip_name(payload: bytes, offset: int) -> int | None:
+    # Returns the offset right after a name, without decoding it
+    payload_len = len(payload)
+    while offset < payload_len:
+        length = payload[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xc0 == 0xc0:
+            return offset + 2 if offset + 2 <= payload_len else None
+        if length & 0xc0:
+            return None
+        offset += 1 + length
+    return None
@@ -0,0 +1,128 @@
+"""
+Per-Flow Deep Packet Inspection (DPI) State.
+
+The TLS SNI and HTTP User-Agent extractors only ever find something in the first few
+payload-bearing packets of a TCP connection. This module keeps a small, bounded table of
+per-flow DPI state, keyed by the 5-tuple, so that the packet processor can stop inspecting a
+flow once its first N payload-bearing packets have been checked, or once an SNI or User-Agent
+has been found. A multi-gigabyte video stream then costs a dictionary lookup per packet rather
+than a deep parse.
+
+Entries expire after an idle timeout; when the table is full, the least recently used entry is
+evicted.
+
+Intended Usage:
+    dpi_table = FlowDpiTable()
+    if dpi_table.should_inspect(five_tuple):
+        found = process_client_hello(pkt)
+        dpi_table.record_result(five_tuple, found)
+"""
+import collections
+import threading
+import time
+
+
+class FlowDpiTable(object):
+    """
+    A bounded LRU table that tracks which flows still need deep packet inspection.
+
+    Args:
+        max_packets_per_flow (int, optional): Number of payload-bearing packets to inspect per flow.
+        max_flows (int, optional): Maximum number of flows tracked at once.
+        idle_timeout (int, optional): Seconds after which an idle flow's state is forgotten.
+    """
+
+    def __init__(self, max_packets_per_flow: int = 5, max_flows: int = 65536, idle_timeout: int = 300):
+        """
+        Initialize an empty table.
+
+        Args:
+            max_packets_per_flow (int, optional): Number of payload-bearing packets to inspect per flow.
+            max_flows (int, optional): Maximum number of flows tracked at once.
+            idle_timeout (int, optional): Seconds after which an idle flow's state is forgotten.
+        """
+        self.max_packets_per_flow = max_packets_per_flow
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # Maps a flow's 5-tuple to [payload packets checked, done, last seen], least recently used first
+        self._flows = collections.OrderedDict()
+        self.stats = collections.Counter()
+
+    def should_inspect(self, flow_key: tuple) -> bool:
+        """
+        Account for one payload-bearing packet of a flow and tell whether to inspect it.
+
+        Args:
+            flow_key (tuple): The flow's 5-tuple, e.g. `(src_ip, src_port, dst_ip, dst_port, protocol)`.
+
+        Returns:
+            bool: True if the packet should go through deep inspection, False if the flow is done.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._flows.get(flow_key)
+            if state is None or now - state[2] > self.idle_timeout:
+                state = [0, False, now]
+                self._flows[flow_key] = state
+                self._evict(now)
+            else:
+                state[2] = now
+                self._flows.move_to_end(flow_key)
+
+            if state[1]:
+                self.stats['skipped'] += 1
+                return False
+
+            state[0] += 1
+            if state[0] >= self.max_packets_per_flow:
+                state[1] = True
+
+            self.stats['inspected'] += 1
+            return True
+
+    def is_done(self, flow_key: tuple) -> bool:
+        """
+        Tell whether a flow no longer needs deep inspection, without accounting for a packet.
+
+        Args:
+            flow_key (tuple): The flow's 5-tuple.
+
+        Returns:
+            bool: True if the flow is tracked, not idle, and marked done.
+        """
+        with self._lock:
+            state = self._flows.get(flow_key)
+            return state is not None and state[1] and time.monotonic() - state[2] <= self.idle_timeout
+
+    def record_result(self, flow_key: tuple, found: bool):
+        """
+        Mark a flow as done once deep inspection found what it was looking for.
+
+        Args:
+            flow_key (tuple): The flow's 5-tuple.
+            found (bool): Whether an SNI or User-Agent was found in the inspected packet.
+        """
+        if not found:
+            return
+        with self._lock:
+            state = self._flows.get(flow_key)
+            if state is not None:
+                state[1] = True
+
+    def _evict(self, now: float):
+        # Must be called with self._lock held. Oldest entries are at the front of the OrderedDict.
+        while self._flows:
+            oldest_key, oldest_state = next(iter(self._flows.items()))
+            if len(self._flows) > self.max_flows:
+                self.stats['evicted'] += 1
+            elif now - oldest_state[2] > self.idle_timeout:
+                self.stats['expired'] += 1
+            else:
+                break
+            del self._flows[oldest_key]
+
+    def __len__(self) -> int:
+        """Return the number of flows currently tracked."""
+        with self._lock:
+            return len(self._flows)
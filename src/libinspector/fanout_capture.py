@@ -0,0 +1,358 @@
+"""
+Multi-Process Capture with PACKET_FANOUT (Linux only).
+
+With a single capture ring, every frame is parsed and aggregated on the packet processor thread,
+so one core (and the GIL) caps the throughput. This module instead starts `CAPTURE_WORKERS`
+worker processes, each with its own TPACKET_V3 ring in the same `PACKET_FANOUT` group. The
+kernel spreads the frames over the rings by flow hash, so both directions of a flow always land
+on the same worker.
+
+Each worker:
+- decodes the frame headers with `header_parser`, without Scapy;
+- aggregates the frames that only update the flow counters (the vast majority) into a local
+  table keyed like `network_flows`, but with the MAC addresses as seen on the wire;
+- passes the few frames that need a full dissection (ARP, DHCP, DNS, TLS ClientHello, HTTP
+  requests, fragments) through untouched;
+- sends both to the main process in one compact batch every `BATCH_INTERVAL` seconds.
+
+The main process, which owns the database, attributes each aggregated flow to a device once
+(`packet_processor.record_flow_aggregates`) and puts the passed-through frames on the regular
+packet queue. A `FanoutSession` has the same interface as `packet_collector.CaptureSession`.
+
+Intended Usage:
+    session = FanoutSession(4, 'eth0', bpf_filter, host_ip_addr)
+    packet_count = session.capture(30, should_stop)
+    session.close()
+"""
+import collections
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from typing import NamedTuple
+
+from . import global_state
+from . import header_parser
+from . import packet_processor
+from . import tpacket_capture
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two batches sent by a worker
+BATCH_INTERVAL = 0.5
+
+# A worker sends its batch early once it holds this many flows or pass-through frames
+MAX_BATCH_SIZE = 5000
+
+# Batches in flight per worker; a full queue blocks the worker and the kernel ring absorbs the burst
+QUEUE_BATCHES_PER_WORKER = 16
+
+# Seconds to wait for all workers to attach a new filter before the session is reopened instead
+FILTER_UPDATE_TIMEOUT = 2
+
+_fanout_group_ids = itertools.count(os.getpid())
+
+
+class WorkerBatch(NamedTuple):
+    """
+    What a capture worker sends to the main process.
+    """
+    worker_index: int
+    flows: dict                 # Flow key (MAC addresses as captured) -> [bytes, packets, tcp_seq_min, tcp_seq_max]
+    frames: list                # (timestamp, frame_bytes) tuples that need a full dissection
+    packet_count: int           # Frames read from the ring
+    kernel_stats: dict | None   # Counters of the worker's ring since its previous batch
+    error: str | None = None    # Set if the worker failed and exited
+
+
+def aggregate_frames(block: list, host_ip_addr: str, flows: dict, frames: list):
+    """
+    Sort one block of captured frames into flow aggregates and frames to pass through.
+
+    This mirrors the fast path of `packet_processor.process_raw_frame`: frames that no handler is
+    interested in are dropped, flow-only frames are aggregated into `flows`, and all other frames
+    are appended to `frames` for the packet processor.
+
+    Args:
+        block (list): `(timestamp, frame_bytes)` tuples.
+        host_ip_addr (str): The Inspector host's IP address; its own traffic is not recorded.
+        flows (dict): The flow aggregates to update (see `WorkerBatch.flows`).
+        frames (list): The list of frames to pass through.
+    """
+    parse_frame = header_parser.parse_frame
+    classify_frame = header_parser.classify_frame
+    get_flow_bucket = packet_processor.get_flow_bucket
+    for ts, frame in block:
+        header = parse_frame(frame)
+        verdict = classify_frame(header, frame)
+        if verdict == header_parser.FRAME_IGNORE:
+            continue
+        if verdict != header_parser.FRAME_FLOW:
+            frames.append((ts, frame))
+            continue
+        if host_ip_addr in (header.src_ip, header.dst_ip):
+            continue
+
+        flow_key = (
+            get_flow_bucket(ts), header.src_mac, header.dst_mac, header.src_ip, header.dst_ip,
+            header.src_port, header.dst_port, header.protocol
+        )
+        tcp_seq = header.tcp_seq
+        counters = flows.get(flow_key)
+        if counters is None:
+            flows[flow_key] = [len(frame), 1, tcp_seq, tcp_seq]
+        else:
+            counters[0] += len(frame)
+            counters[1] += 1
+            if tcp_seq < counters[2]:
+                counters[2] = tcp_seq
+            if tcp_seq > counters[3]:
+                counters[3] = tcp_seq
+
+
+def run_worker(worker_index: int, iface: str, bpf_filter: str, fanout_group_id: int, host_ip_addr: str,
+               result_queue, stop_event, filter_conn):
+    """
+    Entry point of a capture worker process.
+
+    Between two reads of the ring, the worker attaches the filter expressions that it receives on
+    `filter_conn`, and replies with None on success or with the error message.
+
+    Args:
+        worker_index (int): Index of the worker, for logging.
+        iface (str): The interface to capture on.
+        bpf_filter (str): The BPF filter expression.
+        fanout_group_id (int): The `PACKET_FANOUT` group shared by all workers of the session.
+        host_ip_addr (str): The Inspector host's IP address.
+        result_queue (multiprocessing.Queue): Where to send the `WorkerBatch`es.
+        stop_event (multiprocessing.Event): Set by the main process to stop the worker.
+        filter_conn (multiprocessing.connection.Connection): The worker's end of its filter pipe.
+    """
+    # Ctrl-C is handled by the main process, which then stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    try:
+        ring = tpacket_capture.TPacketV3Ring(iface, bpf_filter=bpf_filter, fanout_group_id=fanout_group_id)
+    except Exception as e:
+        result_queue.put(WorkerBatch(worker_index, {}, [], 0, None, f'{type(e).__name__}: {e}'))
+        return
+
+    flows = {}
+    frames = []
+    packet_count = 0
+    next_batch_ts = time.time() + BATCH_INTERVAL
+
+    def send_batch():
+        # Blocks while the main process is behind, but never past a stop request
+        batch = WorkerBatch(worker_index, flows, frames, packet_count, ring.get_stats())
+        while not stop_event.is_set():
+            try:
+                result_queue.put(batch, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    try:
+        while not stop_event.is_set():
+            for block in ring.read_blocks(timeout=BATCH_INTERVAL):
+                packet_count += len(block)
+                aggregate_frames(block, host_ip_addr, flows, frames)
+            while filter_conn.poll():
+                new_filter = filter_conn.recv()
+                try:
+                    ring.set_filter(new_filter)
+                except Exception as e:
+                    filter_conn.send(f'{type(e).__name__}: {e}')
+                else:
+                    filter_conn.send(None)
+            if time.time() >= next_batch_ts or len(flows) >= MAX_BATCH_SIZE or len(frames) >= MAX_BATCH_SIZE:
+                if packet_count:
+                    send_batch()
+                    flows, frames, packet_count = {}, [], 0
+                next_batch_ts = time.time() + BATCH_INTERVAL
+        if packet_count:
+            # What was captured before the stop request
+            result_queue.put(WorkerBatch(worker_index, flows, frames, packet_count, ring.get_stats()))
+    except Exception as e:
+        result_queue.put(WorkerBatch(worker_index, {}, [], 0, None, f'{type(e).__name__}: {e}'))
+    finally:
+        ring.close()
+
+
+class FanoutSession(object):
+    """
+    A set of capture worker processes sharing an interface through `PACKET_FANOUT`.
+
+    Args:
+        worker_count (int): Number of worker processes.
+        iface (str): The interface to capture on.
+        bpf_filter (str): The BPF filter expression.
+        host_ip_addr (str): The Inspector host's IP address.
+    """
+
+    backend = 'tpacket'
+    raw = True
+
+    def __init__(self, worker_count: int, iface: str, bpf_filter: str, host_ip_addr: str):
+        """
+        Start the worker processes.
+
+        Args:
+            worker_count (int): Number of worker processes.
+            iface (str): The interface to capture on.
+            bpf_filter (str): The BPF filter expression.
+            host_ip_addr (str): The Inspector host's IP address.
+        """
+        self.iface = iface
+        self.bpf_filter = bpf_filter
+        self.opened_ts = time.time()
+        self._kernel_stats = collections.Counter()
+
+        # Forking a process that runs many threads is unsafe; start the workers from scratch
+        context = multiprocessing.get_context('spawn')
+        self._result_queue = context.Queue(maxsize=QUEUE_BATCHES_PER_WORKER * worker_count)
+        self._stop_event = context.Event()
+        # Packets of the batches dispatched while waiting for the workers to attach a new filter
+        self._pending_count = 0
+        fanout_group_id = next(_fanout_group_ids) & 0xffff
+        self._filter_conns = []
+        self._workers = []
+        for ix in range(worker_count):
+            filter_conn, worker_filter_conn = context.Pipe()
+            self._filter_conns.append(filter_conn)
+            self._workers.append(context.Process(
+                target=run_worker, name=f'capture_worker_{ix}', daemon=True,
+                args=(ix, iface, bpf_filter, fanout_group_id, host_ip_addr, self._result_queue, self._stop_event, worker_filter_conn)
+            ))
+        for worker in self._workers:
+            worker.start()
+        logger.info(f'[fanout_capture] Started {worker_count} capture workers on {iface} (fanout group {fanout_group_id}) with filter "{bpf_filter}"')
+
+    def matches(self, backend: str, raw: bool, iface: str) -> bool:
+        """Return True if the session captures with the given backend on the given interface."""
+        return backend == self.backend and iface == self.iface
+
+    def set_filter(self, bpf_filter: str) -> bool:
+        """
+        Replace the BPF filter of every worker's ring.
+
+        Each worker attaches the filter between two reads of its ring. While waiting for their
+        replies, the batches that the workers send are processed as usual.
+
+        Args:
+            bpf_filter (str): The new filter expression.
+
+        Returns:
+            bool: True if every worker replaced its filter, False if any of them failed or did not
+            reply within `FILTER_UPDATE_TIMEOUT` seconds (the session must then be reopened).
+        """
+        try:
+            for filter_conn in self._filter_conns:
+                filter_conn.send(bpf_filter)
+        except OSError as e:
+            logger.warning(f'[fanout_capture] Could not send the capture filter to the workers: {e}')
+            return False
+
+        # Collect every reply, so that none is left over for the next update
+        pending_conns = list(self._filter_conns)
+        filter_updated = True
+        deadline = time.time() + FILTER_UPDATE_TIMEOUT
+        while pending_conns and time.time() < deadline:
+            for filter_conn in [conn for conn in pending_conns if conn.poll()]:
+                pending_conns.remove(filter_conn)
+                try:
+                    error = filter_conn.recv()
+                except EOFError:
+                    error = 'the worker exited'
+                if error is not None:
+                    logger.warning(f'[fanout_capture] A capture worker could not update its filter: {error}')
+                    filter_updated = False
+            if not pending_conns:
+                break
+            # Keep draining the batches, or a worker blocked on the full queue would never reply
+            try:
+                batch = self._result_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            self._pending_count += self._dispatch(batch)
+
+        if pending_conns:
+            logger.warning(f'[fanout_capture] {len(pending_conns)} capture workers did not update their filter in time')
+            return False
+        if not filter_updated:
+            return False
+
+        self.bpf_filter = bpf_filter
+        logger.info(f'[fanout_capture] Updated the capture filter of the workers on {self.iface} to "{bpf_filter}"')
+        return True
+
+    def capture(self, duration: float, should_stop) -> int:
+        """
+        Process the workers' batches for `duration` seconds, or until `should_stop()`.
+
+        Args:
+            duration (float): Seconds to capture before returning.
+            should_stop (callable): Checked at least once per second; returning True ends the capture early.
+
+        Returns:
+            int: The number of packets captured by all workers.
+
+        Raises:
+            RuntimeError: If a worker failed or exited.
+        """
+        deadline = time.time() + duration
+        count, self._pending_count = self._pending_count, 0
+        while time.time() < deadline and not should_stop():
+            try:
+                batch = self._result_queue.get(timeout=min(1.0, max(deadline - time.time(), 0.01)))
+            except queue.Empty:
+                for worker in self._workers:
+                    if not worker.is_alive():
+                        raise RuntimeError(f'Capture worker {worker.name} exited with code {worker.exitcode}')
+                continue
+            count += self._dispatch(batch)
+        return count
+
+    def _dispatch(self, batch: WorkerBatch) -> int:
+        if batch.error is not None:
+            raise RuntimeError(f'Capture worker {batch.worker_index} failed: {batch.error}')
+        if batch.frames:
+            global_state.packet_queue.put_batch(batch.frames)
+        if batch.flows:
+            packet_processor.record_flow_aggregates(batch.flows)
+        if batch.kernel_stats:
+            self._kernel_stats.update(batch.kernel_stats)
+        return batch.packet_count
+
+    def get_kernel_stats(self) -> dict:
+        """Return (and reset) the kernel's counters summed over all workers' rings."""
+        stats = {'packets': self._kernel_stats['packets'], 'drops': self._kernel_stats['drops']}
+        self._kernel_stats.clear()
+        return stats
+
+    def close(self):
+        """Stop the workers, keeping the batches they send until they exit."""
+        self._stop_event.set()
+        deadline = time.time() + 2
+        while time.time() < deadline and any(worker.is_alive() for worker in self._workers):
+            try:
+                batch = self._result_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                logger.warning(f'[fanout_capture] {e}')
+
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join(timeout=1)
+        self._result_queue.close()
+        self._result_queue.cancel_join_thread()
+        for filter_conn in self._filter_conns:
+            filter_conn.close()
+        logger.info(f'[fanout_capture] Stopped the capture workers on {self.iface}')
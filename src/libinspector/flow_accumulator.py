@@ -0,0 +1,162 @@
+"""
+In-Memory Flow Accumulator.
+
+Upserting every single TCP/UDP packet into `network_flows` means one SQL statement (and one
+acquisition of the database write lock) per packet. This module instead aggregates packets in
+a dictionary keyed by the primary key of `network_flows` -- the timestamp bucket, MAC addresses,
+IP addresses, ports and protocol -- summing byte and packet counts and tracking the minimum and
+maximum TCP sequence numbers. The aggregated rows are periodically written to the database with
+a single `executemany` inside one explicit transaction.
+
+Intended Usage:
+    accumulator = FlowAccumulator()
+    accumulator.add(flow_key, byte_count, tcp_seq)
+    ...
+    write_flows_to_db(conn, rw_lock, accumulator.pop_all())
+"""
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FlowAccumulator(object):
+    """
+    A thread-safe table of flow counters, keyed by the `network_flows` primary key.
+
+    The key is the tuple `(timestamp, src_mac_address, dest_mac_address, src_ip_address,
+    dest_ip_address, src_port, dest_port, protocol)`; the value is the list
+    `[byte_count, packet_count, tcp_seq_min, tcp_seq_max]`.
+    """
+
+    def __init__(self):
+        """Initialize an empty accumulator."""
+        self._lock = threading.Lock()
+        self._flows = {}
+
+    def add(self, flow_key: tuple, byte_count: int, tcp_seq: int, packet_count: int = 1) -> int:
+        """
+        Add one packet (or a pre-aggregated batch of packets) to the flow identified by `flow_key`.
+
+        Args:
+            flow_key (tuple): The `network_flows` primary key of the flow.
+            byte_count (int): Number of bytes to add.
+            tcp_seq (int): The packet's TCP sequence number (0 for UDP).
+            packet_count (int, optional): Number of packets to add. Defaults to 1.
+
+        Returns:
+            int: The number of distinct flows currently held by the accumulator.
+        """
+        with self._lock:
+            counters = self._flows.get(flow_key)
+            if counters is None:
+                self._flows[flow_key] = [byte_count, packet_count, tcp_seq, tcp_seq]
+            else:
+                counters[0] += byte_count
+                counters[1] += packet_count
+                if tcp_seq < counters[2]:
+                    counters[2] = tcp_seq
+                if tcp_seq > counters[3]:
+                    counters[3] = tcp_seq
+            return len(self._flows)
+
+    def merge(self, flow_key: tuple, counters: list) -> int:
+        """
+        Add a flow that was already aggregated elsewhere (e.g., by a capture worker process).
+
+        Args:
+            flow_key (tuple): The `network_flows` primary key of the flow.
+            counters (list): `[byte_count, packet_count, tcp_seq_min, tcp_seq_max]`.
+
+        Returns:
+            int: The number of distinct flows currently held by the accumulator.
+        """
+        byte_count, packet_count, tcp_seq_min, tcp_seq_max = counters
+        with self._lock:
+            current = self._flows.get(flow_key)
+            if current is None:
+                self._flows[flow_key] = [byte_count, packet_count, tcp_seq_min, tcp_seq_max]
+            else:
+                current[0] += byte_count
+                current[1] += packet_count
+                if tcp_seq_min < current[2]:
+                    current[2] = tcp_seq_min
+                if tcp_seq_max > current[3]:
+                    current[3] = tcp_seq_max
+            return len(self._flows)
+
+    def pop_all(self) -> dict:
+        """
+        Remove and return every accumulated flow.
+
+        Returns:
+            dict: Maps each flow key to `[byte_count, packet_count, tcp_seq_min, tcp_seq_max]`.
+        """
+        with self._lock:
+            flows, self._flows = self._flows, {}
+        return flows
+
+    def __len__(self) -> int:
+        """Return the number of distinct flows currently held by the accumulator."""
+        with self._lock:
+            return len(self._flows)
+
+
+def write_flows_to_db(conn, rw_lock: threading.Lock, flows: dict, hostnames: dict | None = None) -> int:
+    """
+    Upsert aggregated flows into the `network_flows` table in one transaction.
+
+    Args:
+        conn: The SQLite connection (in autocommit mode).
+        rw_lock (threading.Lock): The database write lock.
+        flows (dict): The output of `FlowAccumulator.pop_all()`.
+        hostnames (dict, optional): Maps IP addresses to the hostnames to store in `src_hostname`
+            and `dest_hostname`. An existing row keeps its hostnames unless a new one is given.
+
+    Returns:
+        int: The number of flow rows written.
+
+    Raises:
+        sqlite3.Error: If the flows cannot be written; the transaction is rolled back.
+    """
+    if not flows:
+        return 0
+    if hostnames is None:
+        hostnames = {}
+
+    rows = [
+        (
+            timestamp, src_ip_addr, dst_ip_addr, hostnames.get(src_ip_addr), hostnames.get(dst_ip_addr),
+            src_mac_addr, dst_mac_addr, src_port, dst_port, protocol, byte_count, packet_count, tcp_seq_min, tcp_seq_max
+        )
+        for (timestamp, src_mac_addr, dst_mac_addr, src_ip_addr, dst_ip_addr, src_port, dst_port, protocol),
+            (byte_count, packet_count, tcp_seq_min, tcp_seq_max) in flows.items()
+    ]
+
+    with rw_lock:
+        conn.execute('BEGIN')
+        try:
+            conn.executemany('''
+                INSERT INTO network_flows (
+                    timestamp, src_ip_address, dest_ip_address, src_hostname, dest_hostname, src_mac_address,
+                    dest_mac_address, src_port, dest_port, protocol, byte_count, packet_count, tcp_seq_min, tcp_seq_max
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (
+                    timestamp, src_mac_address, dest_mac_address, src_ip_address, dest_ip_address,
+                    src_port, dest_port, protocol
+                ) DO UPDATE SET
+                    byte_count = byte_count + excluded.byte_count,
+                    packet_count = packet_count + excluded.packet_count,
+                    src_hostname = COALESCE(excluded.src_hostname, src_hostname),
+                    dest_hostname = COALESCE(excluded.dest_hostname, dest_hostname),
+                    tcp_seq_min = MIN(tcp_seq_min, excluded.tcp_seq_min),
+                    tcp_seq_max = MAX(tcp_seq_max, excluded.tcp_seq_max)
+            ''', rows)
+            conn.execute('COMMIT')
+        except Exception:
+            # Nothing is written, so that the caller can retry with the same flows
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+
+    return len(rows)
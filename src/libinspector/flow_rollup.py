@@ -0,0 +1,124 @@
+"""
+Multi-Resolution Flow Rollups.
+
+`network_flows` holds one row per flow per `FLOW_BUCKET_SECONDS` bucket, so a long-lived stream
+adds tens of thousands of rows per day. This module periodically merges the older rows into
+coarser tables and deletes them from the finer one:
+- `network_flows` rows older than `FLOW_ROLLUP_MINUTE_AFTER` seconds are merged into
+  `network_flows_minute` (one-minute buckets);
+- `network_flows_minute` rows older than `FLOW_ROLLUP_HOUR_AFTER` seconds are merged into
+  `network_flows_hour` (one-hour buckets).
+
+Only whole target buckets are rolled up, and each flow row lives in exactly one table, so
+`SUM(byte_count)` over `network_flows_all` is unchanged by a rollup. Queries over days can read
+the hourly table instead of millions of fine-grained rows.
+
+Intended Usage:
+    SafeLoopThread(flow_rollup.start, name='Flow Rollup', sleep_time=60)
+"""
+import logging
+import time
+
+from . import common
+from . import global_state
+
+logger = logging.getLogger(__name__)
+
+# Age (in seconds) after which rows are merged into the next coarser table
+FLOW_ROLLUP_MINUTE_AFTER = common.get_env_int('FLOW_ROLLUP_MINUTE_AFTER', 3600)
+FLOW_ROLLUP_HOUR_AFTER = common.get_env_int('FLOW_ROLLUP_HOUR_AFTER', 86400)
+
+_FLOW_KEY_COLUMNS = 'src_mac_address, dest_mac_address, src_ip_address, dest_ip_address, src_port, dest_port, protocol'
+
+
+def get_rollup_levels() -> list:
+    """
+    Return the rollup steps, from the finest table to the coarsest.
+
+    Returns:
+        list[tuple[str, str, int, int]]: `(source_table, target_table, target_bucket_seconds,
+        rollup_after_seconds)` tuples.
+    """
+    return [
+        ('network_flows', 'network_flows_minute', 60, FLOW_ROLLUP_MINUTE_AFTER),
+        ('network_flows_minute', 'network_flows_hour', 3600, FLOW_ROLLUP_HOUR_AFTER),
+    ]
+
+
+def rollup_table(conn, source_table: str, target_table: str, bucket_seconds: int, cutoff_ts: int) -> int:
+    """
+    Merge the rows of `source_table` older than `cutoff_ts` into `target_table`, then delete them.
+
+    Rows are grouped by flow key and by `bucket_seconds` bucket; byte and packet counts are summed
+    and the TCP sequence range is widened. Must be called within a transaction, with the database
+    lock held.
+
+    Args:
+        conn: The SQLite connection.
+        source_table (str): The finer table.
+        target_table (str): The coarser table.
+        bucket_seconds (int): Width of the target table's buckets.
+        cutoff_ts (int): Rows with an earlier timestamp are rolled up; must be a bucket boundary.
+
+    Returns:
+        int: The number of source rows rolled up.
+    """
+    conn.execute(f'''
+        INSERT INTO {target_table} (
+            timestamp, {_FLOW_KEY_COLUMNS}, src_hostname, dest_hostname, byte_count, packet_count, tcp_seq_min, tcp_seq_max
+        )
+        SELECT
+            timestamp / {bucket_seconds} * {bucket_seconds} AS bucket_ts, {_FLOW_KEY_COLUMNS},
+            MAX(src_hostname), MAX(dest_hostname), SUM(byte_count), SUM(packet_count), MIN(tcp_seq_min), MAX(tcp_seq_max)
+        FROM {source_table}
+        WHERE timestamp < ?
+        GROUP BY bucket_ts, {_FLOW_KEY_COLUMNS}
+        ON CONFLICT (timestamp, {_FLOW_KEY_COLUMNS}) DO UPDATE SET
+            byte_count = byte_count + excluded.byte_count,
+            packet_count = packet_count + excluded.packet_count,
+            src_hostname = COALESCE(src_hostname, excluded.src_hostname),
+            dest_hostname = COALESCE(dest_hostname, excluded.dest_hostname),
+            tcp_seq_min = MIN(tcp_seq_min, excluded.tcp_seq_min),
+            tcp_seq_max = MAX(tcp_seq_max, excluded.tcp_seq_max)
+    ''', (cutoff_ts,))
+    return conn.execute(f'DELETE FROM {source_table} WHERE timestamp < ?', (cutoff_ts,)).rowcount
+
+
+def rollup_flows(conn, rw_lock, now: float | None = None) -> dict:
+    """
+    Roll up every level whose rows are old enough, one transaction per level.
+
+    Args:
+        conn: The SQLite connection (in autocommit mode).
+        rw_lock (threading.Lock): The database write lock.
+        now (float, optional): The current time; defaults to `time.time()`.
+
+    Returns:
+        dict: The number of rows rolled up out of each source table.
+    """
+    if now is None:
+        now = time.time()
+
+    row_counts = {}
+    for source_table, target_table, bucket_seconds, rollup_after in get_rollup_levels():
+        # Only whole target buckets, so that a bucket is never split across two tables
+        cutoff_ts = int(now - rollup_after) // bucket_seconds * bucket_seconds
+        with rw_lock:
+            conn.execute('BEGIN')
+            try:
+                row_counts[source_table] = rollup_table(conn, source_table, target_table, bucket_seconds, cutoff_ts)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+    return row_counts
+
+
+def start():
+    """
+    Roll up the flows of the Inspector's database; runs periodically in its own thread.
+    """
+    conn, rw_lock = global_state.db_conn_and_lock
+    row_counts = rollup_flows(conn, rw_lock)
+    if any(row_counts.values()):
+        logger.info(f'[flow_rollup] Rolled up flow rows: {row_counts}')
@@ -24,7 +24,7 @@ Variables:
     is_running (bool): Indicates if the application is running.
     inspector_started (list): Singleton flag to ensure only one Inspector instance.
     inspector_started_ts (float): Timestamp when Inspector was started.
-    packet_queue (queue.Queue): Queue for packets to be processed.
+    packet_queue (BoundedPacketQueue): Bounded queue for packets to be processed, with drop counters.
     custom_packet_callback_func (callable or None): Custom callback for packet processing.
     labeling_target_mac (str or None): The MAC address of the device currently undergoing a labeling session.
     labeling_activity_name (str or None): The user-selected activity label for the current session.
@@ -39,8 +39,8 @@ Usage:
     Always acquire `global_state_lock` before accessing or modifying any global state variable.
 """
 import threading
-import queue
 from .safe_loop import SafeLoopThread
+from .packet_queue import BoundedPacketQueue
 from typing import Callable, Any, Tuple
 
 # Should be held whenever accessing the global state's variables.
@@ -64,8 +64,9 @@ is_running : bool = True
 inspector_started = [False]
 inspector_started_ts = 0
 
-# A queue that holds packets to be processed
-packet_queue = queue.Queue()
+# A bounded queue that holds packets to be processed: scapy packets or raw (timestamp, bytes)
+# frames. Its size and overflow policy are configured in `core.start_threads()`.
+packet_queue = BoundedPacketQueue()
 
 # A custom callback function for packet processing (runs in background thread)
 custom_packet_callback_func: Callable[[Any], None] | None = None
@@ -0,0 +1,177 @@
+"""
+Fast-Path Header Parser for Ethernet, IPv4, TCP and UDP.
+
+Walking Scapy's layer chain (`sc.IP in pkt`, `pkt[sc.TCP].sport`, ...) is by far the most expensive
+part of counting a packet towards its flow. This module decodes the few header fields the flow
+accounting needs directly from the raw frame bytes with precompiled `struct` formats, producing a
+compact `FrameHeader` record. It also decides whether a frame needs a deep (Scapy) parse at all.
+
+Supported encapsulations: Ethernet II, optionally with a single 802.1Q VLAN tag, carrying IPv4
+(with or without options) and TCP or UDP. Anything else is left to Scapy.
+
+Intended Usage:
+    header = parse_frame(frame)
+    if classify_frame(header, frame) == FRAME_FLOW:
+        ...  # use header.src_mac, header.src_ip, header.src_port, ...
+"""
+import socket
+import struct
+from typing import NamedTuple
+
+# Verdicts of `classify_frame()`
+FRAME_IGNORE = 0    # No handler is interested in the frame
+FRAME_DISSECT = 1   # The frame needs a full Scapy dissection
+FRAME_FLOW = 2      # The frame only updates the flow counters
+
+ETHER_TYPE_IPV4 = 0x0800
+ETHER_TYPE_ARP = 0x0806
+ETHER_TYPE_VLAN = 0x8100
+
+IP_PROTO_TCP = 6
+IP_PROTO_UDP = 17
+
+# IP protocols that encapsulate another IP packet, which Scapy would dissect further
+_IP_PROTO_TUNNELS = frozenset([4, 41, 47])
+
+# UDP/TCP ports whose payloads are handled by a dedicated (Scapy-based) handler: DNS, mDNS and DHCP
+_UDP_DISSECT_PORTS = frozenset([53, 5353, 67, 68])
+_TCP_DISSECT_PORTS = frozenset([53])
+_HTTP_PORTS = frozenset([80, 8080])
+
+_ether_struct = struct.Struct('!6s6sH')
+_vlan_struct = struct.Struct('!2xH')
+_ipv4_struct = struct.Struct('!BxH2xHxB2x4s4s')  # version/IHL, total length, flags/fragment offset, protocol, src, dst
+_ports_struct = struct.Struct('!HH')
+_tcp_struct = struct.Struct('!HHI4xB')  # ports, sequence number, data offset
+
+
+class FrameHeader(NamedTuple):
+    """
+    The decoded headers of an Ethernet frame.
+
+    Fields that do not apply to the frame (e.g., IP addresses of an ARP frame) are None or 0.
+    """
+    ether_type: int
+    src_mac: str
+    dst_mac: str
+    ip_proto: int = 0
+    is_fragment: bool = False
+    src_ip: str | None = None
+    dst_ip: str | None = None
+    protocol: str | None = None   # 'tcp' or 'udp'
+    src_port: int = 0
+    dst_port: int = 0
+    tcp_seq: int = 0
+    payload_offset: int = 0
+    payload_len: int = 0
+
+
+def parse_frame(frame: bytes) -> FrameHeader | None:
+    """
+    Decode the Ethernet, IPv4 and TCP/UDP headers of a raw frame.
+
+    Args:
+        frame (bytes): The raw Ethernet frame.
+
+    Returns:
+        FrameHeader or None: The decoded headers, or None if the frame is too short to hold the
+        headers it announces.
+    """
+    frame_len = len(frame)
+    if frame_len < 14:
+        return None
+
+    dst_mac, src_mac, ether_type = _ether_struct.unpack_from(frame, 0)
+    src_mac = src_mac.hex(':')
+    dst_mac = dst_mac.hex(':')
+    offset = 14
+
+    if ether_type == ETHER_TYPE_VLAN:
+        if frame_len < 18:
+            return None
+        ether_type = _vlan_struct.unpack_from(frame, offset)[0]
+        offset = 18
+
+    if ether_type != ETHER_TYPE_IPV4:
+        return FrameHeader(ether_type, src_mac, dst_mac)
+
+    if frame_len < offset + 20:
+        return None
+    version_ihl, ip_total_len, fragment, ip_proto, src_ip, dst_ip = _ipv4_struct.unpack_from(frame, offset)
+    if version_ihl >> 4 != 4:
+        return None
+    src_ip = socket.inet_ntoa(src_ip)
+    dst_ip = socket.inet_ntoa(dst_ip)
+
+    # More-fragments flag or a non-zero fragment offset
+    if fragment & 0x3fff:
+        return FrameHeader(ether_type, src_mac, dst_mac, ip_proto, True, src_ip, dst_ip)
+
+    ip_header_len = (version_ihl & 0x0f) * 4
+    # Frames may carry Ethernet padding; the IP total length tells where the packet ends. It can be
+    # zero for outgoing packets captured before segmentation offload, in which case we use the frame.
+    ip_end = offset + ip_total_len if ip_total_len >= ip_header_len else frame_len
+    offset += ip_header_len
+
+    if ip_proto == IP_PROTO_TCP:
+        if frame_len < offset + 20:
+            return None
+        src_port, dst_port, tcp_seq, data_offset = _tcp_struct.unpack_from(frame, offset)
+        payload_offset = offset + (data_offset >> 4) * 4
+        return FrameHeader(
+            ether_type, src_mac, dst_mac, ip_proto, False, src_ip, dst_ip,
+            'tcp', src_port, dst_port, tcp_seq, payload_offset, max(ip_end - payload_offset, 0)
+        )
+
+    if ip_proto == IP_PROTO_UDP:
+        if frame_len < offset + 8:
+            return None
+        src_port, dst_port = _ports_struct.unpack_from(frame, offset)
+        return FrameHeader(
+            ether_type, src_mac, dst_mac, ip_proto, False, src_ip, dst_ip,
+            'udp', src_port, dst_port, 0, offset + 8, max(ip_end - offset - 8, 0)
+        )
+
+    return FrameHeader(ether_type, src_mac, dst_mac, ip_proto, False, src_ip, dst_ip)
+
+
+def classify_frame(header: FrameHeader | None, frame: bytes) -> int:
+    """
+    Decide how the packet processor should handle a frame.
+
+    Args:
+        header (FrameHeader or None): The result of `parse_frame(frame)`.
+        frame (bytes): The raw Ethernet frame (used to peek at the TCP payload).
+
+    Returns:
+        int: `FRAME_DISSECT` for ARP, DHCP, DNS, TLS ClientHello and HTTP request frames, for
+        IP fragments and tunnels, and for frames that could not be parsed; `FRAME_IGNORE` for
+        frames no handler is interested in (e.g., IPv6, ICMP); `FRAME_FLOW` otherwise.
+    """
+    if header is None or header.ether_type == ETHER_TYPE_ARP:
+        return FRAME_DISSECT
+
+    if header.ether_type != ETHER_TYPE_IPV4:
+        return FRAME_IGNORE
+
+    if header.is_fragment or header.ip_proto in _IP_PROTO_TUNNELS:
+        return FRAME_DISSECT
+
+    if header.protocol == 'udp':
+        if header.src_port in _UDP_DISSECT_PORTS or header.dst_port in _UDP_DISSECT_PORTS:
+            return FRAME_DISSECT
+        return FRAME_FLOW
+
+    if header.protocol == 'tcp':
+        if header.src_port in _TCP_DISSECT_PORTS or header.dst_port in _TCP_DISSECT_PORTS:
+            return FRAME_DISSECT
+        payload_offset = header.payload_offset
+        # TLS handshake record carrying a ClientHello
+        if frame[payload_offset:payload_offset + 1] == b'\x16' and frame[payload_offset + 5:payload_offset + 6] == b'\x01':
+            return FRAME_DISSECT
+        # HTTP request that may carry a User-Agent
+        if header.dst_port in _HTTP_PORTS and frame.startswith((b'GET ', b'POST '), payload_offset):
+            return FRAME_DISSECT
+        return FRAME_FLOW
+
+    return FRAME_IGNORE
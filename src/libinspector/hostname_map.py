@@ -0,0 +1,97 @@
+"""
+In-Memory IP-to-Hostname Map.
+
+Flows used to get their hostnames from a periodic `UPDATE network_flows` that joined every flow
+row against the `hostnames` table, holding the database lock for seconds as the table grew. The
+packet processor instead keeps the latest hostname of each IP address in this bounded map,
+next to the `hostnames` table, so that `flush_flows` can fill in `src_hostname` and
+`dest_hostname` when it writes the flow rows.
+
+The map also remembers which IP addresses got a new hostname since the last call to
+`pop_changed()`. Only rows written before such a change can be missing their hostname, so the
+background sweep (`packet_processor.update_hostnames_in_flows`) is limited to those IP
+addresses.
+
+When the map is full, the IP address whose hostname was updated the longest time ago is evicted.
+
+Intended Usage:
+    hostname_map = HostnameMap()
+    hostname_map.update(ip_set, hostname)
+    hostnames = hostname_map.get_hostnames(ip_addrs)
+"""
+import threading
+
+
+class HostnameMap(object):
+    """
+    A bounded, thread-safe map of IP addresses to their latest hostnames.
+
+    Args:
+        max_entries (int, optional): Maximum number of IP addresses held at once.
+    """
+
+    def __init__(self, max_entries: int = 65536):
+        """
+        Initialize an empty map.
+
+        Args:
+            max_entries (int, optional): Maximum number of IP addresses held at once.
+        """
+        self.max_entries = max(max_entries, 1)
+        self._lock = threading.Lock()
+        # Least recently updated first; dicts keep their insertion order
+        self._hostnames = {}
+        self._changed_ip_addrs = set()
+
+    def update(self, ip_set: set, hostname: str) -> int:
+        """
+        Map each IP address of `ip_set` to `hostname`.
+
+        Args:
+            ip_set (set): The IP addresses.
+            hostname (str): Their hostname.
+
+        Returns:
+            int: The number of IP addresses whose hostname changed (including new ones).
+        """
+        change_count = 0
+        with self._lock:
+            for ip_addr in ip_set:
+                previous_hostname = self._hostnames.pop(ip_addr, None)
+                self._hostnames[ip_addr] = hostname
+                if previous_hostname != hostname:
+                    self._changed_ip_addrs.add(ip_addr)
+                    change_count += 1
+            while len(self._hostnames) > self.max_entries:
+                del self._hostnames[next(iter(self._hostnames))]
+        return change_count
+
+    def get_hostnames(self, ip_addrs) -> dict:
+        """
+        Look up the hostnames of several IP addresses at once.
+
+        Args:
+            ip_addrs (iterable): The IP addresses.
+
+        Returns:
+            dict: Maps each IP address that has a hostname to that hostname.
+        """
+        with self._lock:
+            hostnames = self._hostnames
+            return {ip_addr: hostnames[ip_addr] for ip_addr in ip_addrs if ip_addr in hostnames}
+
+    def pop_changed(self) -> set:
+        """
+        Remove and return the IP addresses whose hostname changed since the previous call.
+
+        Returns:
+            set: The IP addresses.
+        """
+        with self._lock:
+            changed_ip_addrs, self._changed_ip_addrs = self._changed_ip_addrs, set()
+        return changed_ip_addrs
+
+    def __len__(self) -> int:
+        """Return the number of IP addresses in the map."""
+        with self._lock:
+            return len(self._hostnames)
@@ -272,14 +272,10 @@ def start(stop_event: threading.Event = None, run_event: threading.Event = None)
     with rw_lock:
         for (device_ip_address, device_info_list) in device_dict.items():
             rows_updated = conn.execute('''
-                                        UPDATE devices
-                                        SET metadata_json = json_patch(
-                                                metadata_json,
-                                                json_object('mdns_json', json(?))
-                                                            )
-                                        WHERE ip_address = ?
-                                          AND json_extract(metadata_json, '$.mdns_json') IS NULL
-                                        ''', (json.dumps(device_info_list), device_ip_address)).rowcount
+                INSERT INTO device_attributes (mac_address, source, key, value, updated_ts)
+                SELECT mac_address, 'mdns', 'mdns_json', ?, ? FROM devices WHERE ip_address = ?
+                ON CONFLICT DO NOTHING
+            ''', (json.dumps(device_info_list), int(time.time()), device_ip_address)).rowcount
 
             if rows_updated:
                 logger.info(f"[mDNS] Discovered device: {device_ip_address}: {json.dumps(device_info_list, indent=2)}")
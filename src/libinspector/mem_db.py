@@ -11,17 +11,38 @@ Key Features:
 - In-memory or on-disk SQLite database based on configuration.
 - Thread-safe access using a lock for concurrent operations.
 - Tables for devices, hostnames, and network flows with relevant indexes.
+- Per-minute and per-hour rollups of older network flows (see `flow_rollup.py`).
 - Integration with OUI vendor lookup via a custom SQLite function.
 - Designed for fast, temporary storage of network monitoring data.
+- Optional concurrent readers (`DB_MODE`): the writer keeps the only write connection, and
+  readers use a pool of read-only connections that do not take the writer's lock.
+
+Database Modes (`DB_MODE`):
+- `memory` (default): one in-memory connection shared by writers and readers under `rw_lock`
+  (or the debug file, if `USE_IN_MEMORY_DB` is false).
+- `wal`: a WAL-journaled file at `DB_PATH` (on tmpfs by default); readers see the latest
+  committed state and never block the writer.
+- `shared_memory`: a shared-cache in-memory database; readers use `read_uncommitted`, so they
+  take no table locks and may see rows of a transaction that is still in progress. All
+  connections still share one page cache, whose mutex serializes their statements, so a long
+  reader query delays the writer; prefer `wal` for heavy readers (see `bench_db_readers.py`).
 
 Intended Usage:
-Call `initialize_db()` to create and access the database connection and lock.
+Call `initialize_db()` to create and access the database connection and lock. Readers use
+`with read_connection() as conn:`, which works in every mode.
 """
+import atexit
+import contextlib
+import itertools
+import queue
 import sqlite3
+import tempfile
 import threading
 import logging
 import os
-from .common import get_env_bool
+import re
+from . import global_state
+from .common import get_env_bool, get_env_int
 from .oui_parser import get_vendor
 
 
@@ -29,13 +50,241 @@ logger = logging.getLogger(__name__)
 debug_db_path = 'debug_mem_db.db'
 
 
-def initialize_db():
+
+def get_flow_bucket_seconds() -> int:
+    """
+    Return the width of the `network_flows` time buckets, set by `FLOW_BUCKET_SECONDS`.
+
+    The width must divide a minute, so that buckets can be rolled up into whole minutes; other
+    values fall back to one second.
+
+    Returns:
+        int: The bucket width in seconds.
+    """
+    bucket_seconds = get_env_int('FLOW_BUCKET_SECONDS', 1)
+    if bucket_seconds <= 0 or 60 % bucket_seconds:
+        logger.warning(f'[DB] FLOW_BUCKET_SECONDS must divide 60; got {bucket_seconds}, using 1')
+        return 1
+    return bucket_seconds
+
+
+# Width in seconds of the time buckets of `network_flows`
+FLOW_BUCKET_SECONDS = get_flow_bucket_seconds()
+
+DB_MODES = ('memory', 'wal', 'shared_memory')
+
+# Maximum number of read connections in `wal` and `shared_memory` modes
+DB_READ_POOL_SIZE = get_env_int('DB_READ_POOL_SIZE', 4)
+
+# The read connections of the current database; None in `memory` mode
+read_pool = None
+
+_shared_memory_db_ids = itertools.count()
+
+# The database files this process created in `wal` mode; `remove_db_files` removes them
+_created_db_paths = []
+_created_db_paths_lock = threading.Lock()
+
+# The network flows tables, from the finest to the coarsest, with the width of their buckets
+FLOW_TABLES = {
+    'network_flows': FLOW_BUCKET_SECONDS,
+    'network_flows_minute': 60,
+    'network_flows_hour': 3600,
+}
+
+
+def get_db_mode() -> str:
+    """
+    Return the database mode configured by the `DB_MODE` environment variable.
+
+    Returns:
+        str: One of `DB_MODES`; unknown values fall back to `memory`.
+    """
+    db_mode = os.environ.get('DB_MODE', 'memory').strip().lower()
+    if db_mode not in DB_MODES:
+        logger.warning(f'[DB] Unknown DB_MODE "{db_mode}"; using memory')
+        return 'memory'
+    return db_mode
+
+
+def get_wal_db_path() -> str:
+    """
+    Return the path of the database file in `wal` mode: `DB_PATH`, or a file on tmpfs (`/dev/shm`)
+    if available, in the temporary directory otherwise.
+    """
+    default_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.environ.get('DB_PATH', os.path.join(default_dir, f'libinspector_{os.getpid()}.db'))
+
+
+def _remove_wal_db_files(db_path: str):
+    """Remove a `wal` database file and its `-wal` and `-shm` files, if they exist."""
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f'[DB] Cannot remove {path}: {e}')
+
+
+def _remove_stale_wal_db_files(db_dir: str):
+    """
+    Remove the default `wal` database files (`libinspector_<pid>.db*`) of libinspector processes
+    that are no longer running, e.g., after a crash, so that they do not pile up on tmpfs.
+    """
+    # Signal 0 only probes a process on POSIX; on Windows, `os.kill` terminates it
+    if os.name != 'posix':
+        return
+    try:
+        filenames = os.listdir(db_dir)
+    except OSError:
+        return
+    for filename in filenames:
+        match = re.fullmatch(r'libinspector_(\d+)\.db(-wal|-shm)?', filename)
+        if match is None or int(match[1]) == os.getpid():
+            continue
+        try:
+            os.kill(int(match[1]), 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except OSError:
+            # Running, but as another user
+            continue
+        try:
+            os.remove(os.path.join(db_dir, filename))
+            logger.info(f'[DB] Removed the stale database file {filename}')
+        except OSError:
+            pass
+
+
+def remove_db_files():
+    """
+    Remove the database files this process created in `wal` mode, and close the read pool that
+    reads them. Called by `core.clean_up()`, and at exit.
+    """
+    global read_pool
+
+    with _created_db_paths_lock:
+        db_paths = list(_created_db_paths)
+        _created_db_paths.clear()
+    if not db_paths:
+        return
+
+    old_read_pool, read_pool = read_pool, None
+    if old_read_pool is not None:
+        old_read_pool.close()
+    for db_path in db_paths:
+        _remove_wal_db_files(db_path)
+
+
+atexit.register(remove_db_files)
+
+
+class ReadConnectionPool(object):
+    """
+    A pool of read-only connections to a database that is written through another connection.
+
+    Connections are opened on demand, up to `size`; further readers wait for a connection to be
+    returned to the pool.
+
+    Args:
+        db_uri (str): The SQLite URI of the database.
+        size (int): Maximum number of connections.
+        read_uncommitted (bool, optional): Read without table locks (shared-cache databases only).
+    """
+
+    def __init__(self, db_uri: str, size: int, read_uncommitted: bool = False):
+        """
+        Create an empty pool.
+
+        Args:
+            db_uri (str): The SQLite URI of the database.
+            size (int): Maximum number of connections.
+            read_uncommitted (bool, optional): Read without table locks (shared-cache databases only).
+        """
+        self.db_uri = db_uri
+        self.size = max(size, 1)
+        self.read_uncommitted = read_uncommitted
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_uri, uri=True, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.create_function('get_oui_vendor', 1, get_vendor)
+        conn.execute('PRAGMA query_only = 1')
+        if self.read_uncommitted:
+            conn.execute('PRAGMA read_uncommitted = 1')
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool for the duration of a `with` block.
+
+        Yields:
+            sqlite3.Connection: A read-only connection.
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                conn = self._connect() if len(self._connections) < self.size else None
+                if conn is not None:
+                    self._connections.append(conn)
+            if conn is None:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        """Close every connection of the pool."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+@contextlib.contextmanager
+def read_connection():
+    """
+    Get a connection to read the Inspector's database for the duration of a `with` block.
+
+    In `wal` and `shared_memory` modes, the connection comes from `read_pool` and queries run
+    without the writer's lock, so slow queries do not stall packet processing. In `memory` mode,
+    this is the writer's connection with `rw_lock` held.
+
+    Yields:
+        sqlite3.Connection: A connection to run read-only queries on.
+    """
+    pool = read_pool
+    if pool is not None:
+        with pool.connection() as conn:
+            yield conn
+        return
+
+    conn, rw_lock = global_state.db_conn_and_lock
+    with rw_lock:
+        yield conn
+
+
+def initialize_db(db_mode: str | None = None):
     """
     Initialize and returns an in-memory (or optionally on-disk) SQLite database for network data.
 
     This function sets up the database schema with tables for devices, hostnames, and network flows,
     including indexes for efficient querying. It also registers a custom SQLite function for OUI
-    vendor lookup. Thread safety is provided via a lock, allowing safe concurrent access.
+    vendor lookup. Thread safety is provided via a lock, allowing safe concurrent access. In `wal`
+    and `shared_memory` modes, it also replaces `read_pool` with a pool for the new database.
+
+    Args:
+        db_mode (str, optional): One of `DB_MODES`; defaults to `get_db_mode()`.
 
     Returns:
         tuple: A tuple `(conn, rw_lock)` where `conn` is the SQLite connection object and `rw_lock`
@@ -43,8 +292,16 @@ def initialize_db():
 
     Tables Created:
         - devices: Stores MAC and IP addresses, inspection status, gateway flag, timestamps, and metadata.
+        - device_attributes: One row per device attribute (OUI vendor, DHCP hostname, HTTP
+          User-Agent, mDNS and SSDP discovery data), keyed by MAC address, source and key.
         - hostnames: Maps IP addresses to hostnames, with update timestamps and metadata.
-        - network_flows: Records network flow data with source/destination info, ports, protocol, and statistics.
+        - network_flows: Records network flow data with source/destination info, ports, protocol,
+          statistics and the TCP sequence number range.
+        - network_flows_minute, network_flows_hour: Same columns as network_flows, holding the
+          older flows merged into one-minute and one-hour buckets.
+
+    Views Created:
+        - network_flows_all: All flows of the three tables, with their bucket width in `bucket_seconds`.
 
     Indexes:
         - On device IP address and inspection status.
@@ -55,19 +312,51 @@ def initialize_db():
         - The function must be called before any database operations are performed.
     """
     
-    use_mem = get_env_bool('USE_IN_MEMORY_DB', True)
-    logger.warning("[DB] Initializing IoT Inspector Database USE_IN_MEMORY value: %s)", os.getenv('USE_IN_MEMORY_DB'))
-    logger.warning("[DB] Initializing IoT Inspector Database (in-memory: %s)", use_mem)
+    global read_pool
+
+    if db_mode is None:
+        db_mode = get_db_mode()
+
+    new_read_pool = None
+    if db_mode == 'wal':
+        db_path = get_wal_db_path()
+        logger.warning(f'[DB] Saving IoT Inspector Database to the WAL-journaled file: {db_path}')
+        if 'DB_PATH' not in os.environ:
+            _remove_stale_wal_db_files(os.path.dirname(db_path))
+        # Start from an empty database, as in memory; only files created by this process are replaced
+        with _created_db_paths_lock:
+            if db_path in _created_db_paths:
+                _remove_wal_db_files(db_path)
+            elif os.path.exists(db_path):
+                raise RuntimeError(f'[DB] The database file {db_path} already exists; remove it or set another DB_PATH')
+            else:
+                _created_db_paths.append(db_path)
+        conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        new_read_pool = ReadConnectionPool(f'file:{db_path}?mode=ro', DB_READ_POOL_SIZE)
+
+    elif db_mode == 'shared_memory':
+        db_uri = f'file:libinspector_{os.getpid()}_{next(_shared_memory_db_ids)}?mode=memory&cache=shared'
+        logger.warning(f'[DB] Saving IoT Inspector Database to the shared-cache memory database: {db_uri}')
+        conn = sqlite3.connect(db_uri, uri=True, check_same_thread=False, isolation_level=None)
+        new_read_pool = ReadConnectionPool(db_uri, DB_READ_POOL_SIZE, read_uncommitted=True)
 
-    if use_mem:
-        logger.warning('[DB] Saving IoT Inspector Database to memory (not persisted to disk)')
-        db_uri = ':memory:'
     else:
-        logger.warning(f'[DB] Saving IoT Inspector Database to the file: {debug_db_path}')
-        db_uri = debug_db_path
+        use_mem = get_env_bool('USE_IN_MEMORY_DB', True)
+        logger.warning("[DB] Initializing IoT Inspector Database USE_IN_MEMORY value: %s)", os.getenv('USE_IN_MEMORY_DB'))
+        logger.warning("[DB] Initializing IoT Inspector Database (in-memory: %s)", use_mem)
+
+        if use_mem:
+            logger.warning('[DB] Saving IoT Inspector Database to memory (not persisted to disk)')
+            db_uri = ':memory:'
+        else:
+            logger.warning(f'[DB] Saving IoT Inspector Database to the file: {debug_db_path}')
+            db_uri = debug_db_path
+
+        # Connect to an in-memory SQLite database
+        conn = sqlite3.connect(db_uri, check_same_thread=False, isolation_level=None)
 
-    # Connect to an in-memory SQLite database
-    conn = sqlite3.connect(db_uri, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
 
     # Create a lock for thread-safe access
@@ -100,6 +389,18 @@ def initialize_db():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_devices_ip_address ON devices(ip_address)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_devices_is_inspected ON devices(is_inspected)')
 
+        # Create the device attributes table; one row per attribute, so that updates never rewrite a JSON blob
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS device_attributes (
+                mac_address TEXT NOT NULL,
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                updated_ts INTEGER DEFAULT 0,
+                PRIMARY KEY (mac_address, source, key)
+            )
+        ''')
+
         # Create the hostnames table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS hostnames (
@@ -110,10 +411,40 @@ def initialize_db():
                 metadata_json TEXT DEFAULT '{}'
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_hostnames_updated_ts ON hostnames(updated_ts)')
 
-        # Create the network flows table, with a compound primary key as the flow_key
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS network_flows (
+        # Create the network flows table and its rollups, with a compound primary key as the flow_key
+        for table in FLOW_TABLES:
+            create_flow_table(cursor, table)
+
+        # All flows, whatever their resolution; a flow row lives in exactly one of the tables
+        cursor.execute('DROP VIEW IF EXISTS network_flows_all')
+        cursor.execute(f'''
+            CREATE VIEW network_flows_all AS
+            {' UNION ALL '.join(f'SELECT *, {bucket_seconds} AS bucket_seconds FROM {table}' for table, bucket_seconds in FLOW_TABLES.items())}
+        ''')
+
+        # Define a SQLite UDF to parse the OUI from the MAC address
+        conn.create_function('get_oui_vendor', 1, get_vendor)
+
+    # The schema exists now; readers can connect
+    old_read_pool, read_pool = read_pool, new_read_pool
+    if old_read_pool is not None:
+        old_read_pool.close()
+
+    return conn, rw_lock
+
+
+def create_flow_table(cursor, table: str):
+    """
+    Create a network flows table and its indexes.
+
+    Args:
+        cursor: The SQLite cursor.
+        table (str): The table name, one of `FLOW_TABLES`.
+    """
+    cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
                 timestamp INTEGER,
                 src_ip_address TEXT,
                 dest_ip_address TEXT,
@@ -126,7 +457,9 @@ def initialize_db():
                 protocol TEXT,
                 byte_count INTEGER DEFAULT 0,
                 packet_count INTEGER DEFAULT 0,
-                metadata_json TEXT DEFAULT '{}',
+                tcp_seq_min INTEGER DEFAULT 0,
+                tcp_seq_max INTEGER DEFAULT 0,
+                metadata_json TEXT DEFAULT '{{}}',
                 PRIMARY KEY (
                        timestamp,
                        src_mac_address, dest_mac_address,
@@ -137,15 +470,7 @@ def initialize_db():
             )
         ''')
 
-        # Create indexes on src_ip_address, dest_ip_address, src_hostname, dest_hostname and timestamp
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_network_flows_src_ip_address ON network_flows(src_ip_address)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_network_flows_dest_ip_address ON network_flows(dest_ip_address)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_network_flows_src_hostname ON network_flows(src_hostname)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_network_flows_dest_hostname ON network_flows(dest_hostname)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_network_flows_timestamp ON network_flows(timestamp)')
-
-        # Define a SQLite UDF to parse the OUI from the MAC address
-        conn.create_function('get_oui_vendor', 1, get_vendor)
-
-    return conn, rw_lock
+    # Create indexes on src_ip_address, dest_ip_address, src_hostname, dest_hostname and timestamp
+    for column in ('src_ip_address', 'dest_ip_address', 'src_hostname', 'dest_hostname', 'timestamp'):
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})')
 
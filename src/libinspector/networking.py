@@ -8,7 +8,7 @@ check IP address properties. It also provides functions to enable or disable IP
 operating system level.
 
 Key Features:
-- Database lookups for MAC and IP address associations.
+- Database lookups for MAC and IP address associations, fronted by an in-memory IP <-> MAC index.
 - Detection of the default gateway, interface, and host IP.
 - Retrieval of the host's MAC address and all local MAC addresses.
 - Calculation of the network mask and all IPs in the local subnet.
@@ -36,15 +36,58 @@ import netaddr
 import logging
 import psutil
 import sys
+import threading
 from . import global_state
 from . import common
 
 logger = logging.getLogger(__name__)
 
 
+# In-memory, bidirectional IP <-> MAC index of the devices table, kept current by the packet
+# processor (ARP and DHCP) so that per-packet lookups do not need the database lock. IP addresses
+# that are not in the devices table are remembered in a negative cache for a short while.
+IP_MAC_NEGATIVE_CACHE_TTL = 60
+IP_MAC_NEGATIVE_CACHE_MAX_SIZE = 65536
+_ip_mac_cache_lock = threading.Lock()
+_ip_to_mac_dict = {}
+_mac_to_ip_dict = {}
+_ip_negative_cache_dict = {}
+
+
+def update_ip_mac_mapping(ip_addr: str, mac_addr: str):
+    """
+    Record that `ip_addr` is currently assigned to `mac_addr` in the in-memory IP <-> MAC index.
+
+    Must be called whenever the IP address of a device is written to the devices table.
+
+    Args:
+        ip_addr (str): The IP address of the device.
+        mac_addr (str): The MAC address of the device.
+    """
+    with _ip_mac_cache_lock:
+        previous_ip_addr = _mac_to_ip_dict.get(mac_addr)
+        if previous_ip_addr != ip_addr and _ip_to_mac_dict.get(previous_ip_addr) == mac_addr:
+            del _ip_to_mac_dict[previous_ip_addr]
+        _ip_to_mac_dict[ip_addr] = mac_addr
+        _mac_to_ip_dict[mac_addr] = ip_addr
+        _ip_negative_cache_dict.pop(ip_addr, None)
+
+
+def clear_ip_mac_cache():
+    """Forget every entry of the in-memory IP <-> MAC index, including the negative cache."""
+    with _ip_mac_cache_lock:
+        _ip_to_mac_dict.clear()
+        _mac_to_ip_dict.clear()
+        _ip_negative_cache_dict.clear()
+
+
 def get_mac_address_from_ip(ip_addr: str) -> str:
     """
-    Retrieve the MAC address associated with a given IP address from the devices database.
+    Retrieve the MAC address associated with a given IP address.
+
+    The in-memory IP <-> MAC index is consulted first; the devices database (and its lock) is
+    only used on a cache miss. Unknown IP addresses are negatively cached for
+    `IP_MAC_NEGATIVE_CACHE_TTL` seconds.
 
     Args:
         ip_addr (str): The IP address for which to retrieve the MAC address.
@@ -55,6 +98,14 @@ def get_mac_address_from_ip(ip_addr: str) -> str:
     Raises:
         KeyError: If no MAC address is found for the specified IP address.
     """
+    with _ip_mac_cache_lock:
+        mac_addr = _ip_to_mac_dict.get(ip_addr)
+        if mac_addr is not None:
+            return mac_addr
+        negative_expiry_ts = _ip_negative_cache_dict.get(ip_addr)
+        if negative_expiry_ts is not None and negative_expiry_ts > time.time():
+            raise KeyError(f'No MAC address found for IP address {ip_addr}')
+
     conn, rw_lock = global_state.db_conn_and_lock
 
     # Run SQL query to get the MAC address based on the IP address
@@ -63,14 +114,26 @@ def get_mac_address_from_ip(ip_addr: str) -> str:
         result = conn.execute(sql, (ip_addr,)).fetchone()
 
     if result is None:
+        with _ip_mac_cache_lock:
+            if len(_ip_negative_cache_dict) >= IP_MAC_NEGATIVE_CACHE_MAX_SIZE:
+                _ip_negative_cache_dict.clear()
+            _ip_negative_cache_dict[ip_addr] = time.time() + IP_MAC_NEGATIVE_CACHE_TTL
         raise KeyError(f'No MAC address found for IP address {ip_addr}')
 
-    return result['mac_address']
+    mac_addr = result['mac_address']
+    with _ip_mac_cache_lock:
+        _ip_to_mac_dict.setdefault(ip_addr, mac_addr)
+        _mac_to_ip_dict.setdefault(mac_addr, ip_addr)
+
+    return mac_addr
 
 
 def get_ip_address_from_mac(mac_addr: str) -> str:
     """
-    Retrieve the IP address associated with a given MAC address from the devices database.
+    Retrieve the IP address associated with a given MAC address.
+
+    The in-memory IP <-> MAC index is consulted first; the devices database is only used on a
+    cache miss.
 
     Args:
         mac_addr (str): The MAC address for which to retrieve the IP address.
@@ -81,6 +144,11 @@ def get_ip_address_from_mac(mac_addr: str) -> str:
     Raises:
         KeyError: If no IP address is found for the specified MAC address.
     """
+    with _ip_mac_cache_lock:
+        ip_addr = _mac_to_ip_dict.get(mac_addr)
+        if ip_addr is not None:
+            return ip_addr
+
     conn, rw_lock = global_state.db_conn_and_lock
 
     # Run sql query to get the IP address based on the MAC address
@@ -89,6 +157,8 @@ def get_ip_address_from_mac(mac_addr: str) -> str:
         result = conn.execute(sql, (mac_addr,)).fetchone()
 
     if result is not None:
+        with _ip_mac_cache_lock:
+            _mac_to_ip_dict.setdefault(mac_addr, result[0])
         return result[0]
 
     raise KeyError(f'No IP address found for MAC address {mac_addr}')
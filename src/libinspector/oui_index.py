@@ -0,0 +1,258 @@
+"""
+Prebuilt Binary OUI Index.
+
+Parsing the IEEE CSV files (about 52k rows, 5 MB) into a dictionary takes a noticeable fraction
+of a second, and it used to happen on the first `get_vendor` call, i.e., inside the
+`get_oui_vendor` SQLite function while the packet processor held the database lock. This module
+instead compiles the CSV files into a compact binary index, `data/oui/oui_index.bin`, which is
+shipped with the package and loaded with `mmap` without any parsing.
+
+File Format (little-endian):
+- Header: magic `OUIX`, format version (u16), number of prefix sections (u16), number of vendor
+  strings (u32), and a fingerprint of the CSV files it was built from (32 bytes).
+- One section per prefix length (in hex digits, longest first): the length (u32) and entry count
+  (u32), the sorted prefixes as integers (u64 each), then the vendor index of each prefix (u32
+  each), padded to 8 bytes.
+- The vendor string table: `vendor_count + 1` offsets (u32 each) into a blob of UTF-8 strings.
+  Vendor names are interned, so that each distinct name is stored once.
+
+A lookup bisects each section's prefix array for the MAC address truncated to that length.
+
+The index is rebuilt by the update workflow whenever it downloads new CSV files:
+    python -m libinspector.oui_index
+If it does not match the CSV files next to it (see `get_csv_fingerprint`), `oui_parser` builds
+the index in memory at startup instead; the package data is never written at runtime.
+"""
+import array
+import bisect
+import mmap
+import os
+import re
+import struct
+import sys
+from . import common
+
+OUI_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'oui')
+OUI_INDEX_PATH = os.path.join(OUI_DATA_DIR, 'oui_index.bin')
+
+INDEX_MAGIC = b'OUIX'
+INDEX_VERSION = 1
+
+_header_struct = struct.Struct('<4sHHI32s')
+_section_struct = struct.Struct('<II')
+
+# `int(..., 16)` also accepts underscores, whitespace and a `0x` prefix, which would throw off the
+# number of digits; lookups only take MAC addresses made of these characters
+_hex_digits_pattern = re.compile('[0-9a-f]+')
+
+
+def _cast_array(buffer, typecode: str):
+    """View little-endian integers in place; big-endian hosts get a byte-swapped copy."""
+    if sys.byteorder == 'little':
+        return buffer.cast(typecode)
+    values = array.array(typecode, buffer.tobytes())
+    values.byteswap()
+    return values
+
+
+def get_csv_paths(csv_dir: str = OUI_DATA_DIR) -> list:
+    """Return the paths of the IEEE CSV files in `csv_dir`, sorted by name."""
+    return common.get_data_file_paths(csv_dir, '.csv')
+
+
+def get_csv_fingerprint(csv_dir: str = OUI_DATA_DIR) -> bytes:
+    """Identify the CSV files an index is built from, by their names and contents (see `common.get_data_fingerprint`)."""
+    return common.get_data_fingerprint(get_csv_paths(csv_dir))
+
+
+def build_index(oui_dict: dict, fingerprint: bytes) -> bytes:
+    """
+    Compile a mapping of OUI prefixes to vendor names into the binary index format.
+
+    Args:
+        oui_dict (dict): Maps lowercase hex prefixes (e.g. `'8c1f64003'`) to vendor names.
+        fingerprint (bytes): The `get_csv_fingerprint()` of the files `oui_dict` was parsed from.
+
+    Returns:
+        bytes: The index.
+    """
+    vendor_ids = {}
+    sections = {}
+    for prefix, vendor in oui_dict.items():
+        try:
+            prefix_int = int(prefix, 16)
+        except ValueError:
+            continue
+        vendor_id = vendor_ids.setdefault(vendor, len(vendor_ids))
+        sections.setdefault(len(prefix), []).append((prefix_int, vendor_id))
+
+    chunks = [_header_struct.pack(INDEX_MAGIC, INDEX_VERSION, len(sections), len(vendor_ids), fingerprint)]
+    for prefix_length in sorted(sections, reverse=True):
+        entries = sorted(sections[prefix_length])
+        chunks.append(_section_struct.pack(prefix_length, len(entries)))
+        chunks.append(struct.pack(f'<{len(entries)}Q', *(prefix_int for prefix_int, _ in entries)))
+        values = struct.pack(f'<{len(entries)}I', *(vendor_id for _, vendor_id in entries))
+        chunks.append(values + b'\0' * (-len(values) % 8))
+
+    encoded_vendors = [vendor.encode('utf-8') for vendor in vendor_ids]
+    offsets = [0]
+    for encoded_vendor in encoded_vendors:
+        offsets.append(offsets[-1] + len(encoded_vendor))
+    chunks.append(struct.pack(f'<{len(offsets)}I', *offsets))
+    chunks.append(b''.join(encoded_vendors))
+    return b''.join(chunks)
+
+
+class OuiIndex(object):
+    """
+    Read-only view of a binary OUI index.
+
+    Args:
+        buffer: The index, as `bytes` or an `mmap`.
+
+    Raises:
+        ValueError: If the buffer is not an index of the supported version.
+    """
+
+    def __init__(self, buffer):
+        """
+        Parse the header and section table of the index; the arrays themselves are not copied.
+
+        Args:
+            buffer: The index, as `bytes` or an `mmap`.
+
+        Raises:
+            ValueError: If the buffer is not an index of the supported version.
+        """
+        self._buffer = buffer
+        view = memoryview(buffer)
+        if len(view) < _header_struct.size:
+            raise ValueError('Truncated OUI index')
+        magic, version, section_count, vendor_count, self.fingerprint = _header_struct.unpack_from(view, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f'Unsupported OUI index (magic {magic!r}, version {version})')
+
+        # (prefix length, prefixes, vendor indexes), longest prefixes first
+        self._sections = []
+        offset = _header_struct.size
+        for _ in range(section_count):
+            if offset + _section_struct.size > len(view):
+                raise ValueError('Truncated OUI index')
+            prefix_length, entry_count = _section_struct.unpack_from(view, offset)
+            offset += _section_struct.size
+            if offset + entry_count * 12 > len(view):
+                raise ValueError('Truncated OUI index')
+            prefixes = _cast_array(view[offset:offset + entry_count * 8], 'Q')
+            offset += entry_count * 8
+            vendor_ids = _cast_array(view[offset:offset + entry_count * 4], 'I')
+            offset += entry_count * 4 + (-entry_count * 4 % 8)
+            self._sections.append((prefix_length, prefixes, vendor_ids))
+
+        if offset + (vendor_count + 1) * 4 > len(view):
+            raise ValueError('Truncated OUI index')
+        self._vendor_offsets = _cast_array(view[offset:offset + (vendor_count + 1) * 4], 'I')
+        self._vendor_blob = view[offset + (vendor_count + 1) * 4:]
+        if len(self._vendor_blob) < self._vendor_offsets[-1]:
+            raise ValueError('Truncated OUI index')
+
+    def get_vendor_name(self, vendor_id: int) -> str:
+        """Return the vendor name at index `vendor_id` of the string table."""
+        return str(self._vendor_blob[self._vendor_offsets[vendor_id]:self._vendor_offsets[vendor_id + 1]], 'utf-8')
+
+    def lookup(self, mac_hex: str) -> str:
+        """
+        Find the vendor of the longest prefix of a MAC address.
+
+        Args:
+            mac_hex (str): The MAC address as lowercase hex digits, without delimiters.
+
+        Returns:
+            str: The vendor name, or an empty string if no prefix matches or `mac_hex` contains
+            anything but lowercase hex digits.
+        """
+        if _hex_digits_pattern.fullmatch(mac_hex) is None:
+            return ''
+        for prefix_length, prefixes, vendor_ids in self._sections:
+            if len(mac_hex) < prefix_length:
+                continue
+            prefix_int = int(mac_hex[:prefix_length], 16)
+            ix = bisect.bisect_left(prefixes, prefix_int)
+            if ix < len(prefixes) and prefixes[ix] == prefix_int:
+                return self.get_vendor_name(vendor_ids[ix])
+        return ''
+
+    def lookup_many(self, mac_hexes) -> dict:
+        """
+        Find the vendors of many MAC addresses at once.
+
+        The addresses are deduplicated and sorted, so that each section is searched in a single
+        forward pass: every bisect starts where the previous one ended.
+
+        Args:
+            mac_hexes (iterable): MAC addresses as lowercase hex digits, without delimiters.
+
+        Returns:
+            dict: Maps each MAC address to its vendor name, or to an empty string if unknown.
+        """
+        vendors = {}
+        # (mac_hex, its value, its length in hex digits), sorted so that the prefixes of every
+        # length come in ascending order
+        pending = []
+        for mac_hex in sorted(set(mac_hexes)):
+            if _hex_digits_pattern.fullmatch(mac_hex) is None:
+                vendors[mac_hex] = ''
+            else:
+                pending.append((mac_hex, int(mac_hex, 16), len(mac_hex)))
+
+        get_vendor_name = self.get_vendor_name
+        bisect_left = bisect.bisect_left
+        for prefix_length, prefixes, vendor_ids in self._sections:
+            unmatched = []
+            prefix_count = len(prefixes)
+            lo = 0
+            for entry in pending:
+                mac_hex, value, length = entry
+                if length < prefix_length:
+                    unmatched.append(entry)
+                    continue
+                prefix_int = value >> (4 * (length - prefix_length))
+                lo = bisect_left(prefixes, prefix_int, lo)
+                if lo < prefix_count and prefixes[lo] == prefix_int:
+                    vendors[mac_hex] = get_vendor_name(vendor_ids[lo])
+                else:
+                    unmatched.append(entry)
+            pending = unmatched
+        for mac_hex, _, _ in pending:
+            vendors[mac_hex] = ''
+        return vendors
+
+    def __len__(self) -> int:
+        """Return the number of prefixes in the index."""
+        return sum(len(prefixes) for _, prefixes, _ in self._sections)
+
+
+def load_index(path: str = OUI_INDEX_PATH) -> OuiIndex:
+    """
+    Map an index file into memory.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not an index of the supported version.
+    """
+    with open(path, 'rb') as fp:
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return OuiIndex(buffer)
+
+
+def main():
+    """Rebuild `oui_index.bin` from the CSV files next to it."""
+    from . import oui_parser
+
+    oui_dict = oui_parser.parse_ieee_oui_csv_files()
+    index_bytes = build_index(oui_dict, get_csv_fingerprint())
+    common.write_data_file(OUI_INDEX_PATH, index_bytes)
+    print(f'Wrote {len(oui_dict)} prefixes ({len(index_bytes)} bytes) to {OUI_INDEX_PATH}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,71 +11,60 @@ MA-M (Medium): https://standards-oui.ieee.org/oui28/mam.csv
 MA-S (Small): https://standards-oui.ieee.org/oui36/oui36.csv
 
 Key Features:
-- Loads and parses the IEEE OUI database from a local CSV file.
+- Looks vendors up in a prebuilt binary index of the IEEE OUI database (see `oui_index.py`),
+  which is memory-mapped rather than parsed at startup.
 - Supports OUI prefixes of varying lengths for accurate vendor identification.
 - Uses LRU caching to optimize repeated lookups and database parsing.
 - Provides simple interfaces to retrieve the vendor for a given MAC address.
 
 Intended Usage:
 Call `get_vendor(mac_addr)` with a MAC address string to retrieve the associated
-vendor or company name.
+vendor or company name, or `get_vendors(mac_addrs)` to resolve many addresses at once.
 
 Dependencies:
 - functools
-- os
+- mmap (for loading the prebuilt index)
 - csv (for parsing the IEEE file)
 
 Resource Files:
 - oui.csv
 - mam.csv
 - oui36.csv
+- oui_index.bin (built from the CSV files)
 """
 import functools
-import os
+import logging
 import csv
 import sys
 
+from . import common
+from . import oui_index
+
+logger = logging.getLogger(__name__)
+
 # Maps the first 3 (or more) bytes of the MAC address to the company name.
 _oui_dict = {}
 
 _oui_length_split_list = []
 
 
-@functools.lru_cache(maxsize=1)
-def parse_ieee_oui_database_from_local_csv():
+def parse_ieee_oui_csv_files(csv_dir: str = oui_index.OUI_DATA_DIR) -> dict:
     """
-    Parse local IEEE OUI databases (MA-L, MA-M, and MA-S) and populate the OUI-to-company mapping.
-    See Module Docstring for more details where the files were obtained from.
-
-    This function reads the `oui.csv`, `mam.csv`, and `oui36.csv` files from a local directory,
-    which contain mappings from OUI prefixes to company names. It populates the global `_oui_dict`
-    with these mappings. It clears any previously loaded data to ensure only the latest
-    IEEE data is used. It also determines the set of unique OUI prefix lengths found in the
-    databases and stores them in `_oui_length_split_list`.
-
-    The function is cached to ensure the database is only parsed once per process lifetime,
-    improving performance for repeated lookups.
+    Parse the IEEE OUI CSV files (MA-L, MA-M, and MA-S) of a directory.
 
     File Format (Expected):
         The CSV files are expected to have an OUI prefix in the 'Assignment' column and the
         company name in the 'Organization Name' column. They also contain a header row which
         is skipped.
 
-    Side Effects:
-        - Populates the global `_oui_dict` with OUI-to-company mappings, clearing any old data.
-        - Populates the global `_oui_length_split_list` with sorted OUI prefix lengths,
-          clearing any old data.
-    """
-    # Clear existing data to avoid conflicts with other database parsers
-    _oui_dict.clear()
-    _oui_length_split_list.clear()
-
-    _oui_length_splits = set()
-    oui_csv_file_directory = os.path.join(os.path.dirname(__file__), 'data', 'oui')
-    for filename in os.listdir(oui_csv_file_directory):
-        data_path = os.path.join(oui_csv_file_directory, filename)
-        data_path = os.path.abspath(data_path)
+    Args:
+        csv_dir (str, optional): The directory of `oui.csv`, `mam.csv` and `oui36.csv`.
 
+    Returns:
+        dict: Maps lowercase OUI prefixes to company names.
+    """
+    oui_dict = {}
+    for data_path in oui_index.get_csv_paths(csv_dir):
         try:
             with open(data_path, 'r', encoding='utf-8') as fp:
                 reader = csv.reader(fp)
@@ -85,24 +74,73 @@ def parse_ieee_oui_database_from_local_csv():
                     continue
 
                 try:
-                    oui_index = header.index("Assignment")
+                    oui_column = header.index("Assignment")
                     company_index = header.index("Organization Name")
                 except ValueError:
                     continue
 
                 for row in reader:
                     try:
-                        oui = row[oui_index].lower().strip()
+                        oui = row[oui_column].lower().strip()
                         company = row[company_index].strip()
-                        _oui_dict[oui] = company
-                        _oui_length_splits.add(len(oui))
+                        oui_dict[oui] = company
                     except IndexError:
                         continue
         except FileNotFoundError:
             # Continue to the next file if one is not found
             continue
 
-    _oui_length_split_list.extend(sorted(_oui_length_splits, reverse=True))
+    return oui_dict
+
+
+@functools.lru_cache(maxsize=1)
+def parse_ieee_oui_database_from_local_csv():
+    """
+    Parse local IEEE OUI databases (MA-L, MA-M, and MA-S) and populate the OUI-to-company mapping.
+    See Module Docstring for more details where the files were obtained from.
+
+    `get_vendor` does not need this mapping; it reads the prebuilt index (see `load_oui_index`).
+    This function is kept for callers that want the whole mapping as a dictionary.
+
+    The function is cached to ensure the database is only parsed once per process lifetime,
+    improving performance for repeated lookups.
+
+    Side Effects:
+        - Populates the global `_oui_dict` with OUI-to-company mappings, clearing any old data.
+        - Populates the global `_oui_length_split_list` with sorted OUI prefix lengths,
+          clearing any old data.
+    """
+    # Clear existing data to avoid conflicts with other database parsers
+    _oui_dict.clear()
+    _oui_length_split_list.clear()
+
+    _oui_dict.update(parse_ieee_oui_csv_files())
+    _oui_length_split_list.extend(sorted({len(oui) for oui in _oui_dict}, reverse=True))
+
+
+def _load_shipped_oui_index() -> tuple:
+    index = oui_index.load_index()
+    return index.fingerprint, index
+
+
+@functools.lru_cache(maxsize=1)
+def load_oui_index() -> oui_index.OuiIndex:
+    """
+    Load the prebuilt OUI index (`data/oui/oui_index.bin`) with `mmap`.
+
+    If the index is missing, unreadable, or was built from other CSV files than those shipped next
+    to it, it is built from the CSV files in memory instead (see `common.load_prebuilt_data`). The
+    function is cached, so this happens at most once per process.
+
+    Returns:
+        OuiIndex: The index.
+    """
+    return common.load_prebuilt_data(
+        'OUI index',
+        _load_shipped_oui_index,
+        lambda fingerprint: oui_index.OuiIndex(oui_index.build_index(parse_ieee_oui_csv_files(), fingerprint)),
+        oui_index.get_csv_paths()
+    )
 
 
 @functools.lru_cache(maxsize=1024)
@@ -112,9 +150,9 @@ def get_vendor(mac_addr: str) -> str:
 
     This function normalizes the input MAC address by removing common delimiters and converting
     it to lowercase. It then attempts to match the longest possible OUI prefix from the MAC address
-    against the entries in the OUI database, as loaded by `parse_wireshark_oui_database()`.
-    If a matching OUI is found, the corresponding company name is returned; otherwise, an empty
-    string is returned to indicate an unknown vendor.
+    against the entries of the prebuilt OUI index, as loaded by `load_oui_index()`, with a binary
+    search per prefix length. If a matching OUI is found, the corresponding company name is
+    returned; otherwise, an empty string is returned to indicate an unknown vendor.
 
     The function uses LRU caching to optimize repeated lookups for the same MAC addresses.
 
@@ -128,31 +166,49 @@ def get_vendor(mac_addr: str) -> str:
         >>> get_vendor('00:1A:2B:3C:4D:5E')
         'Example Corp'
     """
-    parse_ieee_oui_database_from_local_csv()
+    return load_oui_index().lookup(normalize_mac_addr(mac_addr))
+
 
-    mac_addr = mac_addr.lower().replace(':', '').replace('-', '').replace('.', '')
+def normalize_mac_addr(mac_addr: str) -> str:
+    """Return a MAC address as lowercase hex digits, without colons, dashes, or dots."""
+    return mac_addr.lower().replace(':', '').replace('-', '').replace('.', '')
 
-    # Split the MAC address in different ways and check against the oui_dict
-    for split_length in _oui_length_split_list:
-        oui = mac_addr[:split_length]
-        if oui in _oui_dict:
-            return _oui_dict[oui]
 
-    return ''
+def get_vendors(mac_addrs) -> dict:
+    """
+    Retrieve the vendors of many MAC addresses at once.
+
+    Each distinct MAC address is normalized once, and all of them are resolved in one pass over
+    the OUI index (see `OuiIndex.lookup_many`). Unlike `get_vendor`, this does not go through
+    (or evict entries of) the LRU cache, so it suits large batches of mostly unique addresses.
+
+    Args:
+        mac_addrs (iterable): MAC addresses in any format accepted by `get_vendor`; duplicates are allowed.
+
+    Returns:
+        dict: Maps each distinct MAC address, as given, to its vendor name (an empty string if unknown).
+    """
+    normalized_mac_addrs = {mac_addr: normalize_mac_addr(mac_addr) for mac_addr in mac_addrs}
+    vendors = load_oui_index().lookup_many(normalized_mac_addrs.values())
+    return {mac_addr: vendors[mac_hex] for mac_addr, mac_hex in normalized_mac_addrs.items()}
 
 
 def main():
     if len(sys.argv) != 2:
         print("Usage: python oui_parser.py <mac_addresses_file>")
-        print("The file should contain one MAC address per line.")
+        print("The file should contain one MAC address per line; each distinct address is printed once.")
         return
 
     try:
         with open(sys.argv[1], 'r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                print(line.strip(), '\t', get_vendor(line.strip()))
+            # Keeps the order of first appearance
+            mac_addrs = dict.fromkeys(line.strip() for line in f if line.strip())
     except FileNotFoundError:
         print(f"File not found: {sys.argv[1]}")
+        return
+
+    for mac_addr, vendor in get_vendors(mac_addrs).items():
+        print(mac_addr, '\t', vendor)
 
 
 if __name__ == '__main__':
@@ -2,13 +2,21 @@
 Packet Collector Module for Network Inspection.
 
 This module is responsible for capturing network packets from the active network interface
-using Scapy, filtering out irrelevant traffic, and queuing packets for further analysis.
+using Scapy (or, on Linux, a memory-mapped TPACKET_V3 ring), filtering out irrelevant traffic,
+and queuing packets for further analysis.
 It provides functions to start the packet sniffing process, check the running state of
 the Inspector, and safely add packets to a shared processing queue.
 
 Key Features:
-- Captures packets in 30-second intervals to ensure robustness against crashes.
+- Keeps one long-lived capture session (socket or ring, with its BPF filter) across intervals;
+  it is only reopened after an error or when the interface or IP address changes.
+- Reports the capture rate every `CAPTURE_STATS_INTERVAL` seconds without stopping the capture.
+- Selectable capture backend via `CAPTURE_BACKEND` (`scapy` or `tpacket`).
+- Optional raw-bytes queue (`RAW_PACKET_QUEUE`), leaving dissection to the packet processor.
+- Optional multi-process capture with the `tpacket` backend (`CAPTURE_WORKERS`; see `fanout_capture`).
 - Excludes packets to/from the Inspector host, except for ARP packets needed for device discovery.
+- Restricts the kernel BPF filter to the inspected devices (plus ARP, DHCP and DNS), and re-attaches
+  it in place whenever `devices.is_inspected` changes (`DYNAMIC_CAPTURE_FILTER`).
 - Thread-safe access to global state for interface, IP address, and control flags.
 - Periodically logs the size of the packet queue for monitoring.
 - Designed for integration with a real-time network monitoring and analysis system.
@@ -24,13 +32,216 @@ Import and invoke `start()` to begin packet collection as part of the Inspector'
 import scapy.all as sc
 import time
 import logging
+import ipaddress
+import os
+import re
 
 from . import global_state
 from . import common
+from . import tpacket_capture
+from . import fanout_capture
+from . import packet_processor
+from . import mem_db
 
 logger = logging.getLogger(__name__)
 
-sc.load_layer('tls')
+# Seconds between two capture rate reports
+CAPTURE_STATS_INTERVAL = common.get_env_int('CAPTURE_STATS_INTERVAL', 30)
+
+# Number of capture worker processes with the tpacket backend; 0 captures on the collector thread
+CAPTURE_WORKERS = common.get_env_int('CAPTURE_WORKERS', 0)
+
+# Whether to restrict the capture filter to the inspected devices
+DYNAMIC_CAPTURE_FILTER = common.get_env_bool('DYNAMIC_CAPTURE_FILTER', True)
+
+# Seconds between two checks of the set of inspected devices
+INSPECTED_DEVICES_POLL_INTERVAL = 5
+
+# Above this many inspected devices, capture everything instead. Each device adds up to about 10
+# BPF instructions; the kernel rejects programs of more than 4096 instructions, and may fail to
+# allocate far smaller ones
+MAX_FILTERED_DEVICES = 64
+
+_mac_addr_regex = re.compile(r'^[0-9a-f]{2}(:[0-9a-f]{2}){5}$')
+
+# The long-lived capture session, owned by the packet collector thread
+_capture_session = None
+
+# The set of inspected devices whose filter could not be attached; all traffic is captured until it changes
+_unfilterable_devices = None
+
+
+def get_capture_backend() -> str:
+    """
+    Return the capture backend to use, as configured by the `CAPTURE_BACKEND` environment variable.
+
+    Supported values are `scapy` (default, works on every platform) and `tpacket` (Linux only;
+    a memory-mapped TPACKET_V3 ring that hands whole blocks of frames to the processor). If
+    `tpacket` is requested on a platform that does not support it, falls back to `scapy`.
+
+    Returns:
+        str: Either 'scapy' or 'tpacket'.
+    """
+    backend = os.environ.get('CAPTURE_BACKEND', 'scapy').strip().lower()
+    if backend not in ('scapy', 'tpacket'):
+        logger.warning(f'[packet_collector] Unknown CAPTURE_BACKEND "{backend}"; using scapy')
+        return 'scapy'
+    if backend == 'tpacket' and not tpacket_capture.is_supported():
+        logger.warning('[packet_collector] The tpacket backend requires Linux; using scapy')
+        return 'scapy'
+    return backend
+
+
+def build_capture_filter(host_ip_addr: str, inspected_devices: frozenset | None = None) -> str:
+    """
+    Build the BPF filter expression shared by all capture backends.
+
+    Avoids capturing packets to/from the host itself, except ARP, which we need for discovery.
+    If the set of inspected devices is given, other traffic is only captured if it is DHCP or DNS,
+    or if it is to or from an inspected device. A device is matched by IP address, which also covers
+    the legs of spoofed traffic that the Inspector host forwards to and from the gateway, and only
+    by MAC address if its IPv4 address is unknown; the packet processor ignores IPv6 traffic anyway.
+
+    Args:
+        host_ip_addr (str): The IP address of the Inspector host.
+        inspected_devices (frozenset, optional): `(mac_address, ip_address)` tuples of the inspected
+            devices, as returned by `get_inspected_devices()`. None captures every device's traffic.
+
+    Returns:
+        str: A tcpdump-style filter expression.
+    """
+    if inspected_devices is None:
+        return f'(not arp and host not {host_ip_addr}) or arp'
+
+    terms = ['udp port 67', 'udp port 68', 'port 53']
+    for mac_addr, ip_addr in sorted(inspected_devices):
+        # Only well-formed addresses make it into the filter expression
+        try:
+            terms.append(f'host {ipaddress.IPv4Address(ip_addr)}')
+        except ValueError:
+            if _mac_addr_regex.match(mac_addr):
+                terms.append(f'ether host {mac_addr}')
+
+    return f'(not arp and host not {host_ip_addr} and ({" or ".join(terms)})) or arp'
+
+
+def get_inspected_devices() -> frozenset | None:
+    """
+    Return the devices whose traffic the capture filter should admit.
+
+    Returns:
+        frozenset or None: `(mac_address, ip_address)` tuples of the inspected devices (other than
+        the gateway), or None if the filter should not be restricted: `DYNAMIC_CAPTURE_FILTER` is
+        off, the database is not initialized, or there are more than `MAX_FILTERED_DEVICES`.
+    """
+    if not DYNAMIC_CAPTURE_FILTER or global_state.db_conn_and_lock is None:
+        return None
+
+    with mem_db.read_connection() as conn:
+        rows = conn.execute(
+            'SELECT mac_address, ip_address FROM devices WHERE is_inspected = 1 AND is_gateway = 0 LIMIT ?',
+            (MAX_FILTERED_DEVICES + 1,)
+        ).fetchall()
+
+    if len(rows) > MAX_FILTERED_DEVICES:
+        return None
+
+    return frozenset((row['mac_address'].lower(), row['ip_address']) for row in rows)
+
+
+class CaptureSession(object):
+    """
+    A capture source that stays open across statistics intervals.
+
+    Depending on the backend, the source is a Scapy listening socket (with dissection in the
+    collector, or raw frames) or a TPACKET_V3 ring. The BPF filter is compiled and attached once,
+    when the session is opened.
+
+    Args:
+        backend (str): Either 'scapy' or 'tpacket'.
+        raw (bool): With the scapy backend, queue raw `(timestamp, frame_bytes)` tuples instead of packets.
+        iface (str): The interface to capture on.
+        bpf_filter (str): The BPF filter expression.
+    """
+
+    def __init__(self, backend: str, raw: bool, iface: str, bpf_filter: str):
+        """
+        Open the capture source.
+
+        Args:
+            backend (str): Either 'scapy' or 'tpacket'.
+            raw (bool): With the scapy backend, queue raw frames instead of packets.
+            iface (str): The interface to capture on.
+            bpf_filter (str): The BPF filter expression.
+        """
+        self.backend = backend
+        self.raw = raw or backend == 'tpacket'
+        self.iface = iface
+        self.bpf_filter = bpf_filter
+        self.opened_ts = time.time()
+        if backend == 'tpacket':
+            self._source = tpacket_capture.TPacketV3Ring(iface, bpf_filter=bpf_filter)
+        else:
+            self._source = sc.conf.L2listen(iface=iface, filter=bpf_filter)
+        logger.info(f'[packet_collector] Opened {backend} capture session on {iface} with filter "{bpf_filter}"')
+
+    def matches(self, backend: str, raw: bool, iface: str) -> bool:
+        """Return True if the session was opened with the given backend, mode and interface."""
+        return (self.backend, self.raw, self.iface) == (backend, raw or backend == 'tpacket', iface)
+
+    def set_filter(self, bpf_filter: str) -> bool:
+        """
+        Replace the BPF filter of the open capture source.
+
+        On Linux, attaching a filter to the socket atomically replaces the previous one, so no
+        packet is missed and none slips through unfiltered.
+
+        Args:
+            bpf_filter (str): The new filter expression.
+
+        Returns:
+            bool: True if the filter was replaced, False if this source does not support it (the
+            session must then be reopened).
+        """
+        if self.backend == 'tpacket':
+            self._source.set_filter(bpf_filter)
+        elif common.get_os() == 'linux' and hasattr(self._source, 'ins'):
+            from scapy.arch.linux import attach_filter
+            attach_filter(self._source.ins, bpf_filter, self.iface)
+        else:
+            return False
+        self.bpf_filter = bpf_filter
+        logger.info(f'[packet_collector] Updated the capture filter on {self.iface} to "{bpf_filter}"')
+        return True
+
+    def capture(self, duration: float, should_stop) -> int:
+        """
+        Capture packets onto the processing queue for `duration` seconds, or until `should_stop()`.
+
+        Args:
+            duration (float): Seconds to capture before returning.
+            should_stop (callable): Checked at least once per second; returning True ends the capture early.
+
+        Returns:
+            int: The number of packets captured.
+        """
+        deadline = time.time() + duration
+        if self.backend == 'tpacket':
+            return capture_with_tpacket(self._source, deadline, should_stop)
+        if self.raw:
+            return capture_raw_with_scapy(self._source, deadline, should_stop)
+        return capture_with_scapy(self._source, deadline, should_stop)
+
+    def get_kernel_stats(self) -> dict | None:
+        """Return (and reset) the kernel's counters of the TPACKET_V3 ring, or None for other backends."""
+        if self.backend == 'tpacket':
+            return self._source.get_stats()
+        return None
+
+    def close(self):
+        """Close the capture source."""
+        self._source.close()
+        logger.info(f'[packet_collector] Closed capture session on {self.iface}')
 
 
 def start():
@@ -38,36 +249,237 @@ def start():
     Continuously captures network packets from the active interface and adds them to the processing queue.
 
     This function acquires the Inspector's active network interface and IP address under a global lock,
-    then uses Scapy's `sniff` to capture packets in 30-second intervals. The sniffing filter excludes
-    packets to/from the host itself, except for ARP packets which are required for device discovery.
-    Each captured packet is passed to `add_packet_to_queue`. Sniffing stops if the Inspector is no longer running.
+    and captures packets for `CAPTURE_STATS_INTERVAL` seconds with the backend selected by
+    `get_capture_backend()`, then logs the capture rate. The capture session stays open between
+    calls: it is only reopened if the interface or IP address has changed (as detected by
+    `networking.update_network_info`), or after a capture error. The capture filter excludes packets
+    to/from the host itself, except for ARP packets which are required for device discovery, and
+    is restricted to the inspected devices (see `build_capture_filter`); when the set of inspected
+    devices changes, the capture returns early and the new filter is attached to the open session.
+    If the kernel rejects the restricted filter, every device's traffic is captured until the set of
+    inspected devices changes again. Capturing stops if the Inspector is no longer running.
     """
+    global _capture_session, _unfilterable_devices
+
     with global_state.global_state_lock:
         host_active_interface = global_state.host_active_interface
         host_ip_addr = global_state.host_ip_addr
 
-    session_stats = {'count': 0}
-    def add_packet_to_queue(pkt: sc.Packet):
-        session_stats['count'] += 1
-        global_state.packet_queue.put(pkt)
-    # Continuously sniff packets for 30 second intervals (as sniff might crash).
-    # Also, avoid capturing packets to/from the host itself, except ARP, which
-    # we need for discovery.
+    backend = get_capture_backend()
+    raw = common.get_env_bool('RAW_PACKET_QUEUE', False)
+    inspected_devices = get_inspected_devices()
+    if inspected_devices is not None and inspected_devices == _unfilterable_devices:
+        bpf_filter = build_capture_filter(host_ip_addr, None)
+    else:
+        bpf_filter = build_capture_filter(host_ip_addr, inspected_devices)
+
+    if _capture_session is not None and not _capture_session.matches(backend, raw, host_active_interface):
+        logger.info('[packet_collector] Capture settings or network changed; reopening the capture session')
+        close_capture_session()
+
+    try:
+        apply_capture_filter(backend, raw, host_active_interface, bpf_filter, host_ip_addr)
+    except Exception as e:
+        unrestricted_filter = build_capture_filter(host_ip_addr, None)
+        if bpf_filter == unrestricted_filter:
+            raise
+        # The kernel may reject a large filter program; do not retry it until the devices change
+        logger.warning(
+            f'[packet_collector] Could not attach the capture filter for {len(inspected_devices)} inspected devices: {e}; '
+            'capturing all devices until the set of inspected devices changes'
+        )
+        _unfilterable_devices = inspected_devices
+        apply_capture_filter(backend, raw, host_active_interface, unrestricted_filter, host_ip_addr)
+
+    next_poll_ts = [time.time() + INSPECTED_DEVICES_POLL_INTERVAL]
+
+    def should_stop() -> bool:
+        if not common.inspector_is_running():
+            return True
+        with global_state.global_state_lock:
+            if (global_state.host_active_interface, global_state.host_ip_addr) != (host_active_interface, host_ip_addr):
+                return True
+        # Return early to re-attach the filter if devices were (un)inspected
+        if time.time() >= next_poll_ts[0]:
+            next_poll_ts[0] = time.time() + INSPECTED_DEVICES_POLL_INTERVAL
+            return get_inspected_devices() != inspected_devices
+        return False
+
     start_ts = time.time()
-    sc.sniff(
-        prn=add_packet_to_queue,
-        iface=host_active_interface,
-        stop_filter=lambda _: not common.inspector_is_running(),
-        filter=f'(not arp and host not {host_ip_addr}) or arp',
-        timeout=30,
-        store=False
-    )
-
-    # After sniff finishes (either timeout or stop_filter)
+    try:
+        count = _capture_session.capture(CAPTURE_STATS_INTERVAL, should_stop)
+        kernel_stats = _capture_session.get_kernel_stats()
+    except Exception:
+        # Reopen the capture session on the next call
+        close_capture_session()
+        raise
+
+    if not common.inspector_is_running():
+        close_capture_session()
+
+    # The session stays open; only the statistics interval is over
     duration = time.time() - start_ts
-    count = session_stats['count']
+
+    if kernel_stats and kernel_stats['drops']:
+        logger.warning(f"[packet_collector] Kernel dropped {kernel_stats['drops']} packets from the capture ring")
 
     if count > 0:
         packet_per_second = count / duration
         logger.info(f"[packet_collector] Interval complete. Collected {count} packets (~{packet_per_second:.2f} pkt/s)")
-        logger.info(f'[packet_collector] Packet queue size: {global_state.packet_queue.qsize()}')
+        queue_stats = global_state.packet_queue.get_stats()
+        logger.info(f'[packet_collector] Packet queue size: {queue_stats["depth"]}, stats: {queue_stats}')
+        logger.info(f'[packet_collector] Pipeline lag: {packet_processor.get_lag_stats(reset=True)}')
+
+
+def apply_capture_filter(backend: str, raw: bool, iface: str, bpf_filter: str, host_ip_addr: str):
+    """
+    Make sure that a capture session with the given filter is open.
+
+    The filter of an open session is replaced in place if the session supports it; otherwise, or if
+    replacing it fails, the session is reopened with the new filter.
+
+    Args:
+        backend (str): Either 'scapy' or 'tpacket'.
+        raw (bool): With the scapy backend, queue raw frames instead of packets.
+        iface (str): The interface to capture on.
+        bpf_filter (str): The BPF filter expression.
+        host_ip_addr (str): The IP address of the Inspector host.
+
+    Raises:
+        Exception: If the session cannot be opened with the filter.
+    """
+    global _capture_session
+
+    if _capture_session is not None and _capture_session.bpf_filter != bpf_filter:
+        try:
+            filter_updated = _capture_session.set_filter(bpf_filter)
+        except Exception as e:
+            logger.warning(f'[packet_collector] Could not update the capture filter: {e}')
+            filter_updated = False
+        if not filter_updated:
+            close_capture_session()
+
+    if _capture_session is None:
+        _capture_session = open_capture_session(backend, raw, iface, bpf_filter, host_ip_addr)
+
+
+def open_capture_session(backend: str, raw: bool, iface: str, bpf_filter: str, host_ip_addr: str):
+    """
+    Open a capture session: worker processes if `CAPTURE_WORKERS` is set with the tpacket backend,
+    a `CaptureSession` on the collector thread otherwise.
+
+    The workers only pass the frames that need a full dissection on to the packet processor, so a
+    `custom_packet_callback_func`, which must see every packet, requires a single-process session.
+
+    Args:
+        backend (str): Either 'scapy' or 'tpacket'.
+        raw (bool): With the scapy backend, queue raw frames instead of packets.
+        iface (str): The interface to capture on.
+        bpf_filter (str): The BPF filter expression.
+        host_ip_addr (str): The IP address of the Inspector host.
+
+    Returns:
+        CaptureSession or FanoutSession: The open session.
+    """
+    if backend == 'tpacket' and CAPTURE_WORKERS > 0:
+        with global_state.global_state_lock:
+            pkt_callback_func = global_state.custom_packet_callback_func
+        if pkt_callback_func is None:
+            return fanout_capture.FanoutSession(CAPTURE_WORKERS, iface, bpf_filter, host_ip_addr)
+        logger.warning('[packet_collector] CAPTURE_WORKERS is ignored while a custom packet callback is set')
+    return CaptureSession(backend, raw, iface, bpf_filter)
+
+
+def close_capture_session():
+    """
+    Close the long-lived capture session, if any; the next call to `start()` opens a new one.
+    """
+    global _capture_session
+
+    session, _capture_session = _capture_session, None
+    if session is not None:
+        try:
+            session.close()
+        except Exception as e:
+            logger.warning(f'[packet_collector] Error while closing the capture session: {e}')
+
+
+def capture_with_scapy(sock, deadline: float, should_stop) -> int:
+    """
+    Capture packets with Scapy's `sniff` and put each dissected packet on the processing queue.
+
+    Args:
+        sock: The open Scapy listening socket; `sniff` does not close it.
+        deadline (float): Time at which to return.
+        should_stop (callable): Returning True ends the capture early.
+
+    Returns:
+        int: The number of packets captured.
+    """
+    session_stats = {'count': 0}
+    def add_packet_to_queue(pkt: sc.Packet):
+        session_stats['count'] += 1
+        global_state.packet_queue.put(pkt)
+
+    # Sniff in one-second slices so that `should_stop` is checked even when no packet arrives
+    while time.time() < deadline and not should_stop():
+        sc.sniff(
+            prn=add_packet_to_queue,
+            opened_socket=sock,
+            stop_filter=lambda _: not common.inspector_is_running(),
+            timeout=min(1.0, max(deadline - time.time(), 0.01)),
+            store=False
+        )
+    return session_stats['count']
+
+
+def capture_raw_with_scapy(sock, deadline: float, should_stop) -> int:
+    """
+    Capture packets with a Scapy listening socket without dissecting them.
+
+    Every queue item is a `(timestamp, frame_bytes)` tuple. The packet processor dissects a frame
+    with Scapy only if one of its handlers needs it (see `packet_processor.process_raw_frame`).
+
+    Args:
+        sock: The open Scapy listening socket.
+        deadline (float): Time at which to return.
+        should_stop (callable): Returning True ends the capture early.
+
+    Returns:
+        int: The number of packets captured.
+    """
+    count = 0
+    while time.time() < deadline and not should_stop():
+        if not sock.select([sock], 1.0):
+            continue
+        _, frame, ts = sock.recv_raw()
+        if frame is None:
+            continue
+        global_state.packet_queue.put((ts or time.time(), frame))
+        count += 1
+
+    return count
+
+
+def capture_with_tpacket(ring: tpacket_capture.TPacketV3Ring, deadline: float, should_stop) -> int:
+    """
+    Capture packets with the TPACKET_V3 ring and put each block of raw frames on the processing queue.
+
+    Each ring block of `(timestamp, frame_bytes)` tuples is enqueued in one go; the packet
+    processor takes care of dissecting the frames.
+
+    Args:
+        ring (TPacketV3Ring): The open capture ring.
+        deadline (float): Time at which to return.
+        should_stop (callable): Returning True ends the capture early.
+
+    Returns:
+        int: The number of packets captured.
+    """
+    count = 0
+    while time.time() < deadline and not should_stop():
+        for block in ring.read_blocks(timeout=1.0):
+            count += len(block)
+            global_state.packet_queue.put_batch(block)
+
+    return count
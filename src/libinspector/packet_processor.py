@@ -14,12 +14,61 @@ import json
 import threading
 
 from . import global_state
+from . import common
 from .tls_processor import extract_sni
 from . import networking
+from . import header_parser
+from . import dns_parser
+from . import mem_db
+from .flow_accumulator import FlowAccumulator, write_flows_to_db
+from .hostname_map import HostnameMap
+from .dpi_state import FlowDpiTable
 
 
 logger = logging.getLogger(__name__)
 
+# Flows are aggregated in memory and written to `network_flows` every FLOW_FLUSH_INTERVAL
+# seconds, or as soon as FLOW_FLUSH_MAX_SIZE distinct flows are pending.
+FLOW_FLUSH_INTERVAL = common.get_env_int('FLOW_FLUSH_INTERVAL', 2)
+FLOW_FLUSH_MAX_SIZE = common.get_env_int('FLOW_FLUSH_MAX_SIZE', 10000)
+flow_accumulator = FlowAccumulator()
+
+# Seconds between two runs of `update_hostnames_in_flows`
+HOSTNAME_UPDATE_INTERVAL = 120
+
+# The latest hostname of each IP address, so that flows get their hostnames when they are written.
+# `update_hostnames_in_flows` only revisits the flows written since its previous run (from the
+# oldest bucket, `_hostname_sweep_watermark`) whose IP addresses got a new hostname meanwhile.
+hostname_map = HostnameMap(max_entries=common.get_env_int('HOSTNAME_MAP_MAX_SIZE', 65536))
+_hostname_sweep_lock = threading.Lock()
+_hostname_sweep_watermark = None
+
+# Capture-to-processing and capture-to-commit lag, in seconds (see `get_lag_stats`)
+_lag_lock = threading.Lock()
+_lag_stats = {'processing_lag_seconds': 0.0, 'commit_lag_seconds': 0.0, 'max_commit_lag_seconds': 0.0}
+
+# TLS SNI and HTTP User-Agent inspection only runs on the first DPI_MAX_PACKETS_PER_FLOW
+# payload-bearing packets of each TCP flow, and stops once either has been found.
+dpi_table = FlowDpiTable(
+    max_packets_per_flow=common.get_env_int('DPI_MAX_PACKETS_PER_FLOW', 5),
+    max_flows=common.get_env_int('DPI_MAX_FLOWS', 65536),
+    idle_timeout=common.get_env_int('DPI_IDLE_TIMEOUT', 300)
+)
+
+
+def reset_state():
+    """
+    Forget the in-memory state the processor keeps about previous packets, so that the next
+    capture (e.g., another replay into a fresh database) starts from scratch.
+    """
+    global hostname_map, _hostname_sweep_watermark, dpi_table
+
+    flow_accumulator.pop_all()
+    with _hostname_sweep_lock:
+        hostname_map = HostnameMap(max_entries=hostname_map.max_entries)
+        _hostname_sweep_watermark = None
+    dpi_table = FlowDpiTable(dpi_table.max_packets_per_flow, dpi_table.max_flows, dpi_table.idle_timeout)
+
 
 def start(stop_event: threading.Event = None, run_event: threading.Event = None, timeout : int = 0.1):
     """
@@ -28,11 +77,8 @@ def start(stop_event: threading.Event = None, run_event: threading.Event = None,
     if run_event:
         run_event.wait()
 
-    packets_to_process = []
-
     # Drain the queue entirely so we can process in bulk
-    while not global_state.packet_queue.empty():
-        packets_to_process.append(global_state.packet_queue.get(block=False))
+    packets_to_process = global_state.packet_queue.drain()
 
     if not packets_to_process:
         if stop_event:
@@ -41,29 +87,75 @@ def start(stop_event: threading.Event = None, run_event: threading.Event = None,
             time.sleep(timeout)
         return
 
+    # How long the oldest packet of the batch waited between capture and processing
+    first_item = packets_to_process[0]
+    capture_ts = first_item[0] if isinstance(first_item, tuple) else float(first_item.time)
+    with _lag_lock:
+        _lag_stats['processing_lag_seconds'] = max(time.time() - capture_ts, 0.0)
+
     # Process the batch
-    for pkt in packets_to_process:
+    for item in packets_to_process:
         if stop_event and stop_event.is_set():
             break
-        process_packet_helper(pkt)
+        if isinstance(item, tuple):
+            # A raw (timestamp, frame) tuple from the tpacket backend or the raw-queue mode
+            process_raw_frame(*item)
+        else:
+            process_packet_helper(item)
 
     packets_to_process.clear()
 
 
-def process_packet_helper(pkt: sc.Packet):
+def process_raw_frame(ts: float, frame: bytes):
+    """
+    Process a raw Ethernet frame, dissecting it with Scapy only if a handler actually needs it.
+
+    Most frames only feed the `network_flows` counters, which need nothing but a handful of
+    header fields; those are decoded by `header_parser` without touching Scapy. The frame is
+    turned into a full Scapy packet (and handed to `process_packet_helper`) only if it is ARP,
+    DHCP, DNS, a TLS ClientHello or an HTTP request on a flow that `dpi_table` has not marked
+    done, if it cannot be parsed by the fast path, or if a `custom_packet_callback_func` is set.
+
+    Args:
+        ts (float): The capture timestamp of the frame.
+        frame (bytes): The raw Ethernet frame.
+    """
+    with global_state.global_state_lock:
+        pkt_callback_func = global_state.custom_packet_callback_func
+
+    header = header_parser.parse_frame(frame)
+
+    if pkt_callback_func is None:
+        verdict = header_parser.classify_frame(header, frame)
+        if verdict == header_parser.FRAME_IGNORE:
+            return
+        if verdict == header_parser.FRAME_FLOW or is_dpi_done(header):
+            process_flow_header(header, len(frame), ts)
+            return
+
+    pkt = sc.Ether(frame)
+    pkt.time = ts
+    process_packet_helper(pkt, header)
+
+
+def process_packet_helper(pkt: sc.Packet, header: header_parser.FrameHeader | None = None):
     """
     Process a captured network packet and dispatch it to the appropriate handler.
 
     This function first checks for a custom packet callback and executes it if present, logging any exceptions.
-    It then determines the packet type and processes it accordingly:
+    It then decodes the packet's headers from its original bytes with the fast-path `header_parser`;
+    packets that merely count towards a TCP/UDP flow are handed to `process_flow_header` right away, and
+    packets no handler is interested in are dropped. Everything else is processed with Scapy:
     - ARP and DHCP packets are handled by their respective functions and processing stops.
     - Packets without both Ethernet and IP layers are ignored.
     - Packets involving the Inspector host's own IP address are ignored.
     - DNS packets are processed and then terminated.
-    - For all other packets, the function attempts to extract TLS SNI information and then processes the packet as a network flow.
+    - For all other packets, the function attempts to extract TLS SNI and HTTP User-Agent information (only on the
+      first payload-bearing packets of each TCP flow; see `dpi_table`) and then processes the packet as a network flow.
 
     Args:
         pkt: The network packet (scapy packet) to process.
+        header (FrameHeader, optional): The packet's already decoded headers, if available.
 
     Returns:
         None, or the result of the specific packet handler if applicable.
@@ -77,6 +169,22 @@ def process_packet_helper(pkt: sc.Packet):
         except Exception as e:
             logger.error(f'[Pkt Processor] Custom packet callback function raised an error: {e} for packet: {pkt}\n{traceback.format_exc()}')
 
+    # ====================
+    # Fast path: decide from the raw headers, without walking Scapy's layers
+    # ====================
+    frame = getattr(pkt, 'original', None)
+    if frame:
+        if header is None:
+            header = header_parser.parse_frame(frame)
+        verdict = header_parser.classify_frame(header, frame)
+        if verdict == header_parser.FRAME_IGNORE:
+            return
+        if verdict == header_parser.FRAME_FLOW or is_dpi_done(header):
+            process_flow_header(header, len(frame), float(pkt.time))
+            return
+    else:
+        header = None
+
     # ====================
     # Process individual packets and terminate
     # ====================
@@ -98,18 +206,62 @@ def process_packet_helper(pkt: sc.Packet):
 
     # DNS
     if sc.DNS in pkt:
-        process_dns(pkt)
+        process_dns(pkt, header)
         return
 
     # ====================
     # Process flows and their first packets
     # ====================
 
-    process_client_hello(pkt)
-    process_http_user_agent(pkt)
+    dpi_flow_key = get_dpi_flow_key(pkt, header)
+    if dpi_flow_key is not None and dpi_table.should_inspect(dpi_flow_key):
+        found = process_client_hello(pkt) or process_http_user_agent(pkt)
+        dpi_table.record_result(dpi_flow_key, found)
 
     # Process flow
-    process_flow(pkt)
+    if header is not None and header.protocol is not None:
+        process_flow_header(header, len(frame), float(pkt.time))
+    else:
+        process_flow(pkt)
+
+
+def get_dpi_flow_key(pkt: sc.Packet, header: header_parser.FrameHeader | None = None) -> tuple | None:
+    """
+    Return the 5-tuple under which a packet's deep inspection state is kept in `dpi_table`.
+
+    Only payload-bearing TCP packets can carry a TLS ClientHello or an HTTP request.
+
+    Args:
+        pkt: The network packet (scapy packet).
+        header (FrameHeader, optional): The packet's already decoded headers, if available.
+
+    Returns:
+        tuple or None: `(src_ip, src_port, dst_ip, dst_port, 'tcp')`, or None if the packet is not
+        a TCP packet with a payload.
+    """
+    if header is not None and header.protocol is not None:
+        if header.protocol != 'tcp' or header.payload_len == 0:
+            return None
+        return (header.src_ip, header.src_port, header.dst_ip, header.dst_port, 'tcp')
+
+    if sc.TCP not in pkt or len(pkt[sc.TCP].payload) == 0:
+        return None
+    return (pkt[sc.IP].src, pkt[sc.TCP].sport, pkt[sc.IP].dst, pkt[sc.TCP].dport, 'tcp')
+
+
+def is_dpi_done(header: header_parser.FrameHeader | None) -> bool:
+    """
+    Check whether a packet belongs to a TCP flow whose deep inspection has already finished.
+
+    Args:
+        header (FrameHeader or None): The packet's decoded headers.
+
+    Returns:
+        bool: True if the packet is a payload-bearing TCP packet of a flow that `dpi_table` marked done.
+    """
+    if header is None or header.protocol != 'tcp' or header.payload_len == 0:
+        return False
+    return dpi_table.is_done((header.src_ip, header.src_port, header.dst_ip, header.dst_port, 'tcp'))
 
 
 def process_arp(pkt: sc.Packet):
@@ -119,8 +271,8 @@ def process_arp(pkt: sc.Packet):
     This function handles ARP request and reply packets, ignoring those sent by the Inspector
     host or with a source IP of 0.0.0.0. It determines if the ARP entry corresponds to the
     network gateway and updates or inserts the device's MAC and IP address in the `devices` table,
-    along with a timestamp and gateway status. Afterward, it updates the device's metadata
-    with the OUI vendor if not already present.
+    along with the capture timestamp and gateway status. Afterward, it records the device's OUI
+    vendor in `device_attributes` if not already present.
 
     Args:
         pkt: The ARP packet (scapy packet) to process.
@@ -145,7 +297,7 @@ def process_arp(pkt: sc.Packet):
             is_gateway = 0
 
     # Insert or update the ip_addr and mac_addr in the devices table
-    current_ts = int(time.time())
+    current_ts = int(pkt.time)
     conn, rw_lock = global_state.db_conn_and_lock
     with rw_lock:
         conn.execute('''
@@ -157,18 +309,20 @@ def process_arp(pkt: sc.Packet):
                 is_gateway=excluded.is_gateway
         ''', (mac_addr, ip_addr, current_ts, is_gateway))
 
-        # Update the OUI vendors
+        # Resolve the OUI vendor once, when the MAC address is first seen; afterwards, this is a
+        # primary key lookup that does not call get_oui_vendor
         conn.execute('''
-            UPDATE devices
-            SET metadata_json = json_patch(
-                metadata_json,
-                json_object('oui_vendor', get_oui_vendor(mac_address))
+            INSERT INTO device_attributes (mac_address, source, key, value, updated_ts)
+            SELECT ?, 'oui', 'oui_vendor', get_oui_vendor(?), ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM device_attributes WHERE mac_address = ? AND source = 'oui' AND key = 'oui_vendor'
             )
-            WHERE json_extract(metadata_json, '$.oui_vendor') IS NULL
-        ''')
+        ''', (mac_addr, mac_addr, current_ts, mac_addr))
+
+    networking.update_ip_mac_mapping(ip_addr, mac_addr)
 
 
-def process_dns(pkt: sc.Packet):
+def process_dns(pkt: sc.Packet, header: header_parser.FrameHeader | None = None):
     """
     Process a DNS packet to extract the querying device, hostname, and associated IP addresses.
 
@@ -177,11 +331,15 @@ def process_dns(pkt: sc.Packet):
     from the DNS question section, removing any trailing dot. If the packet contains DNS answers,
     it collects all IPv4 addresses from A records.
 
+    The DNS message is decoded from its raw bytes by `dns_parser` in one pass; Scapy's DNS layers
+    are only used if the raw message is malformed.
+
     If no IP addresses are found, an empty string is used. The extracted device MAC address,
     hostname, and set of IP addresses are then recorded in the database for tracking DNS activity.
 
     Args:
         pkt: The network packet (scapy packet) containing the DNS data.
+        header (FrameHeader, optional): The packet's already decoded headers, if available.
     """
     src_mac_addr = pkt[sc.Ether].src
     dst_mac_addr = pkt[sc.Ether].dst
@@ -206,14 +364,72 @@ def process_dns(pkt: sc.Packet):
     if device_mac_addr == gateway_mac_addr:
         return
 
+    # Parse the hostname and the IP addresses in A records
+    dns_message = dns_parser.parse_dns_message(get_dns_payload(pkt, header))
+    if dns_message is not None:
+        hostname = dns_message.qname
+        ip_set = {ip for ip, _ in dns_message.a_records}
+    else:
+        hostname, ip_set = parse_dns_with_scapy(pkt)
+
+    if not hostname:
+        return
+
+    # If we don't have an IP address, that's fine. We'll still store the domain queried, setting the IP address to empty.
+    if not ip_set:
+        ip_set.add('')
+
+    write_hostname_ip_mapping_to_db(device_mac_addr, hostname, ip_set, 'dns', float(pkt.time))
+
+
+def get_dns_payload(pkt: sc.Packet, header: header_parser.FrameHeader | None = None) -> bytes:
+    """
+    Return the raw DNS message carried by a UDP or TCP packet.
+
+    Args:
+        pkt: The network packet (scapy packet) containing the DNS data.
+        header (FrameHeader, optional): The packet's already decoded headers, if available; the
+            message is then sliced out of the packet's original bytes.
+
+    Returns:
+        bytes: The DNS message, without the 2-byte length prefix used over TCP.
+    """
+    if header is not None and header.protocol is not None:
+        payload = pkt.original[header.payload_offset:header.payload_offset + header.payload_len]
+        is_tcp = header.protocol == 'tcp'
+    elif sc.UDP in pkt:
+        payload = bytes(pkt[sc.UDP].payload)
+        is_tcp = False
+    elif sc.TCP in pkt:
+        payload = bytes(pkt[sc.TCP].payload)
+        is_tcp = True
+    else:
+        return b''
+
+    return payload[2:] if is_tcp else payload
+
+
+def parse_dns_with_scapy(pkt: sc.Packet) -> tuple[str | None, set[str]]:
+    """
+    Extract the queried hostname and the IPv4 addresses in A records with Scapy's DNS layers.
+
+    This is the fallback for DNS messages that `dns_parser` cannot decode.
+
+    Args:
+        pkt: The network packet (scapy packet) containing the DNS data.
+
+    Returns:
+        tuple: The lowercased hostname without trailing dot (None if it cannot be parsed), and the
+        set of IPv4 addresses.
+    """
     # Parse hostname
     try:
         hostname = pkt[sc.DNSQR].qname.decode('utf-8').lower()
     except Exception:
-        return
+        return None, set()
 
     # Remove trailing dot from hostname
-    if hostname[-1] == '.':
+    if hostname.endswith('.'):
         hostname = hostname[0:-1]
 
     # Parse DNS response to extract IP addresses in A records
@@ -230,19 +446,16 @@ def process_dns(pkt: sc.Packet):
             except IndexError:
                 pass
 
-    # If we don't have an IP address, that's fine. We'll still store the domain queried, setting the IP address to empty.
-    if not ip_set:
-        ip_set.add('')
+    return hostname, ip_set
 
-    write_hostname_ip_mapping_to_db(device_mac_addr, hostname, ip_set, 'dns')
 
-
-def write_hostname_ip_mapping_to_db(device_mac_addr: str, hostname: str, ip_set: set[str], data_source: str):
+def write_hostname_ip_mapping_to_db(device_mac_addr: str, hostname: str, ip_set: set[str], data_source: str,
+                                    capture_ts: float | None = None):
     """
     Insert or update hostname-to-IP mappings in the `hostnames` table and log the operation.
 
     This code iterates over a set of IP addresses and, for each, inserts a new record or updates
-    an existing one in the `hostnames` database table with the provided hostname, current timestamp,
+    an existing one in the `hostnames` database table with the provided hostname, timestamp,
     and data source. The operation is performed within a write lock to ensure thread safety.
     After updating the database, it logs the mapping of the device's MAC address, hostname,
     and associated IP addresses for traceability.
@@ -252,8 +465,10 @@ def write_hostname_ip_mapping_to_db(device_mac_addr: str, hostname: str, ip_set:
         hostname (str): The hostname to map to each IP address.
         data_source (str): The source of the hostname information.
         device_mac_addr (str): The MAC address of the device (used for logging).
+        capture_ts (float, optional): Capture timestamp of the packet the mapping was seen in;
+            defaults to the current time.
     """
-    current_ts = int(time.time())
+    current_ts = int(time.time() if capture_ts is None else capture_ts)
 
     conn, rw_lock = global_state.db_conn_and_lock
 
@@ -268,6 +483,9 @@ def write_hostname_ip_mapping_to_db(device_mac_addr: str, hostname: str, ip_set:
                     data_source=excluded.data_source
             ''', (ip_addr, hostname, current_ts, data_source))
 
+    # After the database, so that the hostname sweep finds the new mappings in `hostnames`
+    hostname_map.update(ip_set, hostname)
+
     logger.info(f'[Pkt Processor] Device {device_mac_addr}: {hostname} -> {ip_set} (data_source: {data_source})')
 
 
@@ -279,12 +497,11 @@ def process_flow(pkt: sc.Packet):
     It extracts relevant flow details such as source and destination MAC addresses, IP addresses,
     ports, and the TCP sequence number (if applicable). The function ensures the packet is not a
     broadcast and that the Inspector host is involved in the communication, updating MAC addresses
-    as needed to reflect the actual device or gateway. It then inserts or updates a record in
-    the `network_flows` database table, incrementing byte and packet counts and updating TCP sequence
-    number metadata.
+    as needed to reflect the actual device or gateway. It then adds the packet to the in-memory flow
+    aggregates, which `flush_flows` periodically writes to the `network_flows` database table,
+    incrementing byte and packet counts and updating TCP sequence number metadata.
 
-    After updating the flow, it triggers a refresh of hostnames in the flow records to ensure
-    the most current hostname information is associated with each flow.
+    The flow's hostnames are filled in from `hostname_map` when the flow is written.
 
     Args:
         pkt: The network packet (scapy packet) to process.
@@ -313,102 +530,256 @@ def process_flow(pkt: sc.Packet):
     else:
         tcp_seq = 0
 
+    record_flow(
+        src_mac_addr, dst_mac_addr, src_ip_addr, dst_ip_addr,
+        src_port, dst_port, protocol, len(pkt), tcp_seq, float(pkt.time)
+    )
+
+
+def process_flow_header(header: header_parser.FrameHeader, byte_count: int, capture_ts: float):
+    """
+    Process a TCP or UDP packet, given its fast-path decoded headers, as a network flow.
+
+    This is the Scapy-free equivalent of `process_flow`. Packets to or from the Inspector host's
+    own IP address are ignored.
+
+    Args:
+        header (FrameHeader): The packet's decoded Ethernet/IPv4/TCP/UDP headers.
+        byte_count (int): Length of the packet in bytes.
+        capture_ts (float): The capture timestamp of the packet.
+    """
+    if global_state.host_ip_addr in (header.src_ip, header.dst_ip):
+        return
+
+    record_flow(
+        header.src_mac, header.dst_mac, header.src_ip, header.dst_ip,
+        header.src_port, header.dst_port, header.protocol, byte_count, header.tcp_seq, capture_ts
+    )
+
+
+def record_flow(
+        src_mac_addr: str, dst_mac_addr: str, src_ip_addr: str, dst_ip_addr: str,
+        src_port: int, dst_port: int, protocol: str, byte_count: int, tcp_seq: int, capture_ts: float
+):
+    """
+    Attribute a TCP or UDP packet to a device and upsert it into the `network_flows` table.
+
+    The packet must not be a broadcast, and the Inspector host must be one of its two endpoints
+    at the Ethernet level. The Inspector host's MAC address is replaced with the MAC address of
+    the device it impersonates (looked up from the corresponding IP address). The packet is added
+    to the in-memory `flow_accumulator` under the time bucket of its capture timestamp
+    (not of the time it is processed, which lags behind when the packet queue backs up); see
+    `flush_flows`.
+
+    Args:
+        src_mac_addr (str): Source MAC address.
+        dst_mac_addr (str): Destination MAC address.
+        src_ip_addr (str): Source IP address.
+        dst_ip_addr (str): Destination IP address.
+        src_port (int): Source port.
+        dst_port (int): Destination port.
+        protocol (str): Either 'tcp' or 'udp'.
+        byte_count (int): Length of the packet in bytes.
+        tcp_seq (int): The TCP sequence number, or 0 for UDP.
+        capture_ts (float): The capture timestamp of the packet.
+    """
+    mac_addrs = attribute_flow(src_mac_addr, dst_mac_addr, src_ip_addr, dst_ip_addr)
+    if mac_addrs is None:
+        return
+
+    # Aggregate the flow in memory; `flush_flows` writes it to the `network_flows` table
+    flow_key = (
+        get_flow_bucket(capture_ts), mac_addrs[0], mac_addrs[1], src_ip_addr, dst_ip_addr,
+        src_port, dst_port, protocol
+    )
+    if flow_accumulator.add(flow_key, byte_count, tcp_seq) >= FLOW_FLUSH_MAX_SIZE:
+        flush_flows()
+
+
+def get_flow_bucket(capture_ts: float) -> int:
+    """
+    Return the start of the `network_flows` time bucket (`FLOW_BUCKET_SECONDS` wide) of a timestamp.
+    """
+    return int(capture_ts) // mem_db.FLOW_BUCKET_SECONDS * mem_db.FLOW_BUCKET_SECONDS
+
+
+def attribute_flow(src_mac_addr: str, dst_mac_addr: str, src_ip_addr: str, dst_ip_addr: str) -> tuple[str, str] | None:
+    """
+    Return the MAC addresses under which a packet is recorded in `network_flows`.
+
+    Broadcasts, and packets that did not go through the Inspector host at the Ethernet level, are
+    not recorded. The Inspector host's MAC address is replaced with the MAC address of the device
+    it impersonates, looked up from the corresponding IP address; if this is not a local
+    communication, Inspector is assumed to pretend to be the gateway.
+
+    Args:
+        src_mac_addr (str): Source MAC address.
+        dst_mac_addr (str): Destination MAC address.
+        src_ip_addr (str): Source IP address.
+        dst_ip_addr (str): Destination IP address.
+
+    Returns:
+        tuple or None: The `(src_mac_addr, dst_mac_addr)` to record, or None if the packet is not recorded.
+    """
     # No broadcast
     if dst_mac_addr == 'ff:ff:ff:ff:ff:ff' or dst_ip_addr == '255.255.255.255':
-        return
+        return None
 
     with global_state.global_state_lock:
         inspector_host_mac_addr = global_state.host_mac_addr
 
-    # Find the actual MAC address that the Inspector host pretends to be if this
-    # is a local communication; otherwise, assume that Inspector pretends to be
-    # the gateway.
-    if src_mac_addr == inspector_host_mac_addr:
-        try:
-            src_mac_addr = networking.get_mac_address_from_ip(src_ip_addr)
-        except KeyError:
-            return
-    elif dst_mac_addr == inspector_host_mac_addr:
-        try:
-            dst_mac_addr = networking.get_mac_address_from_ip(dst_ip_addr)
-        except KeyError:
-            return
-    else:
+    try:
+        if src_mac_addr == inspector_host_mac_addr:
+            return networking.get_mac_address_from_ip(src_ip_addr), dst_mac_addr
+        if dst_mac_addr == inspector_host_mac_addr:
+            return src_mac_addr, networking.get_mac_address_from_ip(dst_ip_addr)
+    except KeyError:
+        pass
+    return None
+
+
+def record_flow_aggregates(flows: dict) -> int:
+    """
+    Attribute flows that were aggregated elsewhere (by the capture workers of `fanout_capture`)
+    and add them to the in-memory `flow_accumulator`.
+
+    The MAC addresses are attributed once per aggregated flow rather than once per packet, exactly
+    as `record_flow` would have attributed each of the flow's packets.
+
+    Args:
+        flows (dict): Maps `(timestamp, src_mac_addr, dst_mac_addr, src_ip_addr, dst_ip_addr,
+            src_port, dst_port, protocol)` keys, with the MAC addresses as seen on the wire, to
+            `[byte_count, packet_count, tcp_seq_min, tcp_seq_max]`.
+
+    Returns:
+        int: The number of packets that were attributed to a device.
+    """
+    packet_count = 0
+    pending_flow_count = 0
+    for (timestamp, src_mac_addr, dst_mac_addr, src_ip_addr, dst_ip_addr, src_port, dst_port, protocol), counters in flows.items():
+        mac_addrs = attribute_flow(src_mac_addr, dst_mac_addr, src_ip_addr, dst_ip_addr)
+        if mac_addrs is None:
+            continue
+        flow_key = (
+            timestamp, mac_addrs[0], mac_addrs[1], src_ip_addr, dst_ip_addr,
+            src_port, dst_port, protocol
+        )
+        pending_flow_count = flow_accumulator.merge(flow_key, counters)
+        packet_count += counters[1]
+
+    if pending_flow_count >= FLOW_FLUSH_MAX_SIZE:
+        flush_flows()
+    return packet_count
+
+
+def flush_flows():
+    """
+    Write all flows aggregated in memory to the `network_flows` table.
+
+    Runs periodically in its own thread (every `FLOW_FLUSH_INTERVAL` seconds), and inline from
+    the packet processor whenever more than `FLOW_FLUSH_MAX_SIZE` distinct flows are pending.
+    All rows are upserted with a single `executemany` in one transaction, so the database write
+    lock is taken once per flush rather than once per packet. The source and destination
+    hostnames are looked up in `hostname_map`. If the write fails, the flows are merged back into
+    `flow_accumulator` for the next flush, and the error is raised.
+    """
+    global _hostname_sweep_watermark
+
+    flows = flow_accumulator.pop_all()
+    if not flows:
         return
 
-    # Upsert the flow into the `network_flows` table in the database
     conn, rw_lock = global_state.db_conn_and_lock
-    current_ts = int(time.time())
-    with rw_lock:
-        conn.execute('''
-            INSERT INTO network_flows (
-                timestamp, src_ip_address, dest_ip_address, src_mac_address, dest_mac_address,
-                src_port, dest_port, protocol, byte_count, packet_count, metadata_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, json_object('tcp_seq_min', ?, 'tcp_seq_max', ?))
-            ON CONFLICT (
-                timestamp, src_mac_address, dest_mac_address, src_ip_address, dest_ip_address,
-                src_port, dest_port, protocol
-            ) DO UPDATE SET
-                byte_count = byte_count + excluded.byte_count,
-                packet_count = packet_count + excluded.packet_count,
-                metadata_json = json_patch(
-                    metadata_json,
-                    json_object(
-                        'tcp_seq_min', MIN(json_extract(metadata_json, '$.tcp_seq_min'), excluded.metadata_json->>'$.tcp_seq_min'),
-                        'tcp_seq_max', MAX(json_extract(metadata_json, '$.tcp_seq_max'), excluded.metadata_json->>'$.tcp_seq_max')
-                    )
-                )
-        ''', (
-            current_ts, src_ip_addr, dst_ip_addr, src_mac_addr, dst_mac_addr,
-            src_port, dst_port, protocol, len(pkt), 1, tcp_seq, tcp_seq
-        ))
-
-
-def update_hostnames_in_flows():
-    """
-    Update the `network_flows` table by replacing IP addresses with
-    corresponding hostnames from the `hostnames` table.
-
-    It acquires a database lock and executes an SQL statement to update the `src_hostname` and
-    `dest_hostname` fields in the `network_flows` table. The update is performed only for flows
-    where either the source or destination hostname is missing and a matching IP-to-hostname mapping
-    exists in the `hostnames` table.
-
-    After the update, the function records the current timestamp and logs the number of rows affected.
-    This ensures that the flow records reflect the most recent hostname information for easier analysis
-    and tracking.
+    oldest_ts = min(flow_key[0] for flow_key in flows)
+    with _hostname_sweep_lock:
+        ip_addrs = {flow_key[3] for flow_key in flows}
+        ip_addrs.update(flow_key[4] for flow_key in flows)
+        try:
+            row_count = write_flows_to_db(conn, rw_lock, flows, hostname_map.get_hostnames(ip_addrs))
+        except Exception:
+            # The write was rolled back; keep the flows for the next flush
+            for flow_key, counters in flows.items():
+                flow_accumulator.merge(flow_key, counters)
+            raise
+        if _hostname_sweep_watermark is None or oldest_ts < _hostname_sweep_watermark:
+            _hostname_sweep_watermark = oldest_ts
+
+    # Age of the oldest flushed bucket, now that its rows are committed
+    commit_lag = max(time.time() - oldest_ts, 0.0)
+    with _lag_lock:
+        _lag_stats['commit_lag_seconds'] = commit_lag
+        _lag_stats['max_commit_lag_seconds'] = max(_lag_stats['max_commit_lag_seconds'], commit_lag)
+
+    logger.debug(f'[Pkt Processor] Flushed {row_count} flow rows to network_flows (commit lag {commit_lag:.1f} s).')
+
+
+def get_lag_stats(reset: bool = False) -> dict:
+    """
+    Return how far the processing pipeline lags behind the capture.
+
+    All rows are stamped with capture timestamps, so a growing lag does not distort the flow
+    buckets; it means that the packet queue is backing up and that readers see the rows late.
+
+    Args:
+        reset (bool, optional): Reset `max_commit_lag_seconds` after reading it. Defaults to False.
+
+    Returns:
+        dict: `processing_lag_seconds`, the time the oldest packet of the latest batch spent
+        between capture and processing; `commit_lag_seconds`, the time between the start of the
+        oldest time bucket of the latest flow flush and its commit to `network_flows`; and
+        `max_commit_lag_seconds`, the largest commit lag since the last reset.
+    """
+    with _lag_lock:
+        stats = {name: round(value, 3) for name, value in _lag_stats.items()}
+        if reset:
+            _lag_stats['max_commit_lag_seconds'] = 0.0
+    return stats
+
+
+def update_hostnames_in_flows() -> int:
+    """
+    Fill in the hostnames of the flows that were written before their IP addresses got a hostname.
+
+    Flows get their hostnames from `hostname_map` when they are written, so only the IP
+    addresses whose hostname changed since the previous run need a second look, and only in the
+    rows written since then (from the oldest bucket flushed since the previous run). Their
+    `src_hostname` and `dest_hostname` are set from the `hostnames` table; rows written before
+    the previous run keep their hostnames. Runs periodically in its own thread.
+
+    Returns:
+        int: The number of rows updated.
     """
+    global _hostname_sweep_watermark
+
+    # Flows flushed from now on are looked up after these changes
+    with _hostname_sweep_lock:
+        changed_ip_addrs = hostname_map.pop_changed()
+        watermark_ts, _hostname_sweep_watermark = _hostname_sweep_watermark, None
+
+    if not changed_ip_addrs or watermark_ts is None:
+        return 0
+
     conn, rw_lock = global_state.db_conn_and_lock
-    row_count = 0
+    ip_addrs_json = json.dumps(sorted(changed_ip_addrs))
     with rw_lock:
-        sql = '''
+        row_count = conn.execute('''
             UPDATE network_flows
-            SET src_hostname = (
-                SELECT hostnames.hostname
-                FROM hostnames
-                WHERE hostnames.ip_address = network_flows.src_ip_address
+            SET src_hostname = COALESCE(
+                (SELECT hostname FROM hostnames WHERE hostnames.ip_address = network_flows.src_ip_address),
+                src_hostname
             ),
-            dest_hostname = (
-                SELECT hostnames.hostname
-                FROM hostnames
-                WHERE hostnames.ip_address = network_flows.dest_ip_address
+            dest_hostname = COALESCE(
+                (SELECT hostname FROM hostnames WHERE hostnames.ip_address = network_flows.dest_ip_address),
+                dest_hostname
+            )
+            WHERE timestamp >= ? AND (
+                src_ip_address IN (SELECT value FROM json_each(?)) OR
+                dest_ip_address IN (SELECT value FROM json_each(?))
             )
-            WHERE EXISTS (
-                SELECT 1
-                FROM hostnames
-                WHERE
-                    (
-                        hostnames.ip_address = network_flows.src_ip_address OR
-                        hostnames.ip_address = network_flows.dest_ip_address
-                    ) AND (
-                        network_flows.src_hostname IS NULL OR
-                        network_flows.dest_hostname IS NULL
-                    )
-            );
-        '''
-        row_count = conn.execute(sql).rowcount
-
-    logger.info(f'[Pkt Processor] Updated {row_count} rows in network_flows with hostnames.')
+        ''', (watermark_ts, ip_addrs_json, ip_addrs_json)).rowcount
+
+    logger.info(f'[Pkt Processor] Updated {row_count} rows in network_flows with the hostnames of {len(changed_ip_addrs)} IP addresses.')
+    return row_count
 
 
 def process_dhcp(pkt: sc.Packet):
@@ -452,17 +823,24 @@ def process_dhcp(pkt: sc.Packet):
     if device_mac == global_state.host_mac_addr:
         return
 
-    # Update the devices table
-    device_metadata_dict = {'dhcp_hostname': device_hostname}
+    # Update the devices and device_attributes tables
     conn, rw_lock = global_state.db_conn_and_lock
     with rw_lock:
         conn.execute('''
-            INSERT INTO devices (mac_address, ip_address, metadata_json)
-            VALUES (?, ?, ?)
+            INSERT INTO devices (mac_address, ip_address)
+            VALUES (?, ?)
             ON CONFLICT(mac_address) DO UPDATE SET
-                metadata_json = json_patch(devices.metadata_json, excluded.metadata_json),
                 ip_address = excluded.ip_address
-        ''', (device_mac, device_ip, json.dumps(device_metadata_dict)))
+        ''', (device_mac, device_ip))
+        conn.execute('''
+            INSERT INTO device_attributes (mac_address, source, key, value, updated_ts)
+            VALUES (?, 'dhcp', 'dhcp_hostname', ?, ?)
+            ON CONFLICT DO UPDATE SET
+                value = excluded.value,
+                updated_ts = excluded.updated_ts
+        ''', (device_mac, device_hostname, int(pkt.time)))
+
+    networking.update_ip_mac_mapping(device_ip, device_mac)
 
     logger.info(f'[Pkt Processor] DHCP: Device {device_mac}: {device_hostname}')
 
@@ -482,57 +860,64 @@ def process_client_hello(pkt: sc.Packet):
 
     Args:
         pkt: The network packet (scapy packet) to process.
+
+    Returns:
+        bool: True if an SNI was found, False otherwise.
     """
     # Make sure that the Inspector host should be the destination of this packet
     with global_state.global_state_lock:
         if pkt[sc.Ether].dst != global_state.host_mac_addr:
-            return
+            return False
 
     sni = extract_sni(pkt)
     if not sni:
-        return
+        return False
 
     sni = sni.lower()
     device_mac_addr = pkt[sc.Ether].src
     remote_ip_addr = pkt[sc.IP].dst
 
-    write_hostname_ip_mapping_to_db(device_mac_addr, sni, {remote_ip_addr}, 'sni')
+    write_hostname_ip_mapping_to_db(device_mac_addr, sni, {remote_ip_addr}, 'sni', float(pkt.time))
+    return True
 
 
 def process_http_user_agent(pkt: sc.Packet):
     """
-    Extract the User-Agent header from an HTTP packet and update the devices' metadata.
+    Extract the User-Agent header from an HTTP packet and record it as a device attribute.
 
     This function looks for TCP packets on standard HTTP ports (80, 8080)
     containing an HTTP request payload. It extracts the 'User-Agent' string
-    and updates the corresponding device's metadata_json field in the database
-    with the 'user_agent_info'.
+    and records it as the corresponding device's 'user_agent_info' attribute in the
+    `device_attributes` table.
 
     Args:
         pkt: The network packet (scapy packet) to process.
+
+    Returns:
+        bool: True if a User-Agent was found, False otherwise.
     """
     # Check for TCP layer on standard HTTP ports
     if sc.TCP not in pkt or pkt[sc.TCP].dport not in [80, 8080]:
-        return
+        return False
 
     # Check for Raw layer (where HTTP payload resides)
     if sc.Raw not in pkt:
-        return
+        return False
 
     # Extract HTTP payload and attempt to decode
     try:
         payload = pkt[sc.Raw].load.decode('utf-8')
     except Exception:
-        return
+        return False
 
     # Check if this is an HTTP GET/POST request (only requests contain User-Agent)
     if not payload.startswith(('GET ', 'POST ')):
-        return
+        return False
 
     # Look for the User-Agent header
     user_agent_start_tag = 'User-Agent: '
     if user_agent_start_tag not in payload:
-        return
+        return False
 
     user_agent_str = ''
     try:
@@ -543,26 +928,28 @@ def process_http_user_agent(pkt: sc.Packet):
                 user_agent_str = line[len(user_agent_start_tag):].strip()
                 break
     except Exception:
-        return
+        return False
 
     if len(user_agent_str) == 0:
-        return
+        return False
 
     device_mac = pkt[sc.Ether].src
 
-    # If the user-agent is found, update the devices table
+    # If the user-agent is found, update the device_attributes table (for known devices only)
     conn, rw_lock = global_state.db_conn_and_lock
 
     with rw_lock:
         try:
             conn.execute('''
-                     UPDATE devices
-                     SET metadata_json = json_patch(
-                             metadata_json,
-                             json_object('user_agent_info', ?))
-                     WHERE mac_address = ?
-                     ''', (user_agent_str, device_mac))
+                INSERT INTO device_attributes (mac_address, source, key, value, updated_ts)
+                SELECT mac_address, 'http', 'user_agent_info', ?, ? FROM devices WHERE mac_address = ?
+                ON CONFLICT DO UPDATE SET
+                    value = excluded.value,
+                    updated_ts = excluded.updated_ts
+            ''', (user_agent_str, int(pkt.time), device_mac))
 
             logger.info(f'[Pkt Processor] HTTP: Device {device_mac} User-Agent: {user_agent_str}')
         except Exception as e:
             logger.error(f'[Pkt Processor] Failed to update UA for {device_mac}: {e}')
+
+    return True
@@ -0,0 +1,229 @@
+"""
+Bounded Packet Queue with Drop Policies.
+
+This module provides the queue that sits between the packet collector and the packet processor.
+Unlike `queue.Queue()`, it has a maximum depth: when the processor falls behind (e.g., while it
+waits for the database lock), the collector keeps running and the queue sheds packets according
+to a configurable overflow policy instead of growing without limit.
+
+Overflow Policies:
+- `drop_newest`: Discard the packet that is being enqueued.
+- `drop_oldest`: Discard the oldest queued packet to make room for the new one.
+- `drop_bulk_first`: Keep ARP, DHCP and DNS packets (which drive device discovery and hostname
+  resolution) and discard bulk flow packets first: an incoming bulk packet is discarded, and an
+  incoming ARP/DHCP/DNS packet evicts the oldest queued bulk packet.
+
+Every drop is counted by reason; `get_stats()` returns the counters so that hosts can be sized
+from data rather than guesswork.
+
+Queue items are either Scapy packets or raw `(timestamp, frame_bytes)` tuples.
+"""
+import collections
+import heapq
+import itertools
+import threading
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+DROP_BULK_FIRST = 'drop_bulk_first'
+
+DROP_POLICIES = (DROP_NEWEST, DROP_OLDEST, DROP_BULK_FIRST)
+
+DEFAULT_MAX_SIZE = 100000
+
+# UDP/TCP ports of the DHCP and DNS packets that `drop_bulk_first` keeps
+_PRIORITY_PORTS = frozenset([53, 67, 68])
+
+
+def is_priority_frame(frame: bytes) -> bool:
+    """
+    Check whether a raw Ethernet frame is ARP, DHCP or DNS.
+
+    Args:
+        frame (bytes): The raw Ethernet frame.
+
+    Returns:
+        bool: True if the frame is ARP, or IPv4 UDP/TCP to or from port 53, 67 or 68.
+    """
+    ether_type = frame[12:14]
+    if ether_type == b'\x08\x06':
+        return True
+    if ether_type != b'\x08\x00' or len(frame) < 34 or frame[23] not in (6, 17):
+        return False
+
+    l4_offset = 14 + (frame[14] & 0x0f) * 4
+    src_port = int.from_bytes(frame[l4_offset:l4_offset + 2], 'big')
+    dst_port = int.from_bytes(frame[l4_offset + 2:l4_offset + 4], 'big')
+    return src_port in _PRIORITY_PORTS or dst_port in _PRIORITY_PORTS
+
+
+def is_priority_item(item) -> bool:
+    """
+    Check whether a queue item (Scapy packet or raw frame tuple) is ARP, DHCP or DNS.
+
+    Args:
+        item: A Scapy packet or a `(timestamp, frame_bytes)` tuple.
+
+    Returns:
+        bool: True if the item must be kept by the `drop_bulk_first` policy.
+    """
+    if isinstance(item, tuple):
+        frame = item[1]
+    else:
+        # Sniffed packets keep their original bytes, which saves walking the layers
+        frame = getattr(item, 'original', None) or bytes(item)
+    return is_priority_frame(frame)
+
+
+class BoundedPacketQueue(object):
+    """
+    A thread-safe FIFO queue of packets with a maximum depth and an overflow policy.
+
+    Args:
+        max_size (int, optional): Maximum number of queued packets; 0 means unbounded.
+        drop_policy (str, optional): One of `drop_newest`, `drop_oldest` or `drop_bulk_first`.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, drop_policy: str = DROP_BULK_FIRST):
+        """
+        Initialize an empty queue.
+
+        Args:
+            max_size (int, optional): Maximum number of queued packets; 0 means unbounded.
+            drop_policy (str, optional): One of `drop_newest`, `drop_oldest` or `drop_bulk_first`.
+        """
+        self._lock = threading.Lock()
+        # Items are stored as (sequence number, item); ARP/DHCP/DNS packets are kept apart
+        # from bulk packets (under `drop_bulk_first` only) and merged back in order on drain.
+        self._bulk_items = collections.deque()
+        self._priority_items = collections.deque()
+        self._seq = itertools.count()
+        self._stats = collections.Counter()
+        self.configure(max_size, drop_policy)
+
+    def configure(self, max_size: int, drop_policy: str):
+        """
+        Change the maximum depth and the overflow policy.
+
+        Args:
+            max_size (int): Maximum number of queued packets; 0 means unbounded.
+            drop_policy (str): One of `drop_newest`, `drop_oldest` or `drop_bulk_first`.
+
+        Raises:
+            ValueError: If the drop policy is unknown or the size is negative.
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f'Unknown drop policy: {drop_policy}; must be one of {DROP_POLICIES}')
+        if max_size < 0:
+            raise ValueError(f'Invalid maximum queue size: {max_size}')
+        with self._lock:
+            self.max_size = max_size
+            self.drop_policy = drop_policy
+
+    def put(self, item):
+        """
+        Enqueue a single packet, applying the overflow policy if the queue is full.
+
+        Args:
+            item: A Scapy packet or a `(timestamp, frame_bytes)` tuple.
+        """
+        with self._lock:
+            self._put(item)
+
+    def put_batch(self, items: list):
+        """
+        Enqueue many packets (e.g., a whole capture block) while taking the lock only once.
+
+        Args:
+            items (list): Scapy packets or `(timestamp, frame_bytes)` tuples.
+        """
+        with self._lock:
+            for item in items:
+                self._put(item)
+
+    def _put(self, item):
+        # Must be called with self._lock held
+        is_priority = self.drop_policy == DROP_BULK_FIRST and is_priority_item(item)
+        depth = len(self._bulk_items) + len(self._priority_items)
+
+        if self.max_size and depth >= self.max_size:
+            if self.drop_policy == DROP_NEWEST:
+                self._stats['dropped_newest'] += 1
+                return
+            if self.drop_policy == DROP_OLDEST:
+                self._pop_oldest()
+                self._stats['dropped_oldest'] += 1
+            elif not is_priority:
+                self._stats['dropped_bulk'] += 1
+                return
+            elif self._bulk_items:
+                self._bulk_items.popleft()
+                self._stats['dropped_bulk'] += 1
+            else:
+                # Nothing but ARP/DHCP/DNS in the queue
+                self._stats['dropped_priority'] += 1
+                return
+            depth -= 1
+
+        entry = (next(self._seq), item)
+        if is_priority:
+            self._priority_items.append(entry)
+        else:
+            self._bulk_items.append(entry)
+
+        self._stats['enqueued'] += 1
+        if depth + 1 > self._stats['max_depth']:
+            self._stats['max_depth'] = depth + 1
+
+    def _pop_oldest(self):
+        # Must be called with self._lock held and a non-empty queue
+        if not self._priority_items:
+            self._bulk_items.popleft()
+        elif not self._bulk_items or self._priority_items[0][0] < self._bulk_items[0][0]:
+            self._priority_items.popleft()
+        else:
+            self._bulk_items.popleft()
+
+    def drain(self) -> list:
+        """
+        Remove and return every queued packet, oldest first.
+
+        Returns:
+            list: The queued items in the order they were enqueued.
+        """
+        with self._lock:
+            bulk_items, self._bulk_items = self._bulk_items, collections.deque()
+            priority_items, self._priority_items = self._priority_items, collections.deque()
+
+        if not priority_items:
+            return [item for _, item in bulk_items]
+        if not bulk_items:
+            return [item for _, item in priority_items]
+        return [item for _, item in heapq.merge(bulk_items, priority_items, key=lambda entry: entry[0])]
+
+    def qsize(self) -> int:
+        """Return the number of queued packets."""
+        with self._lock:
+            return len(self._bulk_items) + len(self._priority_items)
+
+    def empty(self) -> bool:
+        """Return True if no packet is queued."""
+        return self.qsize() == 0
+
+    def get_stats(self) -> dict:
+        """
+        Return the queue counters.
+
+        Returns:
+            dict: `enqueued` packets, the high-water mark `max_depth`, the current `depth`, and the
+            number of packets dropped per reason: `dropped_newest`, `dropped_oldest`,
+            `dropped_bulk` and `dropped_priority`.
+        """
+        with self._lock:
+            stats = {
+                'enqueued': 0, 'max_depth': 0,
+                'dropped_newest': 0, 'dropped_oldest': 0, 'dropped_bulk': 0, 'dropped_priority': 0
+            }
+            stats.update(self._stats)
+            stats['depth'] = len(self._bulk_items) + len(self._priority_items)
+        return stats
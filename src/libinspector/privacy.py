@@ -1,94 +1,285 @@
+import bisect
 import functools
+import ipaddress
 import os
 import sys
 import geoip2.database as database
-import json
+import geoip2.errors
 import logging
-from . import networking
+import threading
+from . import common
+from . import tracker_index
 
 logger = logging.getLogger(__name__)
-ip_country_parser = database.Reader(
-    os.path.join(os.path.dirname(__file__), 'data', 'geolite', 'GeoLite2-Country.mmdb')
-)
+
+GEOLITE_COUNTRY_PATH = os.path.join(os.path.dirname(__file__), 'data', 'geolite', 'GeoLite2-Country.mmdb')
+
+
+def open_country_reader(path: str = GEOLITE_COUNTRY_PATH) -> database.Reader:
+    """
+    Open a GeoLite2 database memory-mapped, so that it is neither read nor copied into memory.
+
+    Lookups use the C extension of `maxminddb` if it is installed, and the pure Python reader of
+    the mapped file otherwise.
+    """
+    try:
+        return database.Reader(path, mode=database.MODE_MMAP_EXT)
+    except ValueError:
+        # The C extension is not available
+        return database.Reader(path, mode=database.MODE_MMAP)
+
+
+ip_country_parser = open_country_reader()
+
+# The GeoLite2 networks already looked up, per IP version: the sorted first addresses of the
+# networks (as integers), and the `(last address, country)` of each. The networks of a database
+# never overlap, so an address belongs at most to the network that starts right before it.
+_country_network_starts = {4: [], 6: []}
+_country_network_entries = {4: [], 6: []}
+_country_network_lock = threading.Lock()
+GEOIP_NETWORK_CACHE_SIZE = common.get_env_int('GEOIP_NETWORK_CACHE_SIZE', 65536)
 
 _full_block_list_dict = {}
 
+# The tracker domains as a trie of their labels in reverse order ('ads.example.com' is stored under
+# 'com', then 'example', then 'ads'). Each node maps a label to its child node, and `_TRIE_ENTRY` to
+# the `(tracker domain, company)` listed at that node, if any.
+_tracker_trie = {}
+_TRIE_ENTRY = None
+_NO_TRACKER = ('', '')
+_tracker_init_lock = threading.Lock()
+
+
+def _lookup_country(ip_addr) -> tuple:
+    """
+    Find the GeoLite2 network of a public IP address, from the cached networks if possible.
+
+    Args:
+        ip_addr: The address, as an `ipaddress.IPv4Address` or `ipaddress.IPv6Address`.
+
+    Returns:
+        tuple: The last address of the network (as an integer, or -1 if unknown) and the country
+        name (an empty string if not found or on error).
+    """
+    version = ip_addr.version
+    ip_int = int(ip_addr)
+    starts = _country_network_starts[version]
+    entries = _country_network_entries[version]
+    with _country_network_lock:
+        ix = bisect.bisect_right(starts, ip_int) - 1
+        if ix >= 0 and ip_int <= entries[ix][0]:
+            return entries[ix]
+
+    try:
+        response = ip_country_parser.country(ip_addr)
+        network = response.traits.network
+        country = response.country.name or ''
+    except geoip2.errors.AddressNotFoundError as e:
+        network = e.network
+        country = ''
+    except Exception:
+        return -1, ''
+    if network is None:
+        return -1, country
+
+    start = int(network.network_address)
+    entry = (int(network.broadcast_address), country)
+    with _country_network_lock:
+        if len(starts) >= GEOIP_NETWORK_CACHE_SIZE:
+            starts.clear()
+            entries.clear()
+        ix = bisect.bisect_left(starts, start)
+        if ix == len(starts) or starts[ix] != start:
+            starts.insert(ix, start)
+            entries.insert(ix, entry)
+    return entry
+
+
+def clear_country_network_cache():
+    """Forget the GeoLite2 networks looked up so far, e.g., after the database has been replaced."""
+    with _country_network_lock:
+        for version in _country_network_starts:
+            _country_network_starts[version].clear()
+            _country_network_entries[version].clear()
+
+
 @functools.lru_cache(maxsize=8192)
 def get_country_from_ip_addr(remote_ip_addr: str) -> str:
     """
     Determines the country associated with a given IP address using the GeoLite2 database.
 
+    Addresses of a network already looked up are answered from the network cache, without
+    walking the database. Use `get_countries_from_ip_addrs` for many addresses at once.
+
     Args:
         remote_ip_addr (str): The IP address to look up.
 
     Returns:
         str: The country name if found, '(local network)' for private IPs, or an empty string if not found or on error.
     """
-
-    if networking.is_private_ip_addr(remote_ip_addr):
+    ip_addr = ipaddress.ip_address(remote_ip_addr)
+    if not ip_addr.is_global:
         return '(local network)'
+    return _lookup_country(ip_addr)[1]
 
-    try:
-        country = ip_country_parser.country(remote_ip_addr).country.name
-        if country:
-            return country
-    except Exception:
-        pass
-    return ''
 
+def get_countries_from_ip_addrs(ip_addrs) -> dict:
+    """
+    Look up the countries of a whole column of IP addresses (e.g., the `dest_ip_address` of many
+    flow rows) at once.
 
-def parse_tracking_json(json_contents: dict) -> dict:
+    Each distinct address is parsed once. The addresses are then resolved in ascending order, so
+    that consecutive addresses of the same network share one lookup. The memoization cache of
+    `get_country_from_ip_addr` is left untouched.
+
+    Args:
+        ip_addrs (iterable): The IP addresses; duplicates are allowed.
+
+    Returns:
+        dict: Maps each distinct IP address to its country name, '(local network)' for private
+        IPs, or an empty string if not found, invalid, or on error.
     """
-    A helper function to parse the JSON contents of a tracker file.
+    countries = {}
+    # (IP version, address as an integer, address, original string)
+    pending = []
+    for ip_string in set(ip_addrs):
+        try:
+            ip_addr = ipaddress.ip_address(ip_string)
+        except ValueError:
+            countries[ip_string] = ''
+            continue
+        if ip_addr.is_global:
+            pending.append((ip_addr.version, int(ip_addr), ip_addr, ip_string))
+        else:
+            countries[ip_string] = '(local network)'
+
+    # The last address and country of the previous address's network
+    version, network_end, country = None, -1, ''
+    for ip_version, ip_int, ip_addr, ip_string in sorted(pending, key=lambda item: item[:2]):
+        if ip_version != version or ip_int > network_end:
+            version = ip_version
+            network_end, country = _lookup_country(ip_addr)
+        countries[ip_string] = country
+    return countries
+
+
+# Kept for callers of `privacy.parse_tracking_json`
+parse_tracking_json = tracker_index.parse_tracking_json
+
+
+def build_tracker_trie(block_list_dict: dict) -> dict:
     """
-    block_list_dict = dict()
+    Build the reversed-label trie of tracker domains (see `_tracker_trie`).
 
-    for domain, info in json_contents['trackers'].items():
-        tracker_company = info['owner']['displayName']
-        if tracker_company:
-            block_list_dict[domain] = tracker_company
+    Args:
+        block_list_dict (dict): Maps tracker domains to their companies.
 
-    return block_list_dict
+    Returns:
+        dict: The root node of the trie.
+    """
+    trie = {}
+    for domain, tracker_company in block_list_dict.items():
+        domain = domain.lower().rstrip('.')
+        node = trie
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        node[_TRIE_ENTRY] = (domain, tracker_company)
+    return trie
 
 
 @functools.lru_cache(maxsize=1)
 def initialize_ad_tracking_db():
     """
     Initializes the AdTracker table with the default list of trackers.
-    Run only once at startup.
+    Run only once at startup; `core.start_threads()` runs it in the background, so that no request
+    thread pays for it.
+
+    The tracker domains are read from the precompiled table `data/trackers/tracker_domains.tsv`
+    (see `tracker_index.py`) rather than from the JSON files.
     """
-    _full_block_list_dict.clear()
-    tracker_json_directory = os.path.join(os.path.dirname(__file__), 'data', 'trackers')
-    for tracker_json_file in os.listdir(tracker_json_directory):
-        if not tracker_json_file.endswith('.json'):
-            continue
-        tracker_path = os.path.join(tracker_json_directory, tracker_json_file)
-        tracker_path = os.path.abspath(tracker_path)
-        try:
-            with open(tracker_path, 'r') as f:
-                _full_block_list_dict.update(parse_tracking_json(json.load(f)))
-        except Exception:
-            logger.exception(f"Error loading tracker file: {tracker_path}")
-            continue
+    global _tracker_trie
+
+    with _tracker_init_lock:
+        block_list_dict = tracker_index.load_tracker_domains()
+        _full_block_list_dict.clear()
+        _full_block_list_dict.update(block_list_dict)
+        _tracker_trie = build_tracker_trie(block_list_dict)
+        get_tracker.cache_clear()
+
+
+def match_tracker(hostname: str) -> tuple:
+    """
+    Find the longest tracker domain that is the hostname itself or one of its parent domains.
+
+    The hostname's labels are walked from the top-level domain down the trie, in one pass without
+    any string slicing; the walk stops at the first label that no tracker domain continues with.
+    This function is not cached; see `get_tracker` and `get_tracker_companies`.
+
+    Args:
+        hostname (str): The hostname, e.g. 'metrics.ads.example.com'.
+
+    Returns:
+        tuple: `(tracker domain, company)`, e.g. `('example.com', 'Example Inc.')`, or `('', '')` if
+        the hostname does not belong to a tracker.
+    """
+    initialize_ad_tracking_db()
+    node = _tracker_trie
+    match = _NO_TRACKER
+    for label in reversed(hostname.lower().rstrip('.').split('.')):
+        node = node.get(label)
+        if node is None:
+            break
+        entry = node.get(_TRIE_ENTRY)
+        if entry is not None:
+            match = entry
+    return match
+
+
+@functools.lru_cache(maxsize=16384)
+def get_tracker(hostname: str) -> tuple:
+    """
+    Memoized `match_tracker`: return the `(tracker domain, company)` of a hostname, or `('', '')`.
+    """
+    return match_tracker(hostname)
+
+
+def get_tracker_companies(hostnames) -> list:
+    """
+    Tag a whole column of hostnames (e.g., the `dest_hostname` of many flow rows) with their
+    tracker companies.
+
+    Each distinct hostname is matched once, and the memoization cache of `get_tracker` is left
+    untouched, so that a large batch of one-off hostnames does not evict the frequent ones.
+
+    Args:
+        hostnames (iterable): The hostnames; None and duplicates are allowed.
+
+    Returns:
+        list: The tracker company of each hostname, in order (an empty string if not a tracker).
+    """
+    hostnames = list(hostnames)
+    companies = {hostname: match_tracker(hostname)[1] for hostname in set(hostnames) if hostname}
+    return [companies.get(hostname, '') for hostname in hostnames]
 
 
 def is_ad_tracked(domain: str) -> bool:
     """
-    Returns the tracker company for a given hostname; if not a tracking company, returns an empty string
+    Tells whether a hostname belongs to a tracking company, i.e., whether the hostname or one of
+    its parent domains is listed in the tracker files. Use `get_tracker` for the company.
     Args:
         domain (str): The domain name to check.
     Returns:
         bool: True if the domain is a tracking company, False otherwise.
     """
-    initialize_ad_tracking_db()
-    return domain in _full_block_list_dict
+    return get_tracker(domain) != _NO_TRACKER
 
 
 def domain_ads():
     if len(sys.argv) != 2:
         print("Usage: domain_ads <domain>")
         return
-    print(sys.argv[1], "\t", is_ad_tracked(sys.argv[1]))
+    tracker_domain, tracker_company = get_tracker(sys.argv[1])
+    print(sys.argv[1], "\t", bool(tracker_company), "\t", tracker_company, "\t", tracker_domain)
 
 
 def country_ip():
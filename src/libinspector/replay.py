@@ -0,0 +1,247 @@
+"""
+Offline Pcap Replay.
+
+This module streams the frames of a pcap or pcapng file through the same packet processing
+pipeline as live capture (`packet_processor.process_packet_helper`, or `process_raw_frame` in raw
+mode) into a fresh `mem_db` database. It needs neither root, nor a live interface, nor ARP
+spoofing, which makes it possible to measure the processor's throughput and to reproduce
+incidents from a capture.
+
+Pacing Modes:
+- As fast as possible (default): frames are processed back to back.
+- Real time: frames are released at the pace given by their capture timestamps (optionally sped
+  up), so one can see whether the processor keeps up with the original traffic.
+
+Periodic tasks that live capture runs on timers (flushing the flow aggregates, the hostname
+sweep) are driven by the capture timestamps, so a replay behaves like the original traffic
+regardless of pacing. At the end, packets per second and the time spent in each stage are
+reported.
+
+Usage:
+    libinspector replay capture.pcap --host-mac 02:00:00:00:00:01 --host-ip 192.168.1.2
+"""
+import argparse
+import collections
+import json
+import logging
+import time
+
+import scapy.all as sc
+
+from . import global_state
+from . import mem_db
+from . import networking
+from . import packet_processor
+
+logger = logging.getLogger(__name__)
+
+# DLT_EN10MB; other link types are skipped
+LINKTYPE_ETHERNET = 1
+
+
+def read_frames(pcap_path: str):
+    """
+    Yield the Ethernet frames of a pcap or pcapng file with their capture timestamps.
+
+    Args:
+        pcap_path (str): Path to the capture file.
+
+    Yields:
+        tuple[float, bytes]: The capture timestamp and the raw frame. Frames with a link type other
+        than Ethernet are skipped.
+    """
+    with sc.RawPcapReader(pcap_path) as reader:
+        for frame, metadata in reader:
+            if hasattr(metadata, 'tsresol'):
+                # pcapng
+                if metadata.linktype != LINKTYPE_ETHERNET:
+                    continue
+                ts = ((metadata.tshigh << 32) | metadata.tslow) / metadata.tsresol
+            else:
+                if reader.linktype != LINKTYPE_ETHERNET:
+                    continue
+                ts = metadata.sec + metadata.usec / (1e9 if getattr(reader, 'nano', False) else 1e6)
+            yield ts, frame
+
+
+def initialize_replay_state(host_mac_addr: str = '', host_ip_addr: str = '', gateway_ip_addr: str = ''):
+    """
+    Point the packet processor at a fresh in-memory database and at the given host addresses, and
+    clear what it remembers from any previous capture.
+
+    Args:
+        host_mac_addr (str, optional): MAC address of the Inspector host in the capture.
+        host_ip_addr (str, optional): IP address of the Inspector host in the capture.
+        gateway_ip_addr (str, optional): IP address of the gateway in the capture.
+
+    Returns:
+        tuple: The new database connection and its lock.
+    """
+    conn, rw_lock = mem_db.initialize_db()
+    with global_state.global_state_lock:
+        global_state.db_conn_and_lock = (conn, rw_lock)
+        global_state.host_mac_addr = host_mac_addr.lower()
+        global_state.host_ip_addr = host_ip_addr
+        global_state.gateway_ip_addr = gateway_ip_addr
+    networking.clear_ip_mac_cache()
+    packet_processor.reset_state()
+    return conn, rw_lock
+
+
+def replay(pcap_path: str, realtime: bool = False, speed: float = 1.0, raw: bool = False,
+           host_mac_addr: str = '', host_ip_addr: str = '', gateway_ip_addr: str = '') -> dict:
+    """
+    Replay a capture file through the packet processor into a fresh in-memory database.
+
+    The Inspector host's addresses tell the processor which frames went through the host while it
+    was spoofing; without `host_mac_addr`, no flow can be attributed to a device.
+
+    Args:
+        pcap_path (str): Path to the pcap or pcapng file.
+        realtime (bool, optional): Pace the frames by their capture timestamps. Defaults to False.
+        speed (float, optional): Speed-up factor of the real-time pacing. Defaults to 1.0.
+        raw (bool, optional): Feed raw frames to `process_raw_frame` (the `RAW_PACKET_QUEUE` path)
+            instead of Scapy packets to `process_packet_helper`. Defaults to False.
+        host_mac_addr (str, optional): MAC address of the Inspector host in the capture.
+        host_ip_addr (str, optional): IP address of the Inspector host in the capture.
+        gateway_ip_addr (str, optional): IP address of the gateway in the capture.
+
+    Returns:
+        dict: The replay report: `packets`, `capture_seconds`, `wall_seconds`,
+        `packets_per_second`, `max_lag_seconds` (real-time mode only), `stage_seconds` per stage,
+        and the resulting `row_counts` per table.
+    """
+    conn, rw_lock = initialize_replay_state(host_mac_addr, host_ip_addr, gateway_ip_addr)
+
+    stage_seconds = collections.Counter()
+    packet_count = 0
+    first_ts = last_ts = None
+    next_flush_ts = next_hostname_update_ts = None
+    max_lag = 0.0
+
+    perf_counter = time.perf_counter
+    frames = read_frames(pcap_path)
+    start_time = perf_counter()
+
+    while True:
+        stage_start = perf_counter()
+        try:
+            ts, frame = next(frames)
+        except StopIteration:
+            break
+        stage_seconds['read'] += perf_counter() - stage_start
+
+        if first_ts is None:
+            first_ts = ts
+            next_flush_ts = ts + packet_processor.FLOW_FLUSH_INTERVAL
+            next_hostname_update_ts = ts + packet_processor.HOSTNAME_UPDATE_INTERVAL
+        last_ts = ts
+
+        if realtime:
+            delay = (ts - first_ts) / speed - (perf_counter() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+
+        # Periodic tasks, driven by the capture clock
+        if ts >= next_flush_ts:
+            stage_start = perf_counter()
+            packet_processor.flush_flows()
+            stage_seconds['flush_flows'] += perf_counter() - stage_start
+            next_flush_ts = ts + packet_processor.FLOW_FLUSH_INTERVAL
+        if ts >= next_hostname_update_ts:
+            stage_start = perf_counter()
+            packet_processor.update_hostnames_in_flows()
+            stage_seconds['update_hostnames'] += perf_counter() - stage_start
+            next_hostname_update_ts = ts + packet_processor.HOSTNAME_UPDATE_INTERVAL
+
+        stage_start = perf_counter()
+        if raw:
+            packet_processor.process_raw_frame(ts, frame)
+        else:
+            pkt = sc.Ether(frame)
+            pkt.time = ts
+            dissect_end = perf_counter()
+            stage_seconds['dissect'] += dissect_end - stage_start
+            stage_start = dissect_end
+            packet_processor.process_packet_helper(pkt)
+        stage_seconds['process'] += perf_counter() - stage_start
+        packet_count += 1
+
+    stage_start = perf_counter()
+    packet_processor.flush_flows()
+    stage_seconds['flush_flows'] += perf_counter() - stage_start
+    stage_start = perf_counter()
+    packet_processor.update_hostnames_in_flows()
+    stage_seconds['update_hostnames'] += perf_counter() - stage_start
+
+    wall_seconds = perf_counter() - start_time
+
+    with rw_lock:
+        row_counts = {
+            table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for table in ('devices', 'hostnames', 'network_flows')
+        }
+
+    report = {
+        'packets': packet_count,
+        'capture_seconds': round(last_ts - first_ts, 6) if packet_count else 0,
+        'wall_seconds': round(wall_seconds, 6),
+        'packets_per_second': round(packet_count / wall_seconds) if wall_seconds else 0,
+        'stage_seconds': {stage: round(seconds, 6) for stage, seconds in stage_seconds.items()},
+        'row_counts': row_counts,
+    }
+    if realtime:
+        report['max_lag_seconds'] = round(max_lag, 6)
+
+    logger.info(f'[replay] Replayed {packet_count} packets from {pcap_path} in {wall_seconds:.3f} seconds')
+    return report
+
+
+def main(argv: list[str] | None = None):
+    """
+    Command-line entry point: `libinspector replay <file.pcap> [options]`.
+
+    Args:
+        argv (list, optional): The arguments after `replay`; defaults to `sys.argv[1:]`.
+    """
+    parser = argparse.ArgumentParser(prog='libinspector replay', description='Replay a pcap/pcapng file through the packet processor.')
+    parser.add_argument('pcap', help='Path to the pcap or pcapng file')
+    parser.add_argument('--realtime', action='store_true', help='Pace the packets by their capture timestamps')
+    parser.add_argument('--speed', type=float, default=1.0, help='Speed-up factor in real-time mode (default: 1.0)')
+    parser.add_argument('--raw', action='store_true', help='Feed raw frames to process_raw_frame, as with RAW_PACKET_QUEUE')
+    parser.add_argument('--host-mac', default='', help='MAC address of the Inspector host in the capture')
+    parser.add_argument('--host-ip', default='', help='IP address of the Inspector host in the capture')
+    parser.add_argument('--gateway-ip', default='', help='IP address of the gateway in the capture')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    if args.speed <= 0:
+        parser.error('--speed must be positive')
+
+    report = replay(
+        args.pcap, realtime=args.realtime, speed=args.speed, raw=args.raw,
+        host_mac_addr=args.host_mac, host_ip_addr=args.host_ip, gateway_ip_addr=args.gateway_ip
+    )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Packets:            {report['packets']}")
+    print(f"Capture duration:   {report['capture_seconds']:.3f} s")
+    print(f"Wall-clock time:    {report['wall_seconds']:.3f} s")
+    print(f"Packets per second: {report['packets_per_second']}")
+    if 'max_lag_seconds' in report:
+        print(f"Max lag:            {report['max_lag_seconds']:.3f} s")
+    print('Time per stage:')
+    for stage, seconds in sorted(report['stage_seconds'].items(), key=lambda item: -item[1]):
+        print(f'  {stage:<18}{seconds:.3f} s')
+    print('Rows:')
+    for table, row_count in report['row_counts'].items():
+        print(f'  {table:<18}{row_count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -160,11 +160,11 @@ def start(stop_event: threading.Event = None, run_event: threading.Event = None)
     Start the SSDP discovery process and update the device database with discovered devices.
 
     This function performs SSDP (Simple Service Discovery Protocol) discovery to find UPnP devices
-    on the local network. For each discovered device, it updates the `devices` table in the database
-    with the device's SSDP and UPnP metadata if not already present.
+    on the local network. For each discovered device, it records the device's SSDP and UPnP metadata
+    as its `ssdp_json` attribute in the `device_attributes` table if not already present.
 
     Side Effects:
-        - Updates the `devices` table in the database with discovered device information.
+        - Updates the `device_attributes` table in the database with discovered device information.
         - Logs discovered devices using the module logger.
     """
     if not common.inspector_is_running():
@@ -186,16 +186,13 @@ def start(stop_event: threading.Event = None, run_event: threading.Event = None)
         if not discovered_device_dict:
             continue
 
-        # Add discovered_device_dict to the metadata_json of the devices table
+        # Add discovered_device_dict to the device_attributes table, unless the device already has it
         with rw_lock:
             row_count = conn.execute('''
-                UPDATE devices
-                SET metadata_json = json_patch(
-                    metadata_json,
-                    json_object('ssdp_json', json(?))
-                )
-                WHERE ip_address = ? AND json_extract(metadata_json, '$.ssdp_json') IS NULL
-            ''', (json.dumps(discovered_device_dict), discovered_device_dict['device_ip_addr'])).rowcount
+                INSERT INTO device_attributes (mac_address, source, key, value, updated_ts)
+                SELECT mac_address, 'ssdp', 'ssdp_json', ?, ? FROM devices WHERE ip_address = ?
+                ON CONFLICT DO NOTHING
+            ''', (json.dumps(discovered_device_dict), int(time.time()), discovered_device_dict['device_ip_addr'])).rowcount
 
         if row_count:
             logger.info(f"[ssdp] Discovered device: {discovered_device_dict['device_ip_addr']}")
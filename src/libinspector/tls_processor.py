@@ -1,31 +1,221 @@
 """
 Functions for processing the TLS layer in packets.
 
-This module is in a separate file because I don't want `from scapy.all import *` (required for `TLSClientHello`) to pollute the namespace.
+The TLS ClientHello is parsed directly from the TCP payload bytes: the parser walks the TLS record
+header, the handshake header and the extension list, checking every length against the bytes that
+are actually present, and returns the Server Name Indication (SNI), the ALPN protocols and the
+supported versions in one pass. Scapy's TLS dissector is much slower, pulls in a large import, and
+allocates many objects per handshake; it is only imported (lazily) as a fallback for handshake
+records that the parser rejects.
 
+Intended Usage:
+    sni = extract_sni(pkt)  # a Scapy packet, or the raw TCP payload bytes
+    info = parse_client_hello(tcp_payload)
 """
-from scapy.layers.tls.handshake import TLSClientHello
+import struct
+from typing import NamedTuple
+
 import scapy.all as sc
 
+from . import header_parser
+
+TLS_CONTENT_TYPE_HANDSHAKE = 0x16
+TLS_HANDSHAKE_CLIENT_HELLO = 0x01
+
+TLS_EXT_SERVER_NAME = 0
+TLS_EXT_ALPN = 16
+TLS_EXT_SUPPORTED_VERSIONS = 43
+
+_uint16_struct = struct.Struct('!H')
+_ext_header_struct = struct.Struct('!HH')  # extension type, length
+
+
+class ClientHelloInfo(NamedTuple):
+    """
+    The fields of a TLS ClientHello that the Inspector is interested in.
+
+    If the ClientHello is split across several TCP segments, only the extensions contained in the
+    first segment are reported.
+    """
+    legacy_version: int
+    sni: str = ''
+    alpn: tuple[str, ...] = ()
+    supported_versions: tuple[int, ...] = ()
+
+
+def parse_client_hello(payload: bytes) -> ClientHelloInfo | None:
+    """
+    Parse a TLS ClientHello from the payload of a TCP segment.
+
+    Args:
+        payload (bytes): The TCP payload, starting with the TLS record header.
+
+    Returns:
+        ClientHelloInfo or None: The parsed ClientHello, or None if the payload does not start
+        with a well-formed ClientHello handshake record.
+    """
+    payload = memoryview(payload)
+
+    # Record header: content type (1), version (2), length (2); then the handshake header:
+    # type (1), length (3); then the ClientHello: version (2), random (32), session ID (1 + n)
+    if len(payload) < 44 or payload[0] != TLS_CONTENT_TYPE_HANDSHAKE or payload[1] != 3:
+        return None
+    if payload[5] != TLS_HANDSHAKE_CLIENT_HELLO:
+        return None
+
+    # A ClientHello may span several records and TCP segments; stay within what we have
+    end = min(len(payload), 5 + _uint16_struct.unpack_from(payload, 3)[0])
+    end = min(end, 9 + int.from_bytes(payload[6:9], 'big'))
+
+    legacy_version = _uint16_struct.unpack_from(payload, 9)[0]
+    offset = 43 + 1 + payload[43]  # Session ID
+
+    # Cipher suites, compression methods and the extensions length
+    if offset + 2 > end:
+        return None
+    offset += 2 + _uint16_struct.unpack_from(payload, offset)[0]
+    if offset + 1 > end:
+        return None
+    offset += 1 + payload[offset]
+    if offset + 2 > end:
+        # No extensions at all (or truncated before them)
+        return ClientHelloInfo(legacy_version) if offset == end else None
+    end = min(end, offset + 2 + _uint16_struct.unpack_from(payload, offset)[0])
+    offset += 2
+
+    sni = ''
+    alpn = ()
+    supported_versions = ()
+
+    # Each extension: type (2), length (2), data
+    while offset + 4 <= end:
+        ext_type, ext_len = _ext_header_struct.unpack_from(payload, offset)
+        offset += 4
+        ext_end = offset + ext_len
+        if ext_end > end:
+            break
+        if ext_type == TLS_EXT_SERVER_NAME:
+            sni = _parse_server_name(payload, offset, ext_end)
+        elif ext_type == TLS_EXT_ALPN:
+            alpn = _parse_alpn(payload, offset, ext_end)
+        elif ext_type == TLS_EXT_SUPPORTED_VERSIONS:
+            supported_versions = _parse_supported_versions(payload, offset, ext_end)
+        offset = ext_end
+
+    return ClientHelloInfo(legacy_version, sni, alpn, supported_versions)
 
-def extract_sni(packet: sc.Packet) -> str:
+
+def _parse_server_name(payload: memoryview, offset: int, end: int) -> str:
+    # Server name list length (2), then entries of: name type (1), name length (2), name
+    if offset + 2 > end:
+        return ''
+    offset += 2
+    while offset + 3 <= end:
+        name_type = payload[offset]
+        name_len = _uint16_struct.unpack_from(payload, offset + 1)[0]
+        offset += 3
+        if offset + name_len > end:
+            return ''
+        if name_type == 0:
+            try:
+                return bytes(payload[offset:offset + name_len]).decode()
+            except UnicodeDecodeError:
+                return ''
+        offset += name_len
+    return ''
+
+
+def _parse_alpn(payload: memoryview, offset: int, end: int) -> tuple[str, ...]:
+    # Protocol name list length (2), then entries of: length (1), protocol name
+    protocols = []
+    offset += 2
+    while offset < end:
+        name_len = payload[offset]
+        offset += 1
+        if offset + name_len > end:
+            break
+        protocols.append(bytes(payload[offset:offset + name_len]).decode('ascii', 'replace'))
+        offset += name_len
+    return tuple(protocols)
+
+
+def _parse_supported_versions(payload: memoryview, offset: int, end: int) -> tuple[int, ...]:
+    # Versions length (1), then 2-byte versions
+    if offset >= end:
+        return ()
+    end = min(end, offset + 1 + payload[offset])
+    offset += 1
+    return tuple(
+        _uint16_struct.unpack_from(payload, version_offset)[0]
+        for version_offset in range(offset, end - 1, 2)
+    )
+
+
+def get_tcp_payload(packet: sc.Packet) -> bytes:
+    """
+    Return the TCP payload bytes of a packet.
+
+    Sniffed packets keep their original bytes, so the payload is sliced out of those with the
+    fast-path header parser; packets built in memory are serialized from their TCP layer.
+
+    Args:
+        packet: A Scapy packet.
+
+    Returns:
+        bytes: The TCP payload, or empty bytes if the packet has no TCP layer.
+    """
+    frame = getattr(packet, 'original', None)
+    if frame:
+        header = header_parser.parse_frame(frame)
+        if header is not None and header.protocol == 'tcp':
+            return frame[header.payload_offset:header.payload_offset + header.payload_len]
+    if sc.TCP in packet:
+        return bytes(packet[sc.TCP].payload)
+    return b''
+
+
+def extract_sni(packet: sc.Packet | bytes) -> str:
     """
     Return the Server Name Indication (SNI) from a TLS packet, or an empty string if not present.
 
-    This function inspects the given packet for a TLSClientHello layer and attempts to extract the SNI
+    This function inspects the given packet's TCP payload for a TLS ClientHello and attempts to extract the SNI
     (Server Name Indication) extension, which indicates the hostname the client is attempting to connect to.
-    If the SNI extension is not found or the packet does not contain a TLSClientHello, an empty string is returned.
+    If the SNI extension is not found or the packet does not contain a ClientHello, an empty string is returned.
 
     Args:
-        packet: The packet object to inspect, expected to be a Scapy packet.
+        packet: The packet object to inspect, either a Scapy packet or the raw TCP payload bytes.
 
     Returns:
         str: The extracted SNI as a string, or an empty string if not found.
     """
+    if isinstance(packet, (bytes, bytearray, memoryview)):
+        payload = packet
+    else:
+        payload = get_tcp_payload(packet)
+
+    info = parse_client_hello(payload)
+    if info is not None:
+        return info.sni
+
+    # Let Scapy have a go at handshake records that the parser rejected
+    if payload[:1] == b'\x16' and isinstance(packet, sc.Packet):
+        return _extract_sni_with_scapy(packet)
+
+    return ''
+
+
+def _extract_sni_with_scapy(packet: sc.Packet) -> str:
+    # Importing the handshake messages alone does not bind Scapy's TLS layer to port 443
+    from scapy.layers.tls.handshake import TLSClientHello
+
     try:
         tls_layer = packet[TLSClientHello] # type: ignore
     except IndexError:
-        return ''
+        # The TLS layer is not loaded; dissect the handshake message that follows the record header
+        try:
+            tls_layer = TLSClientHello(get_tcp_payload(packet)[5:])
+        except Exception:
+            return ''
 
     for attr in ['ext', 'extensions']:
         extensions = getattr(tls_layer, attr, [])
@@ -37,4 +227,4 @@ def extract_sni(packet: sc.Packet) -> str:
                 except Exception:
                     pass
 
-    return ''
\ No newline at end of file
+    return ''
@@ -0,0 +1,153 @@
+"""
+Precompiled Tracker Domain Index.
+
+The DuckDuckGo Tracker Data Set files (`ios-tds.json`, `android-tds.json`, about 2.9 MB) describe
+each tracker in detail, but `privacy.py` only needs the owner of each tracker domain. This module
+distills them into `data/trackers/tracker_domains.tsv`, a sorted table of `domain<TAB>owner`
+lines (about 100 kB), which is shipped with the package and loads in a few milliseconds instead of
+tens of milliseconds of JSON parsing.
+
+The first line of the table records a fingerprint of the JSON files it was built from. The table
+is rebuilt by the update workflow whenever it downloads new JSON files:
+    python -m libinspector.tracker_index
+If it does not match the JSON files next to it, `load_tracker_domains` builds the domains in memory
+instead; the package data is never written at runtime.
+"""
+import json
+import logging
+import os
+import sys
+from . import common
+
+logger = logging.getLogger(__name__)
+
+TRACKER_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'trackers')
+TRACKER_INDEX_PATH = os.path.join(TRACKER_DATA_DIR, 'tracker_domains.tsv')
+
+INDEX_HEADER_PREFIX = '# libinspector tracker domains v1 '
+
+
+def get_json_paths(json_dir: str = TRACKER_DATA_DIR) -> list:
+    """Return the paths of the tracker JSON files in `json_dir`, sorted by name."""
+    return common.get_data_file_paths(json_dir, '.json')
+
+
+def get_json_fingerprint(json_dir: str = TRACKER_DATA_DIR) -> bytes:
+    """Identify the JSON files a table is built from, by their names and contents (see `common.get_data_fingerprint`)."""
+    return common.get_data_fingerprint(get_json_paths(json_dir))
+
+
+def parse_tracking_json(json_contents: dict) -> dict:
+    """
+    A helper function to parse the JSON contents of a tracker file.
+
+    Returns:
+        dict: Maps each tracker domain to the display name of its owner; trackers without one are skipped.
+    """
+    block_list_dict = dict()
+
+    for domain, info in json_contents['trackers'].items():
+        tracker_company = info['owner']['displayName']
+        if tracker_company:
+            block_list_dict[domain] = tracker_company
+
+    return block_list_dict
+
+
+def parse_tracker_json_files(json_dir: str = TRACKER_DATA_DIR) -> dict:
+    """
+    Parse every tracker JSON file of a directory; later files (by name) override earlier ones.
+
+    Returns:
+        dict: Maps tracker domains to their owners.
+    """
+    block_list_dict = {}
+    for tracker_path in get_json_paths(json_dir):
+        try:
+            with open(tracker_path, 'r') as f:
+                block_list_dict.update(parse_tracking_json(json.load(f)))
+        except Exception:
+            logger.exception(f"Error loading tracker file: {tracker_path}")
+            continue
+    return block_list_dict
+
+
+def format_tracker_domains(block_list_dict: dict, fingerprint: bytes) -> str:
+    """
+    Serialize tracker domains and their owners as the sorted table stored in `tracker_domains.tsv`.
+
+    Args:
+        block_list_dict (dict): Maps tracker domains to their owners.
+        fingerprint (bytes): The `get_json_fingerprint()` of the files the domains were parsed from.
+
+    Returns:
+        str: The table.
+    """
+    lines = [INDEX_HEADER_PREFIX + fingerprint.hex()]
+    for domain in sorted(block_list_dict):
+        # Neither field may contain the separators
+        owner = ' '.join(block_list_dict[domain].split())
+        lines.append(f'{domain.strip()}\t{owner}')
+    return '\n'.join(lines) + '\n'
+
+
+def parse_tracker_domains(contents: str) -> tuple:
+    """
+    Parse a table written by `format_tracker_domains`.
+
+    Returns:
+        tuple: The fingerprint (bytes), and a dict that maps tracker domains to their owners (each
+        distinct owner string is stored once).
+
+    Raises:
+        ValueError: If the contents are not such a table.
+    """
+    lines = contents.splitlines()
+    if not lines or not lines[0].startswith(INDEX_HEADER_PREFIX):
+        raise ValueError('Not a tracker domain table')
+    fingerprint = bytes.fromhex(lines[0][len(INDEX_HEADER_PREFIX):])
+
+    owners = {}
+    block_list_dict = {}
+    for line in lines[1:]:
+        domain, _, owner = line.partition('\t')
+        if domain and owner:
+            block_list_dict[domain] = owners.setdefault(owner, owner)
+    return fingerprint, block_list_dict
+
+
+def _load_shipped_tracker_domains(path: str) -> tuple:
+    with open(path, 'r', encoding='utf-8') as fp:
+        return parse_tracker_domains(fp.read())
+
+
+def load_tracker_domains(path: str = TRACKER_INDEX_PATH, json_dir: str = TRACKER_DATA_DIR) -> dict:
+    """
+    Load the tracker domains from the precompiled table.
+
+    If the table is missing, unreadable, or was built from other JSON files than those in
+    `json_dir`, the domains are parsed from the JSON files in memory instead (see
+    `common.load_prebuilt_data`).
+
+    Returns:
+        dict: Maps tracker domains to their owners.
+    """
+    return common.load_prebuilt_data(
+        'tracker domain table',
+        lambda: _load_shipped_tracker_domains(path),
+        # Round-trip through the table format, so that the owners are normalized as in the shipped table
+        lambda fingerprint: parse_tracker_domains(format_tracker_domains(parse_tracker_json_files(json_dir), fingerprint))[1],
+        get_json_paths(json_dir)
+    )
+
+
+def main():
+    """Rebuild `tracker_domains.tsv` from the JSON files next to it."""
+    block_list_dict = parse_tracker_json_files()
+    contents = format_tracker_domains(block_list_dict, get_json_fingerprint())
+    common.write_data_file(TRACKER_INDEX_PATH, contents.encode('utf-8'))
+    print(f'Wrote {len(block_list_dict)} tracker domains to {TRACKER_INDEX_PATH}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import unittest
+import libinspector.mem_db as mem_db
+from libinspector import db_retention
+from libinspector.flow_accumulator import write_flows_to_db
+
+NOW = 1700000000
+
+
+class TestDbRetention(unittest.TestCase):
+
+    def setUp(self):
+        self.conn, self.rw_lock = mem_db.initialize_db()
+
+    def _add_flows(self, timestamps, table='network_flows'):
+        flows = {
+            (ts, '02:00:00:00:00:aa', '02:00:00:00:00:fe', '192.168.1.50', '93.184.216.34', 40000 + ix % 1000, 443, 'tcp'): [100, 1, 0, 0]
+            for ix, ts in enumerate(timestamps)
+        }
+        write_flows_to_db(self.conn, self.rw_lock, flows)
+        if table != 'network_flows':
+            self.conn.execute(f'INSERT INTO {table} SELECT * FROM network_flows')
+            self.conn.execute('DELETE FROM network_flows')
+
+    def _count(self, table):
+        return self.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def test_max_age_in_batches(self):
+        self._add_flows([NOW - 8 * 86400 + ix for ix in range(1200)] + [NOW - 60], table='network_flows_minute')
+        report = db_retention.enforce_retention(self.conn, self.rw_lock, now=NOW, memory_budget_bytes=0)
+        self.assertEqual(report['max_age'], {'network_flows_minute': 1200})
+        self.assertEqual(report['memory_budget'], {})
+        self.assertEqual(self._count('network_flows_minute'), 1)
+
+    def test_memory_budget_evicts_oldest_flows_first(self):
+        self._add_flows([NOW - 86400 + ix for ix in range(5000)], table='network_flows_hour')
+        self._add_flows([NOW - 3000 + ix for ix in range(2000)])
+        size = db_retention.get_db_size(self.conn, self.rw_lock)
+
+        report = db_retention.enforce_retention(self.conn, self.rw_lock, now=NOW, memory_budget_bytes=size // 2)
+        self.assertLessEqual(report['db_size_bytes'], size // 2)
+        self.assertEqual(list(report['memory_budget']), ['network_flows_hour'])
+        self.assertEqual(self._count('network_flows'), 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
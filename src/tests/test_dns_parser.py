@@ -0,0 +1,41 @@
+import unittest
+import scapy.all as sc
+from libinspector import dns_parser
+
+# A response with a CNAME followed by two A records; Scapy compresses the repeated names
+DNS_RESPONSE = bytes(sc.DNS(
+    id=1, qr=1, rd=1, ra=1,
+    qd=sc.DNSQR(qname='WWW.Example.com'),
+    an=[
+        sc.DNSRR(rrname='www.example.com', type='CNAME', ttl=300, rdata='cdn.example.net'),
+        sc.DNSRR(rrname='cdn.example.net', type='A', ttl=60, rdata='93.184.216.34'),
+        sc.DNSRR(rrname='cdn.example.net', type='A', ttl=30, rdata='93.184.216.35'),
+    ]
+).compress())
+
+
+class TestDnsParser(unittest.TestCase):
+
+    def test_parse_response(self):
+        message = dns_parser.parse_dns_message(DNS_RESPONSE)
+        self.assertTrue(message.is_response)
+        self.assertEqual(message.qname, 'www.example.com')
+        self.assertEqual(message.a_records, (('93.184.216.34', 60), ('93.184.216.35', 30)))
+
+    def test_parse_query(self):
+        message = dns_parser.parse_dns_message(bytes(sc.DNS(rd=1, qd=sc.DNSQR(qname='example.com.'))))
+        self.assertFalse(message.is_response)
+        self.assertEqual(message.qname, 'example.com')
+        self.assertEqual(message.a_records, ())
+
+    def test_malformed_messages(self):
+        for length in range(len(DNS_RESPONSE)):
+            self.assertIsNone(dns_parser.parse_dns_message(DNS_RESPONSE[:length]))
+
+        # A question name that points to itself
+        looping_query = b'\x00\x01\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00' + b'\xc0\x0c' + b'\x00\x01\x00\x01'
+        self.assertIsNone(dns_parser.parse_dns_message(looping_query))
+
+
+if __name__ == '__main__':
+    unittest.main()
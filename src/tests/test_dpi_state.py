@@ -0,0 +1,46 @@
+import unittest
+from libinspector.dpi_state import FlowDpiTable
+
+FLOW_A = ('192.168.1.50', 40000, '93.184.216.34', 443, 'tcp')
+FLOW_B = ('192.168.1.50', 40001, '93.184.216.34', 443, 'tcp')
+FLOW_C = ('192.168.1.50', 40002, '93.184.216.34', 80, 'tcp')
+
+
+class TestFlowDpiTable(unittest.TestCase):
+
+    def test_only_first_packets_are_inspected(self):
+        table = FlowDpiTable(max_packets_per_flow=3)
+        verdicts = [table.should_inspect(FLOW_A) for _ in range(5)]
+        self.assertEqual(verdicts, [True, True, True, False, False])
+        self.assertTrue(table.is_done(FLOW_A))
+        self.assertFalse(table.is_done(FLOW_B))
+
+    def test_flow_is_done_once_found(self):
+        table = FlowDpiTable(max_packets_per_flow=10)
+        self.assertTrue(table.should_inspect(FLOW_A))
+        table.record_result(FLOW_A, False)
+        self.assertTrue(table.should_inspect(FLOW_A))
+        table.record_result(FLOW_A, True)
+        self.assertFalse(table.should_inspect(FLOW_A))
+
+    def test_least_recently_used_flow_is_evicted(self):
+        table = FlowDpiTable(max_packets_per_flow=1, max_flows=2)
+        table.should_inspect(FLOW_A)
+        table.should_inspect(FLOW_B)
+        table.should_inspect(FLOW_A)  # FLOW_A is now the most recently used
+        table.should_inspect(FLOW_C)
+        self.assertEqual(len(table), 2)
+        self.assertTrue(table.is_done(FLOW_A))
+        self.assertFalse(table.is_done(FLOW_B))
+        self.assertEqual(table.stats['evicted'], 1)
+
+    def test_idle_flow_is_inspected_again(self):
+        table = FlowDpiTable(max_packets_per_flow=1, idle_timeout=0)
+        self.assertTrue(table.should_inspect(FLOW_A))
+        table._flows[FLOW_A][2] -= 1  # pretend the flow has been idle for a second
+        self.assertFalse(table.is_done(FLOW_A))
+        self.assertTrue(table.should_inspect(FLOW_A))
+
+
+if __name__ == '__main__':
+    unittest.main()
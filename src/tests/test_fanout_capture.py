@@ -0,0 +1,40 @@
+import os
+import unittest
+import libinspector.fanout_capture as fanout_capture
+import libinspector.tpacket_capture as tpacket_capture
+
+
+def libpcap_is_available() -> bool:
+    from scapy.arch.common import compile_filter
+    try:
+        compile_filter('arp', linktype=1)
+    except ImportError:
+        return False
+    return True
+
+
+@unittest.skipUnless(tpacket_capture.is_supported() and os.geteuid() == 0, "TPACKET_V3 capture requires Linux and root")
+class TestFanoutSession(unittest.TestCase):
+
+    def test_set_filter_in_workers(self):
+        if not libpcap_is_available():
+            self.skipTest('libpcap is not available')
+
+        session = fanout_capture.FanoutSession(2, 'lo', 'udp port 9', '127.0.0.1')
+        try:
+            # Give the workers time to start and open their rings
+            session.capture(3, lambda: False)
+
+            self.assertTrue(session.set_filter('udp port 10'))
+            self.assertEqual(session.bpf_filter, 'udp port 10')
+
+            # A filter that a worker cannot attach is reported, and the previous one is kept
+            self.assertFalse(session.set_filter('udp port'))
+            self.assertEqual(session.bpf_filter, 'udp port 10')
+            self.assertTrue(session.set_filter('udp port 11'))
+        finally:
+            session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import libinspector.mem_db as mem_db
+from libinspector import flow_rollup
+from libinspector.flow_accumulator import write_flows_to_db
+
+NOW = 1700000000 // 3600 * 3600 + 2 * 86400
+
+
+class TestFlowRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.conn, self.rw_lock = mem_db.initialize_db()
+
+    def _add_flows(self, timestamps, dest_port=443):
+        flows = {}
+        for ts in timestamps:
+            flow_key = (ts, '02:00:00:00:00:aa', '02:00:00:00:00:fe', '192.168.1.50', '93.184.216.34', 40000, dest_port, 'tcp')
+            flows[flow_key] = [100, 1, ts, ts + 10]
+        write_flows_to_db(self.conn, self.rw_lock, flows)
+
+    def _rows(self, table):
+        return [tuple(row) for row in self.conn.execute(f'''
+            SELECT timestamp, byte_count, packet_count, tcp_seq_min, tcp_seq_max
+            FROM {table} ORDER BY timestamp
+        ''')]
+
+    def test_rollup_merges_old_rows(self):
+        two_hours_ago = NOW - 7200
+        self._add_flows([two_hours_ago + ix for ix in range(120)] + [NOW - 10])
+        self._add_flows([two_hours_ago + 5], dest_port=80)
+
+        row_counts = flow_rollup.rollup_flows(self.conn, self.rw_lock, now=NOW)
+        self.assertEqual(row_counts, {'network_flows': 121, 'network_flows_minute': 0})
+
+        # Two whole minutes of the 443 flow, one minute of the 80 flow; the recent row stays
+        self.assertEqual(self._rows('network_flows'), [(NOW - 10, 100, 1, NOW - 10, NOW)])
+        minute_rows = self._rows('network_flows_minute')
+        self.assertEqual(len(minute_rows), 3)
+        self.assertIn((two_hours_ago, 6000, 60, two_hours_ago, two_hours_ago + 69), minute_rows)
+
+        # Totals are preserved across the view
+        totals = self.conn.execute('SELECT SUM(byte_count), SUM(packet_count) FROM network_flows_all').fetchone()
+        self.assertEqual(tuple(totals), (12200, 122))
+
+        # Later, the minutes are merged into an hour, adding to what is already there
+        flow_rollup.rollup_flows(self.conn, self.rw_lock, now=NOW + 2 * 86400)
+        flow_rollup.rollup_flows(self.conn, self.rw_lock, now=NOW + 3 * 86400)
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM network_flows_hour').fetchone()[0], 3)
+        totals = self.conn.execute('SELECT SUM(byte_count), SUM(packet_count) FROM network_flows_all').fetchone()
+        self.assertEqual(tuple(totals), (12200, 122))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,30 @@ class TestGetCountryFromIpAddr(unittest.TestCase):
         result = privacy.get_country_from_ip_addr('1.2.3.4')
         self.assertEqual(result, 'Australia')
 
+    def test_neighbouring_ip_hits_network_cache(self):
+        privacy.get_country_from_ip_addr.cache_clear()
+        privacy.clear_country_network_cache()
+        self.assertEqual(privacy.get_country_from_ip_addr('8.8.8.8'), 'United States')
+        privacy.ip_country_parser, saved_reader = None, privacy.ip_country_parser
+        try:
+            # Any lookup in the database would fail without a reader
+            self.assertEqual(privacy.get_country_from_ip_addr('8.8.8.9'), 'United States')
+        finally:
+            privacy.ip_country_parser = saved_reader
+
+
+class TestGetCountriesFromIpAddrs(unittest.TestCase):
+    def test_matches_get_country_from_ip_addr(self):
+        ip_addrs = ['8.8.8.8', '1.2.3.4', '192.168.1.1', '8.8.4.4', '1.2.3.5', 'not an ip', '2001:4860:4860::8888', '8.8.8.8']
+        privacy.clear_country_network_cache()
+        countries = privacy.get_countries_from_ip_addrs(ip_addrs)
+        self.assertEqual(len(countries), 7)
+        self.assertEqual(countries['not an ip'], '')
+        privacy.get_country_from_ip_addr.cache_clear()
+        privacy.clear_country_network_cache()
+        for ip_addr in ip_addrs[:5] + ip_addrs[6:]:
+            self.assertEqual(countries[ip_addr], privacy.get_country_from_ip_addr(ip_addr))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
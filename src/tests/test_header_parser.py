@@ -0,0 +1,61 @@
+import unittest
+import scapy.all as sc
+from libinspector import header_parser
+
+DEVICE_MAC = '02:00:00:00:00:aa'
+HOST_MAC = '02:00:00:00:00:01'
+DEVICE_IP = '192.168.1.50'
+REMOTE_IP = '93.184.216.34'
+
+
+class TestHeaderParser(unittest.TestCase):
+
+    def test_parse_tcp_frame(self):
+        pkt = sc.Ether(src=DEVICE_MAC, dst=HOST_MAC) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.TCP(sport=40000, dport=8883, seq=1234) / (b'x' * 10)
+        frame = bytes(pkt)
+        header = header_parser.parse_frame(frame)
+
+        self.assertEqual(header.src_mac, DEVICE_MAC)
+        self.assertEqual(header.dst_mac, HOST_MAC)
+        self.assertEqual(header.src_ip, DEVICE_IP)
+        self.assertEqual(header.dst_ip, REMOTE_IP)
+        self.assertEqual((header.protocol, header.src_port, header.dst_port, header.tcp_seq), ('tcp', 40000, 8883, 1234))
+        self.assertEqual(frame[header.payload_offset:], b'x' * 10)
+        self.assertEqual(header_parser.classify_frame(header, frame), header_parser.FRAME_FLOW)
+
+    def test_parse_vlan_udp_frame_with_ip_options(self):
+        pkt = sc.Ether(src=DEVICE_MAC, dst=HOST_MAC) / sc.Dot1Q(vlan=10) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP, options=[sc.IPOption_NOP()] * 4) / sc.UDP(sport=40000, dport=3478) / b'payload'
+        frame = bytes(pkt)
+        header = header_parser.parse_frame(frame)
+
+        self.assertEqual((header.protocol, header.src_port, header.dst_port), ('udp', 40000, 3478))
+        self.assertEqual(frame[header.payload_offset:], b'payload')
+        self.assertEqual(header_parser.classify_frame(header, frame), header_parser.FRAME_FLOW)
+
+    def test_classify_frames_needing_dissection(self):
+        frames = [
+            sc.Ether(src=DEVICE_MAC, dst='ff:ff:ff:ff:ff:ff') / sc.ARP(psrc=DEVICE_IP, pdst='192.168.1.1'),
+            sc.Ether() / sc.IP(src='0.0.0.0', dst='255.255.255.255') / sc.UDP(sport=68, dport=67) / sc.BOOTP() / sc.DHCP(options=[('message-type', 'request'), 'end']),
+            sc.Ether() / sc.IP(src=DEVICE_IP, dst='8.8.8.8') / sc.UDP(sport=5000, dport=53) / sc.DNS(qd=sc.DNSQR(qname='example.com')),
+            sc.Ether() / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.TCP(sport=40001, dport=80) / b'GET / HTTP/1.1\r\n\r\n',
+            sc.Ether() / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.TCP(sport=40002, dport=443) / b'\x16\x03\x01\x00\x50\x01\x00\x00\x4c',
+            sc.Ether() / sc.IP(src=DEVICE_IP, dst=REMOTE_IP, flags='MF') / sc.UDP(sport=40000, dport=3478),
+        ]
+        for pkt in frames:
+            frame = bytes(pkt)
+            self.assertEqual(header_parser.classify_frame(header_parser.parse_frame(frame), frame), header_parser.FRAME_DISSECT, pkt.summary())
+
+    def test_classify_ignored_and_truncated_frames(self):
+        ipv6_frame = bytes(sc.Ether() / sc.IPv6() / sc.UDP())
+        self.assertEqual(header_parser.classify_frame(header_parser.parse_frame(ipv6_frame), ipv6_frame), header_parser.FRAME_IGNORE)
+
+        icmp_frame = bytes(sc.Ether() / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.ICMP())
+        self.assertEqual(header_parser.classify_frame(header_parser.parse_frame(icmp_frame), icmp_frame), header_parser.FRAME_IGNORE)
+
+        truncated_frame = bytes(sc.Ether() / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.TCP())[:40]
+        self.assertIsNone(header_parser.parse_frame(truncated_frame))
+        self.assertEqual(header_parser.classify_frame(None, truncated_frame), header_parser.FRAME_DISSECT)
+
+
+if __name__ == '__main__':
+    unittest.main()
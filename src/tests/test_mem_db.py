@@ -0,0 +1,79 @@
+import os
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import libinspector.global_state as global_state
+import libinspector.mem_db as mem_db
+
+
+class TestReadConnections(unittest.TestCase):
+
+    def setUp(self):
+        self._saved_state = global_state.db_conn_and_lock
+
+    def tearDown(self):
+        # Back to the default mode, which also closes the read pool
+        global_state.db_conn_and_lock = self._saved_state
+        mem_db.initialize_db('memory')
+        mem_db.remove_db_files()
+
+    def _check_readers_do_not_take_the_writer_lock(self, db_mode):
+        conn, rw_lock = mem_db.initialize_db(db_mode)
+        global_state.db_conn_and_lock = (conn, rw_lock)
+        self.assertIsNotNone(mem_db.read_pool)
+        with rw_lock:
+            conn.execute('INSERT INTO devices (mac_address, ip_address) VALUES (?, ?)', ('02:00:00:00:00:aa', '192.168.1.50'))
+
+        result = []
+
+        def read():
+            with mem_db.read_connection() as read_conn:
+                result.append(read_conn.execute('SELECT ip_address FROM devices').fetchone()['ip_address'])
+                self.assertRaises(Exception, read_conn.execute, 'DELETE FROM devices')
+
+        # The writer holds its lock for the whole read
+        with rw_lock:
+            reader = threading.Thread(target=read)
+            reader.start()
+            reader.join(timeout=5)
+        self.assertEqual(result, ['192.168.1.50'])
+
+    def test_wal_mode(self):
+        self._check_readers_do_not_take_the_writer_lock('wal')
+
+    def test_wal_files_are_removed(self):
+        self._check_readers_do_not_take_the_writer_lock('wal')
+        # A second database of this process replaces its own file
+        mem_db.initialize_db('wal')
+        db_path = mem_db.get_wal_db_path()
+        self.assertTrue(os.path.exists(db_path))
+        mem_db.remove_db_files()
+        self.assertIsNone(mem_db.read_pool)
+        for path in (db_path, db_path + '-wal', db_path + '-shm'):
+            self.assertFalse(os.path.exists(path))
+
+    def test_wal_mode_keeps_existing_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'user.db')
+            with open(db_path, 'w') as fp:
+                fp.write('not ours')
+            with unittest.mock.patch.dict(os.environ, {'DB_PATH': db_path}):
+                self.assertRaises(RuntimeError, mem_db.initialize_db, 'wal')
+            with open(db_path) as fp:
+                self.assertEqual(fp.read(), 'not ours')
+
+    def test_shared_memory_mode(self):
+        self._check_readers_do_not_take_the_writer_lock('shared_memory')
+
+    def test_memory_mode_reads_under_the_writer_lock(self):
+        conn, rw_lock = mem_db.initialize_db('memory')
+        global_state.db_conn_and_lock = (conn, rw_lock)
+        self.assertIsNone(mem_db.read_pool)
+        with mem_db.read_connection() as read_conn:
+            self.assertIs(read_conn, conn)
+            self.assertTrue(rw_lock.locked())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
+import os
+import tempfile
 import unittest
-from libinspector.oui_parser import get_vendor
+from libinspector import common
+from libinspector import oui_index
+from libinspector.oui_parser import get_vendor, get_vendors
 
 
 class TestOUIParser(unittest.TestCase):
@@ -9,5 +13,67 @@ class TestOUIParser(unittest.TestCase):
         self.assertEqual(get_vendor('8C:1F:64:00:30:00'), 'Brighten Controls LLP')
         self.assertEqual(get_vendor('8C1E80000000'), 'Cisco Systems, Inc')
 
+    def test_get_vendors_matches_get_vendor(self):
+        mac_addrs = [
+            '74:F8:DB:E0:00:00', '8C-1F-64-00-30-00', '8c1f.6400.3000', '8C1E80000000', '02:00:00:00:00:01', 'not a mac',
+            '74:F8:DB:E0:00:00', '74f8db_e00000', '0x74f8dbe00000', ' 74f8dbe00000'
+        ]
+        vendors = get_vendors(mac_addrs)
+        self.assertEqual(len(vendors), 9)
+        self.assertEqual(vendors, {mac_addr: get_vendor(mac_addr) for mac_addr in mac_addrs})
+        self.assertEqual(vendors['8c1f.6400.3000'], 'Brighten Controls LLP')
+        self.assertEqual(vendors['74f8db_e00000'], '')
+
+    def test_shipped_index_matches_csv_files(self):
+        self.assertEqual(oui_index.load_index().fingerprint, oui_index.get_csv_fingerprint())
+
+
+class TestOuiIndex(unittest.TestCase):
+    def test_longest_prefix_wins(self):
+        oui_dict = {'8c1f64': 'Large', '8c1f640': 'Medium', '8c1f64003': 'Small', '001a2b': 'Café Ltd', '001a2c': 'Large'}
+        index_bytes = oui_index.build_index(oui_dict, b'\0' * 32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'oui_index.bin')
+            common.write_data_file(path, index_bytes)
+            index = oui_index.load_index(path)
+            self.assertEqual(len(index), 5)
+            self.assertEqual(index.lookup('8c1f64003abc'), 'Small')
+            self.assertEqual(index.lookup('8c1f64004abc'), 'Medium')
+            self.assertEqual(index.lookup('8c1f64100000'), 'Large')
+            self.assertEqual(index.lookup('001a2b000000'), 'Café Ltd')
+            self.assertEqual(index.lookup('001a2d000000'), '')
+            self.assertEqual(index.lookup('zz1a2b000000'), '')
+
+        self.assertRaises(ValueError, oui_index.OuiIndex, b'OUIX')
+        self.assertRaises(ValueError, oui_index.OuiIndex, index_bytes[:-40])
+
+    def test_stale_index_is_built_in_memory(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, 'oui.csv')
+            with open(csv_path, 'w') as fp:
+                fp.write('MA-L,001A2B,Vendor A,Address\n')
+            index_path = os.path.join(tmp_dir, 'oui_index.bin')
+            index_bytes = oui_index.build_index({'001a2b': 'Vendor A'}, oui_index.get_csv_fingerprint(tmp_dir))
+            common.write_data_file(index_path, index_bytes)
+
+            def load_func():
+                index = oui_index.load_index(index_path)
+                return index.fingerprint, index
+
+            def build_func(fingerprint):
+                return oui_index.OuiIndex(oui_index.build_index({'001a2b': 'Vendor B'}, fingerprint))
+
+            index = common.load_prebuilt_data('OUI index', load_func, build_func, oui_index.get_csv_paths(tmp_dir))
+            self.assertEqual(index.lookup('001a2b000000'), 'Vendor A')
+
+            # A rename of the same length does not change the file size
+            with open(csv_path, 'w') as fp:
+                fp.write('MA-L,001A2B,Vendor B,Address\n')
+            index = common.load_prebuilt_data('OUI index', load_func, build_func, oui_index.get_csv_paths(tmp_dir))
+            self.assertEqual(index.lookup('001a2b000000'), 'Vendor B')
+            with open(index_path, 'rb') as fp:
+                self.assertEqual(fp.read(), index_bytes)
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
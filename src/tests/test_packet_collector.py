@@ -0,0 +1,151 @@
+import unittest
+from unittest import mock
+import libinspector.global_state as global_state
+from libinspector import mem_db
+from libinspector import packet_collector
+
+
+class FakeCaptureSession(object):
+    opened = []
+    max_filter_len = None
+
+    def __init__(self, backend, raw, iface, bpf_filter):
+        self.params = (backend, raw, iface)
+        self.bpf_filter = bpf_filter
+        self.closed = False
+        self.fail = False
+        self.max_filter_len = FakeCaptureSession.max_filter_len
+        FakeCaptureSession.opened.append(self)
+        self.set_filter(bpf_filter)
+
+    def matches(self, backend, raw, iface):
+        return self.params == (backend, raw, iface)
+
+    def set_filter(self, bpf_filter):
+        if self.max_filter_len is not None and len(bpf_filter) > self.max_filter_len:
+            raise OSError('Cannot allocate memory')
+        self.bpf_filter = bpf_filter
+        return True
+
+    def capture(self, duration, should_stop):
+        if self.fail:
+            raise OSError('Network is down')
+        return 0
+
+    def get_kernel_stats(self):
+        return None
+
+    def close(self):
+        self.closed = True
+
+
+class TestCaptureSession(unittest.TestCase):
+
+    def setUp(self):
+        self._saved_state = (global_state.host_active_interface, global_state.host_ip_addr, global_state.db_conn_and_lock)
+        global_state.host_active_interface = 'eth0'
+        global_state.host_ip_addr = '192.168.1.2'
+        global_state.db_conn_and_lock = mem_db.initialize_db()
+        FakeCaptureSession.opened = []
+        FakeCaptureSession.max_filter_len = None
+        packet_collector._unfilterable_devices = None
+        patcher = mock.patch.object(packet_collector, 'CaptureSession', FakeCaptureSession)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(packet_collector.close_capture_session)
+
+    def tearDown(self):
+        global_state.host_active_interface, global_state.host_ip_addr, global_state.db_conn_and_lock = self._saved_state
+
+    def test_session_survives_intervals(self):
+        packet_collector.start()
+        packet_collector.start()
+        self.assertEqual(len(FakeCaptureSession.opened), 1)
+        self.assertFalse(FakeCaptureSession.opened[0].closed)
+
+    def test_session_reopens_on_network_change_and_error(self):
+        packet_collector.start()
+        global_state.host_ip_addr = '192.168.1.3'
+        packet_collector.start()
+        self.assertEqual(len(FakeCaptureSession.opened), 1)
+        self.assertIn('192.168.1.3', FakeCaptureSession.opened[0].bpf_filter)
+
+        global_state.host_active_interface = 'wlan0'
+        packet_collector.start()
+        self.assertEqual(len(FakeCaptureSession.opened), 2)
+        self.assertTrue(FakeCaptureSession.opened[0].closed)
+
+        FakeCaptureSession.opened[1].fail = True
+        self.assertRaises(OSError, packet_collector.start)
+        self.assertTrue(FakeCaptureSession.opened[1].closed)
+        packet_collector.start()
+        self.assertEqual(len(FakeCaptureSession.opened), 3)
+
+    def test_filter_follows_inspected_devices(self):
+        packet_collector.start()
+        session = FakeCaptureSession.opened[0]
+        self.assertNotIn('192.168.1.77', session.bpf_filter)
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            conn.execute('INSERT INTO devices (mac_address, ip_address, is_inspected) VALUES (?, ?, 1)', ('02:00:00:00:00:77', '192.168.1.77'))
+        packet_collector.start()
+
+        # The filter is replaced in place, without reopening the session
+        self.assertEqual(len(FakeCaptureSession.opened), 1)
+        self.assertIn('host 192.168.1.77', session.bpf_filter)
+
+    def test_rejected_filter_captures_all_devices(self):
+        unrestricted_filter = packet_collector.build_capture_filter('192.168.1.2')
+        FakeCaptureSession.max_filter_len = len(unrestricted_filter)
+        packet_collector.start()
+        self.assertEqual(FakeCaptureSession.opened[-1].bpf_filter, unrestricted_filter)
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            conn.execute('INSERT INTO devices (mac_address, ip_address, is_inspected) VALUES (?, ?, 1)', ('02:00:00:00:00:77', '192.168.1.77'))
+        packet_collector.start()
+        self.assertEqual(FakeCaptureSession.opened[-1].bpf_filter, unrestricted_filter)
+        opened_count = len(FakeCaptureSession.opened)
+
+        # The rejected filter is not retried while the inspected devices stay the same
+        packet_collector.start()
+        self.assertEqual(len(FakeCaptureSession.opened), opened_count)
+
+        # Once the devices change, the restricted filter is tried again
+        FakeCaptureSession.max_filter_len = None
+        with rw_lock:
+            conn.execute('INSERT INTO devices (mac_address, ip_address, is_inspected) VALUES (?, ?, 1)', ('02:00:00:00:00:78', '192.168.1.78'))
+        packet_collector.start()
+        self.assertIn('host 192.168.1.78', FakeCaptureSession.opened[-1].bpf_filter)
+
+
+class TestBuildCaptureFilter(unittest.TestCase):
+
+    def test_filter(self):
+        self.assertEqual(packet_collector.build_capture_filter('192.168.1.2'), '(not arp and host not 192.168.1.2) or arp')
+        self.assertEqual(
+            packet_collector.build_capture_filter('192.168.1.2', frozenset([('02:00:00:00:00:77', '192.168.1.77'), ('02:00:00:00:00:78', '1.2.3.4 or tcp')])),
+            '(not arp and host not 192.168.1.2 and (udp port 67 or udp port 68 or port 53 or '
+            'host 192.168.1.77 or ether host 02:00:00:00:00:78)) or arp'
+        )
+
+    def test_largest_filter_fits_in_kernel(self):
+        from scapy.arch.common import compile_filter
+        from scapy.data import DLT_EN10MB
+        for ip_addr in ('10.0.{}.{}', ''):
+            inspected_devices = frozenset(
+                (f'02:00:00:00:{i // 256:02x}:{i % 256:02x}', ip_addr.format(i // 256, i % 256))
+                for i in range(packet_collector.MAX_FILTERED_DEVICES)
+            )
+            bpf_filter = packet_collector.build_capture_filter('10.0.255.254', inspected_devices)
+            try:
+                program = compile_filter(bpf_filter, linktype=DLT_EN10MB)
+            except ImportError:
+                self.skipTest('libpcap is not available')
+            # The kernel's limit is 4096 instructions, but allocating even 3000 may fail
+            self.assertLess(program.bf_len, 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+import unittest
+import scapy.all as sc
+import libinspector.global_state as global_state
+import libinspector.mem_db as mem_db
+import libinspector.networking as networking
+import libinspector.packet_processor as packet_processor
+from libinspector import fanout_capture
+
+HOST_MAC = '02:00:00:00:00:01'
+HOST_IP = '192.168.1.2'
+DEVICE_MAC = '02:00:00:00:00:aa'
+DEVICE_IP = '192.168.1.50'
+REMOTE_IP = '93.184.216.34'
+GATEWAY_MAC = '02:00:00:00:00:fe'
+GATEWAY_IP = '192.168.1.1'
+
+
+class TestRawFrameProcessing(unittest.TestCase):
+
+    def setUp(self):
+        self._saved_state = (
+            global_state.db_conn_and_lock, global_state.host_mac_addr, global_state.host_ip_addr, global_state.gateway_ip_addr
+        )
+        global_state.db_conn_and_lock = mem_db.initialize_db()
+        global_state.host_mac_addr = HOST_MAC
+        global_state.host_ip_addr = HOST_IP
+        global_state.gateway_ip_addr = GATEWAY_IP
+        networking.clear_ip_mac_cache()
+        packet_processor.reset_state()
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            conn.execute('INSERT INTO devices (mac_address, ip_address) VALUES (?, ?)', (DEVICE_MAC, DEVICE_IP))
+            conn.execute('INSERT INTO devices (mac_address, ip_address) VALUES (?, ?)', (GATEWAY_MAC, GATEWAY_IP))
+
+    def tearDown(self):
+        (
+            global_state.db_conn_and_lock, global_state.host_mac_addr, global_state.host_ip_addr, global_state.gateway_ip_addr
+        ) = self._saved_state
+
+    def _get_flows(self):
+        packet_processor.flush_flows()
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            return [tuple(row) for row in conn.execute('''
+                SELECT src_mac_address, dest_mac_address, src_ip_address, dest_ip_address,
+                       src_port, dest_port, protocol, byte_count, packet_count
+                FROM network_flows
+            ''')]
+
+    def test_raw_frame_matches_scapy_path(self):
+        # The device's traffic as forwarded by the Inspector host towards the gateway
+        pkt = sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.UDP(sport=40000, dport=3478) / (b'y' * 20)
+
+        # A packet built in memory has no original bytes, so it takes the Scapy path
+        packet_processor.process_packet_helper(pkt)
+        scapy_flows = self._get_flows()
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            conn.execute('DELETE FROM network_flows')
+
+        packet_processor.process_raw_frame(0.0, bytes(pkt))
+        raw_flows = self._get_flows()
+
+        self.assertEqual(len(scapy_flows), 1)
+        self.assertEqual(scapy_flows, raw_flows)
+
+    def test_worker_aggregates_match_raw_path(self):
+        block = []
+        for seq in (500, 100, 900):
+            pkt = sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.TCP(sport=40000, dport=8883, seq=seq, flags='A')
+            block.append((1700000000.5, bytes(pkt)))
+        arp = sc.Ether(src=DEVICE_MAC, dst='ff:ff:ff:ff:ff:ff') / sc.ARP(op=1, hwsrc=DEVICE_MAC, psrc=DEVICE_IP, pdst=GATEWAY_IP)
+        block.append((1700000000.5, bytes(arp)))
+
+        for ts, frame in block:
+            packet_processor.process_raw_frame(ts, frame)
+        raw_flows = self._get_flows()
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            conn.execute('DELETE FROM network_flows')
+
+        # A capture worker aggregates the flow and passes the ARP frame through
+        flows, frames = {}, []
+        fanout_capture.aggregate_frames(block, HOST_IP, flows, frames)
+        self.assertEqual(len(flows), 1)
+        self.assertEqual(list(flows.values())[0][1:], [3, 100, 900])
+        self.assertEqual(frames, block[3:])
+        self.assertEqual(packet_processor.record_flow_aggregates(flows), 3)
+        self.assertEqual(self._get_flows(), raw_flows)
+
+    def test_rows_use_capture_timestamps(self):
+        capture_ts = 1700000000.7
+        pkt = sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.UDP(sport=40000, dport=3478)
+        packet_processor.process_raw_frame(capture_ts, bytes(pkt))
+        arp = sc.Ether(src=DEVICE_MAC, dst=HOST_MAC) / sc.ARP(op=2, hwsrc=DEVICE_MAC, psrc=DEVICE_IP, hwdst=HOST_MAC, pdst=HOST_IP)
+        packet_processor.process_raw_frame(capture_ts, bytes(arp))
+        packet_processor.flush_flows()
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            self.assertEqual(conn.execute('SELECT timestamp FROM network_flows').fetchone()[0], 1700000000)
+            self.assertEqual(conn.execute('SELECT updated_ts FROM devices WHERE mac_address = ?', (DEVICE_MAC,)).fetchone()[0], 1700000000)
+
+        # The flow was committed long after it was captured
+        self.assertGreater(packet_processor.get_lag_stats(reset=True)['max_commit_lag_seconds'], 1e6)
+        self.assertEqual(packet_processor.get_lag_stats()['max_commit_lag_seconds'], 0)
+
+    def test_flows_are_aggregated_before_flush(self):
+        for seq in (500, 100, 900):
+            pkt = sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.TCP(sport=40000, dport=443, seq=seq, flags='A')
+            packet_processor.process_raw_frame(0.0, bytes(pkt))
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM network_flows').fetchone()[0], 0)
+
+        packet_processor.flush_flows()
+        with rw_lock:
+            totals = conn.execute('''
+                SELECT SUM(byte_count), SUM(packet_count),
+                       MIN(tcp_seq_min), MAX(tcp_seq_max)
+                FROM network_flows
+            ''').fetchone()
+        self.assertEqual(tuple(totals), (54 * 3, 3, 100, 900))
+
+    def test_failed_flush_keeps_flows(self):
+        pkt = sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.UDP(sport=40000, dport=53)
+        packet_processor.process_raw_frame(0.0, bytes(pkt))
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            conn.execute("CREATE TEMP TRIGGER fail_flows BEFORE INSERT ON network_flows BEGIN SELECT RAISE(ABORT, 'database or disk is full'); END")
+        self.assertRaises(Exception, packet_processor.flush_flows)
+        self.assertEqual(len(packet_processor.flow_accumulator), 1)
+
+        with rw_lock:
+            conn.execute('DROP TRIGGER fail_flows')
+        packet_processor.process_raw_frame(0.0, bytes(pkt))
+        self.assertEqual(self._get_flows()[0][-1], 2)
+
+    def test_ip_mac_cache_follows_arp(self):
+        # Unknown IP addresses are negatively cached, even once they appear in the database
+        self.assertRaises(KeyError, networking.get_mac_address_from_ip, '192.168.1.77')
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            conn.execute('INSERT INTO devices (mac_address, ip_address) VALUES (?, ?)', ('02:00:00:00:00:77', '192.168.1.77'))
+        self.assertRaises(KeyError, networking.get_mac_address_from_ip, '192.168.1.77')
+
+        # ARP keeps the index current in both directions
+        packet_processor.process_packet_helper(sc.Ether(src='02:00:00:00:00:77') / sc.ARP(op=2, hwsrc='02:00:00:00:00:77', psrc='192.168.1.78'))
+        self.assertEqual(networking.get_mac_address_from_ip('192.168.1.78'), '02:00:00:00:00:77')
+        self.assertEqual(networking.get_ip_address_from_mac('02:00:00:00:00:77'), '192.168.1.78')
+
+        # Lookups are served from the cache, without the database
+        with rw_lock:
+            conn.execute('DELETE FROM devices')
+        self.assertEqual(networking.get_mac_address_from_ip('192.168.1.78'), '02:00:00:00:00:77')
+
+    def test_device_attributes_are_recorded(self):
+        arp = sc.Ether(src=DEVICE_MAC) / sc.ARP(op=2, hwsrc=DEVICE_MAC, psrc=DEVICE_IP)
+        arp.time = 100.0
+        packet_processor.process_packet_helper(arp)
+        arp.time = 200.0
+        packet_processor.process_packet_helper(arp)
+        dhcp = (
+            sc.Ether(src=DEVICE_MAC, dst='ff:ff:ff:ff:ff:ff') / sc.IP(src=DEVICE_IP, dst='255.255.255.255') /
+            sc.UDP(sport=68, dport=67) / sc.BOOTP(chaddr=DEVICE_MAC) /
+            sc.DHCP(options=[('message-type', 'request'), ('hostname', b'thermostat'), 'end'])
+        )
+        dhcp.time = 300.0
+        packet_processor.process_packet_helper(dhcp)
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            rows = conn.execute('SELECT source, key, value, updated_ts FROM device_attributes WHERE mac_address = ? ORDER BY source', (DEVICE_MAC,)).fetchall()
+        self.assertEqual([tuple(row)[:2] for row in rows], [('dhcp', 'dhcp_hostname'), ('oui', 'oui_vendor')])
+        self.assertEqual(tuple(rows[0])[2:], ('thermostat', 300))
+        # The vendor is only recorded once
+        self.assertEqual(rows[1]['updated_ts'], 100)
+
+    def test_user_agent_is_only_inspected_until_found(self):
+        http_request = b'GET / HTTP/1.1\r\nHost: example.com\r\nUser-Agent: test-agent/1.0\r\n\r\n'
+        for seq in (1000, 2000, 3000):
+            pkt = sc.Ether(src=DEVICE_MAC, dst=HOST_MAC) / sc.IP(src=DEVICE_IP, dst=REMOTE_IP) / sc.TCP(sport=40000, dport=80, seq=seq, flags='PA') / http_request
+            packet_processor.process_raw_frame(0.0, bytes(pkt))
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            user_agent = conn.execute("SELECT value FROM device_attributes WHERE mac_address = ? AND key = 'user_agent_info'", (DEVICE_MAC,)).fetchone()[0]
+        self.assertEqual(user_agent, 'test-agent/1.0')
+        self.assertEqual(packet_processor.dpi_table.stats['inspected'], 1)
+
+    def test_dns_response_is_recorded(self):
+        dns = sc.DNS(
+            id=1, qr=1, qd=sc.DNSQR(qname='Example.com'),
+            an=[sc.DNSRR(rrname='example.com', type='A', ttl=60, rdata=ip) for ip in ('93.184.216.34', '93.184.216.35')]
+        )
+        # The gateway's response, as forwarded by the Inspector host to the device
+        frame = bytes(sc.Ether(src=HOST_MAC, dst=DEVICE_MAC) / sc.IP(src=GATEWAY_IP, dst=DEVICE_IP) / sc.UDP(sport=53, dport=40000) / dns)
+        packet_processor.process_raw_frame(0.0, frame)
+
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            rows = conn.execute('SELECT ip_address, hostname, data_source FROM hostnames ORDER BY ip_address').fetchall()
+        self.assertEqual([tuple(row) for row in rows], [
+            ('93.184.216.34', 'example.com', 'dns'),
+            ('93.184.216.35', 'example.com', 'dns'),
+        ])
+
+    def test_hostnames_are_filled_at_insert_and_swept_after(self):
+        conn, rw_lock = global_state.db_conn_and_lock
+
+        def get_hostnames():
+            packet_processor.flush_flows()
+            with rw_lock:
+                return conn.execute('SELECT dest_ip_address, dest_hostname FROM network_flows ORDER BY dest_ip_address').fetchall()
+
+        def send(ts, dst_ip):
+            pkt = sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src=DEVICE_IP, dst=dst_ip) / sc.UDP(sport=40000, dport=3478)
+            packet_processor.process_raw_frame(ts, bytes(pkt))
+
+        # Known before the flow is written
+        packet_processor.write_hostname_ip_mapping_to_db(DEVICE_MAC, 'known.example', {REMOTE_IP}, 'dns', 100.0)
+        send(100.0, REMOTE_IP)
+        self.assertEqual([tuple(row) for row in get_hostnames()], [(REMOTE_IP, 'known.example')])
+        self.assertEqual(packet_processor.update_hostnames_in_flows(), 1)
+
+        # Learned after the flow is written: only the sweep fills it in
+        send(200.0, '93.184.216.35')
+        self.assertEqual([tuple(row)[1] for row in get_hostnames()], ['known.example', None])
+        packet_processor.write_hostname_ip_mapping_to_db(DEVICE_MAC, 'late.example', {'93.184.216.35'}, 'sni', 201.0)
+        self.assertEqual(packet_processor.update_hostnames_in_flows(), 1)
+        self.assertEqual([tuple(row)[1] for row in get_hostnames()], ['known.example', 'late.example'])
+
+        # Nothing changed since
+        self.assertEqual(packet_processor.update_hostnames_in_flows(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import scapy.all as sc
+from libinspector import packet_queue
+from libinspector.packet_queue import BoundedPacketQueue
+
+ARP_FRAME = bytes(sc.Ether(src='02:00:00:00:00:aa', dst='ff:ff:ff:ff:ff:ff') / sc.ARP(psrc='192.168.1.50', pdst='192.168.1.1'))
+DNS_FRAME = bytes(sc.Ether() / sc.IP(src='192.168.1.50', dst='8.8.8.8') / sc.UDP(sport=5000, dport=53) / sc.DNS(qd=sc.DNSQR(qname='example.com')))
+BULK_FRAME = bytes(sc.Ether() / sc.IP(src='192.168.1.50', dst='93.184.216.34') / sc.TCP(sport=40000, dport=443) / (b'z' * 100))
+
+
+class TestBoundedPacketQueue(unittest.TestCase):
+
+    def test_priority_frames(self):
+        self.assertTrue(packet_queue.is_priority_frame(ARP_FRAME))
+        self.assertTrue(packet_queue.is_priority_frame(DNS_FRAME))
+        self.assertFalse(packet_queue.is_priority_frame(BULK_FRAME))
+        self.assertTrue(packet_queue.is_priority_item(sc.Ether(DNS_FRAME)))
+
+    def test_drop_newest(self):
+        q = BoundedPacketQueue(max_size=2, drop_policy=packet_queue.DROP_NEWEST)
+        q.put_batch([(1, BULK_FRAME), (2, BULK_FRAME), (3, ARP_FRAME)])
+        self.assertEqual([ts for ts, _ in q.drain()], [1, 2])
+        self.assertEqual(q.get_stats()['dropped_newest'], 1)
+
+    def test_drop_oldest(self):
+        q = BoundedPacketQueue(max_size=2, drop_policy=packet_queue.DROP_OLDEST)
+        q.put_batch([(1, BULK_FRAME), (2, BULK_FRAME), (3, BULK_FRAME)])
+        self.assertEqual([ts for ts, _ in q.drain()], [2, 3])
+        self.assertEqual(q.get_stats()['dropped_oldest'], 1)
+
+    def test_drop_bulk_first(self):
+        q = BoundedPacketQueue(max_size=3, drop_policy=packet_queue.DROP_BULK_FIRST)
+        q.put_batch([(1, BULK_FRAME), (2, DNS_FRAME), (3, BULK_FRAME), (4, BULK_FRAME), (5, ARP_FRAME), (6, ARP_FRAME), (7, ARP_FRAME)])
+
+        # Bulk packets are dropped first; the order of the survivors is preserved
+        self.assertEqual([ts for ts, _ in q.drain()], [2, 5, 6])
+        stats = q.get_stats()
+        self.assertEqual(stats['dropped_bulk'], 3)
+        self.assertEqual(stats['dropped_priority'], 1)
+        self.assertEqual(stats['max_depth'], 3)
+        self.assertEqual(stats['depth'], 0)
+
+    def test_unbounded(self):
+        q = BoundedPacketQueue(max_size=0)
+        q.put_batch([(ts, BULK_FRAME) for ts in range(1000)])
+        self.assertEqual(q.qsize(), 1000)
+        self.assertEqual(len(q.drain()), 1000)
+        self.assertTrue(q.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from libinspector.privacy import is_ad_tracked
+from libinspector.privacy import build_tracker_trie, get_tracker, get_tracker_companies, is_ad_tracked
+from libinspector import privacy
 
 
 class TestGetCountryFromIpAddr(unittest.TestCase):
@@ -15,5 +16,30 @@ class TestGetCountryFromIpAddr(unittest.TestCase):
         self.assertEqual(result, False)
 
 
+class TestTrackerSuffixMatching(unittest.TestCase):
+
+    # Subdomains of a listed domain are tracked too
+    def test_subdomain_of_listed_domain(self):
+        self.assertEqual(get_tracker('WWW.google.com.'), get_tracker('www.google.com'))
+        self.assertTrue(is_ad_tracked('metrics.ads.www.google.com'))
+        self.assertEqual(get_tracker('metrics.ads.www.google.com')[1], get_tracker('www.google.com')[1])
+
+    def test_longest_suffix_wins(self):
+        privacy.initialize_ad_tracking_db()
+        saved_trie = privacy._tracker_trie
+        privacy._tracker_trie = build_tracker_trie({'example.com': 'Example Inc.', 'ads.example.com': 'Ads Ltd.'})
+        try:
+            self.assertEqual(privacy.match_tracker('a.b.ads.example.com'), ('ads.example.com', 'Ads Ltd.'))
+            self.assertEqual(privacy.match_tracker('cdn.example.com'), ('example.com', 'Example Inc.'))
+            self.assertEqual(privacy.match_tracker('example.org'), ('', ''))
+            self.assertEqual(privacy.match_tracker('com'), ('', ''))
+            self.assertEqual(
+                get_tracker_companies(['x.ads.example.com', None, 'momolab.com', 'x.ads.example.com', 'example.com']),
+                ['Ads Ltd.', '', '', 'Ads Ltd.', 'Example Inc.']
+            )
+        finally:
+            privacy._tracker_trie = saved_trie
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+import scapy.all as sc
+import libinspector.global_state as global_state
+from libinspector import packet_processor
+from libinspector import replay
+
+HOST_MAC = '02:00:00:00:00:01'
+DEVICE_MAC = '02:00:00:00:00:aa'
+GATEWAY_MAC = '02:00:00:00:00:fe'
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self._saved_state = (
+            global_state.db_conn_and_lock, global_state.host_mac_addr, global_state.host_ip_addr, global_state.gateway_ip_addr
+        )
+        packets = [sc.Ether(src=DEVICE_MAC, dst='ff:ff:ff:ff:ff:ff') / sc.ARP(op=2, hwsrc=DEVICE_MAC, psrc='192.168.1.50')]
+        for seq in range(10):
+            packets.append(
+                sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src='192.168.1.50', dst='93.184.216.34') /
+                sc.TCP(sport=40000, dport=443, seq=seq) / b'x'
+            )
+        for ix, pkt in enumerate(packets):
+            pkt.time = 1700000000 + ix * 0.01
+
+        fd, self.pcap_path = tempfile.mkstemp(suffix='.pcapng')
+        os.close(fd)
+        sc.wrpcapng(self.pcap_path, packets)
+
+    def tearDown(self):
+        os.remove(self.pcap_path)
+        (
+            global_state.db_conn_and_lock, global_state.host_mac_addr, global_state.host_ip_addr, global_state.gateway_ip_addr
+        ) = self._saved_state
+
+    def test_read_frames(self):
+        frames = list(replay.read_frames(self.pcap_path))
+        self.assertEqual(len(frames), 11)
+        self.assertAlmostEqual(frames[-1][0] - frames[0][0], 0.1, places=5)
+
+    def test_replay_into_db(self):
+        for raw in (False, True):
+            report = replay.replay(self.pcap_path, raw=raw, host_mac_addr=HOST_MAC, host_ip_addr='192.168.1.2')
+            self.assertEqual(report['packets'], 11)
+            self.assertEqual(report['row_counts'], {'devices': 1, 'hostnames': 0, 'network_flows': 1})
+            self.assertIn('process', report['stage_seconds'])
+
+            conn, rw_lock = global_state.db_conn_and_lock
+            with rw_lock:
+                self.assertEqual(conn.execute('SELECT SUM(packet_count) FROM network_flows').fetchone()[0], 10)
+
+    def test_replay_forgets_previous_capture(self):
+        # As if a previous replay had resolved the remote address and inspected a flow
+        packet_processor.hostname_map.update({'93.184.216.34'}, 'leak.example')
+        flow_key = packet_processor.get_dpi_flow_key(
+            sc.Ether(src=HOST_MAC, dst=GATEWAY_MAC) / sc.IP(src='192.168.1.50', dst='93.184.216.34') /
+            sc.TCP(sport=40000, dport=443) / b'x'
+        )
+        packet_processor.dpi_table.should_inspect(flow_key)
+        packet_processor.dpi_table.record_result(flow_key, True)
+        replay.replay(self.pcap_path, host_mac_addr=HOST_MAC, host_ip_addr='192.168.1.2')
+        self.assertFalse(packet_processor.dpi_table.is_done(flow_key))
+        conn, rw_lock = global_state.db_conn_and_lock
+        with rw_lock:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM network_flows WHERE dest_hostname = 'leak.example'").fetchone()[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import scapy.all as sc
+from scapy.layers.tls.handshake import TLSClientHello
+from scapy.layers.tls.extensions import TLS_Ext_ServerName, ServerName, TLS_Ext_ALPN, ProtocolName, TLS_Ext_SupportedVersion_CH
+from libinspector import tls_processor
+
+# A TLS record carrying a ClientHello with SNI, ALPN and supported_versions extensions
+CLIENT_HELLO_BODY = bytes(TLSClientHello(ext=[
+    TLS_Ext_ServerName(servernames=[ServerName(servername=b'Example.COM')]),
+    TLS_Ext_ALPN(protocols=[ProtocolName(protocol=b'h2'), ProtocolName(protocol=b'http/1.1')]),
+    TLS_Ext_SupportedVersion_CH(versions=[0x0304, 0x0303])
+]))
+CLIENT_HELLO = b'\x16\x03\x01' + len(CLIENT_HELLO_BODY).to_bytes(2, 'big') + CLIENT_HELLO_BODY
+
+
+class TestClientHelloParser(unittest.TestCase):
+
+    def test_parse_client_hello(self):
+        info = tls_processor.parse_client_hello(CLIENT_HELLO)
+        self.assertEqual(info.sni, 'Example.COM')
+        self.assertEqual(info.alpn, ('h2', 'http/1.1'))
+        self.assertEqual(info.supported_versions, (0x0304, 0x0303))
+        self.assertEqual(info.legacy_version, 0x0303)
+
+    def test_truncated_and_malformed_payloads(self):
+        # Every truncation must be handled without raising
+        for length in range(len(CLIENT_HELLO)):
+            tls_processor.parse_client_hello(CLIENT_HELLO[:length])
+        self.assertIsNone(tls_processor.parse_client_hello(b'GET / HTTP/1.1\r\n\r\n' + b'x' * 40))
+        self.assertIsNone(tls_processor.parse_client_hello(CLIENT_HELLO[:40]))
+
+        # The SNI is still found if the rest of the ClientHello is in the next TCP segment
+        sni_end = CLIENT_HELLO.index(b'Example.COM') + len('Example.COM')
+        self.assertEqual(tls_processor.parse_client_hello(CLIENT_HELLO[:sni_end]).sni, 'Example.COM')
+
+    def test_extract_sni_matches_scapy(self):
+        frame = bytes(sc.Ether() / sc.IP(src='192.168.1.50', dst='93.184.216.34') / sc.TCP(sport=40000, dport=443) / CLIENT_HELLO)
+        pkt = sc.Ether(frame)
+        self.assertEqual(tls_processor.extract_sni(pkt), 'Example.COM')
+        self.assertEqual(tls_processor.extract_sni(CLIENT_HELLO), 'Example.COM')
+        self.assertEqual(tls_processor._extract_sni_with_scapy(pkt), 'Example.COM')
+        self.assertEqual(tls_processor.extract_sni(sc.Ether() / sc.IP() / sc.TCP() / b'\x17\x03\x03\x00\x10'), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import os
+import socket
+import time
+import unittest
+import libinspector.tpacket_capture as tpacket_capture
+
+
+@unittest.skipUnless(tpacket_capture.is_supported() and os.geteuid() == 0, "TPACKET_V3 capture requires Linux and root")
+class TestTPacketV3Ring(unittest.TestCase):
+
+    def test_read_blocks_on_loopback(self):
+        ring = tpacket_capture.TPacketV3Ring('lo', block_size=1 << 16, block_nr=4, retire_blk_tov_ms=10)
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.sendto(b'libinspector-tpacket-test', ('127.0.0.1', 9))
+
+            frames = []
+            deadline = time.time() + 5
+            while time.time() < deadline and not frames:
+                for block in ring.read_blocks(timeout=0.5):
+                    frames.extend(frame for _, frame in block if frame.endswith(b'libinspector-tpacket-test'))
+        finally:
+            ring.close()
+
+        self.assertGreaterEqual(len(frames), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+import unittest
+from libinspector import common
+from libinspector import tracker_index
+
+
+class TestTrackerIndex(unittest.TestCase):
+    def test_shipped_table_matches_json_files(self):
+        with open(tracker_index.TRACKER_INDEX_PATH, 'r', encoding='utf-8') as fp:
+            fingerprint, block_list_dict = tracker_index.parse_tracker_domains(fp.read())
+        self.assertEqual(fingerprint, tracker_index.get_json_fingerprint())
+        self.assertEqual(block_list_dict, tracker_index.parse_tracker_json_files())
+
+    def test_stale_table_is_built_in_memory(self):
+        tracker_json = {'trackers': {
+            'ads.example.com': {'owner': {'displayName': 'Example\tAds'}},
+            'cdn.example.org': {'owner': {'displayName': ''}},
+        }}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, 'trackers.json'), 'w') as fp:
+                json.dump(tracker_json, fp)
+            path = os.path.join(tmp_dir, 'tracker_domains.tsv')
+            contents = tracker_index.format_tracker_domains({'old.example.net': 'Old'}, b'\0' * 32)
+            common.write_data_file(path, contents.encode('utf-8'))
+
+            self.assertEqual(tracker_index.load_tracker_domains(path, tmp_dir), {'ads.example.com': 'Example Ads'})
+
+            # The shipped table is left as is
+            with open(path, 'r', encoding='utf-8') as fp:
+                self.assertEqual(fp.read(), contents)
+
+            # Without JSON files, the table is all there is
+            os.remove(os.path.join(tmp_dir, 'trackers.json'))
+            self.assertEqual(tracker_index.load_tracker_domains(path, tmp_dir), {'old.example.net': 'Old'})
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            tracker_index.parse_tracker_domains('{"trackers": {}}')
+
+
+if __name__ == '__main__':
+    unittest.main()